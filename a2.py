@@ -1,6 +1,22 @@
 from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from copy import copy
+from functools import partial
+from collections.abc import Collection, Iterator, Mapping, Sequence
+from types import MappingProxyType
 from typing import Optional
-from a2_support import UserInterface, TextInterface
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from a2_support import UserInterface, TextInterface, \
+    IncrementalTextInterface, ViewportTextInterface
+from instrumentation import Instrumentation, JsonLinesSink
 from constants import *
 
 
@@ -9,8 +25,6 @@ __email__ = "<adnaan.buksh@uqconnect.edu.au>"
 __version__ = 1.1
 
 
-ZERO = 0
-ONE = 1
 TIME_TO_CHANGE = 5
 NEW_LINE = '\n'
 ENTITY = 'E'
@@ -19,31 +33,349 @@ ITEMS_NAME = ['Water', 'Honey', 'Coin', 'Potion', 'Apple']
 ITEMS = [WATER, HONEY, COIN, POTION, APPLE]
 USABLE_NAME = ['Water', 'Honey', 'Potion', 'Apple']
 USABLE = [WATER, HONEY, POTION, APPLE]
+STACKABLE_NAME = ['Coin']
+# Moves can be entered several at a time, each optionally after a count of
+# how many times to make it, e.g. "wwwddds" or "10d"
+MOVE_BATCH = re.compile('(?:[0-9]*[' + re.escape(''.join(MOVE_DELTAS)) + '])+')
+MOVE_REPEAT = re.compile('([0-9]*)([' + re.escape(''.join(MOVE_DELTAS)) + '])')
+MAX_BATCH = 1000
+TOO_MANY_MOVES = f"At most {MAX_BATCH} moves at a time!"
+ZERO_MOVES = "A move can't be made zero times!"
+UNDO = 'u'
+REDO = 'r'
+NOTHING_TO_UNDO = "Nothing to undo!"
+NOTHING_TO_REDO = "Nothing to redo!"
+# Turns kept for undo, the oldest being forgotten first
+HISTORY_LIMIT = 1000
 BLOCKS = [WALL, LAVA, COIN, DOOR, EMPTY]
-
-
-def load_game(filename: str) -> list['Level']:
+# Codes used by Maze to store tiles, in the order of Maze._tile_table
+WALL_CODE = 0
+EMPTY_CODE = 1
+LAVA_CODE = 2
+DOOR_CODE = 3
+# Maps every byte of a row to its tile code, anything unknown is Empty
+TILE_TRANSLATION = bytes(
+    {ord(WALL): WALL_CODE, ord(LAVA): LAVA_CODE, ord(DOOR): DOOR_CODE}
+    .get(char, EMPTY_CODE) for char in range(256))
+# Finds the characters in a row that are entities rather than tiles
+ENTITY_PATTERN = re.compile('[' + re.escape(''.join(ITEMS) + PLAYER) + ']')
+# Every kind of item, by id and by name, added with register_item
+ITEM_EFFECTS = {}
+ITEM_EFFECTS_BY_NAME = {}
+# Code of each item id in an ItemTable, which is never zero
+ITEM_CODES = {}
+# What moving onto a cell in Maze.get_moves does, when it isn't the damage
+# taken. Moves off the top or left edge are blocked, and moves off the
+# bottom or right edge leave the maze
+BLOCKED_MOVE = 255
+EXIT_MOVE = 254
+# Rows and columns in each square bucket of an ItemIndex
+ITEM_BUCKET = 8
+# A shared item index is rebuilt for one level once more than this share of
+# the items it holds have been removed from that level
+REBUILD_SHARE = 0.5
+MAZE_HEADER = 'Maze'
+# Compiled game files: a file header, then for each level a level header
+# followed by its tile codes, item rows, item columns, item ids and doors
+COMPILED_MAGIC = b'MZRB'
+COMPILED_VERSION = 1
+FILE_HEADER = struct.Struct('<4sBI')
+LEVEL_HEADER = struct.Struct('<IIiiIII')
+NO_START = -1
+# Levels loaded by load_template, by absolute path and whether they are
+# compact, with the modification time and size of the file they came from.
+# The least recently used are forgotten once there are TEMPLATE_LIMIT
+TEMPLATE_LIMIT = 32
+_templates = OrderedDict()
+# Replay logs: a header line, the game's hash, then one line per input with
+# a checksum of the player's stats after every REPLAY_CHECK_INTERVAL inputs
+REPLAY_HEADER = 'MazeRunner replay 1'
+REPLAY_GAME = 'game'
+REPLAY_CHECK = '='
+REPLAY_CHECK_INTERVAL = 64
+REPLAY_STATS = struct.Struct('<iii')
+# Methods timed when a Model is given an Instrumentation
+INSTRUMENTED = ['move_player', 'attempt_collect_item', 'attempt_unlock_door',
+                'has_lost']
+# Path to write per-turn timings to as JSON lines, if set
+PROFILE_ENVIRONMENT = 'MAZE_RUNNER_PROFILE'
+# Size of the window to draw, as ROWSxCOLUMNS, if set, and whether to hide
+# what the player can't see in it
+VIEWPORT_ENVIRONMENT = 'MAZE_RUNNER_VIEWPORT'
+FOG_ENVIRONMENT = 'MAZE_RUNNER_FOG'
+
+
+def load_game(filename: str, compact: bool = False) -> list['Level']:
     """ Reads a game file and creates a list of all the levels in order.
 
     Parameters:
         filename: The path to the game file
+        compact: Keep each level's items in an ItemTable
 
     Returns:
         A list of all Level instances to play in the game
     """
+    if is_compiled_game(filename):
+        return load_compiled_game(filename, compact)
+
     levels = []
     with open(filename, 'r') as file:
         for line in file:
             line = line.strip()
-            if line.startswith('Maze'):
-                _, _, dimensions = line[5:].partition(' - ')
-                dimensions = [int(item) for item in dimensions.split()]
-                levels.append(Level(dimensions))
+            if line.startswith(MAZE_HEADER):
+                levels.append(Level(read_dimensions(line), compact))
             elif len(line) > 0 and len(levels) > 0:
                 levels[-1].add_row(line)
     return levels
 
 
+def load_template(filename: str, compact: bool = False) -> list['Level']:
+    """ Loads a game's levels once and keeps them until the file changes,
+        or until TEMPLATE_LIMIT other games have been used since. The levels
+        are templates that must never be played themselves: Level.copy()
+        gives a level to play that shares their tiles and items.
+
+    Parameters:
+        filename: The path to the game file
+        compact: Keep each level's items in an ItemTable
+
+    Returns:
+        The unplayed Level instances of the game, in order
+    """
+    status = os.stat(filename)
+    key = (os.path.abspath(filename), compact)
+    version = (status.st_mtime_ns, status.st_size)
+    cached = _templates.get(key)
+
+    if cached is None or cached[0] != version:
+        cached = (version, load_game(filename, compact))
+        _templates[key] = cached
+        if len(_templates) > TEMPLATE_LIMIT:
+            _templates.popitem(last=False)
+    else:
+        _templates.move_to_end(key)
+    return cached[1]
+
+
+def clear_templates() -> None:
+    """ Forgets every level loaded by load_template. """
+    _templates.clear()
+
+
+def read_dimensions(header: str) -> list[int]:
+    """ Reads the dimensions from a level's header line.
+
+    Parameters:
+        header: A stripped line of the form "Maze N - rows columns"
+
+    Returns:
+        The [rows, columns] of the level
+    """
+    _, _, dimensions = header[5:].partition(' - ')
+    return [int(item) for item in dimensions.split()]
+
+
+def is_compiled_game(filename: str) -> bool:
+    """
+    Parameters:
+        filename: The path to a game file
+
+    Returns:
+        True if the file was made by compile_game
+    """
+    with open(filename, 'rb') as file:
+        return file.read(len(COMPILED_MAGIC)) == COMPILED_MAGIC
+
+
+def compile_game(source: str, destination: str) -> None:
+    """ Converts a text game file into the compiled format, which
+        load_game can read without parsing any text.
+
+    Parameters:
+        source: The path to the text game file
+        destination: The path to write the compiled game file to
+    """
+    levels = load_game(source)
+    with open(destination, 'wb') as file:
+        file.write(FILE_HEADER.pack(COMPILED_MAGIC, COMPILED_VERSION,
+                                    len(levels)))
+
+        for level in levels:
+            maze = level.get_maze()
+            codes = maze.get_tile_codes()
+            start = level.get_player_start()
+            if start is None:
+                start = (NO_START, NO_START)
+            items = level.get_items()
+            num_rows, num_cols = level.get_dimensions()
+            doors = array('I', [row * num_cols + col for row, col
+                                in maze.get_door_positions()])
+
+            file.write(LEVEL_HEADER.pack(num_rows, num_cols, start[0],
+                                         start[1], len(codes), len(items),
+                                         len(doors)))
+            file.write(codes)
+            file.write(array('I', [row for row, _ in items]).tobytes())
+            file.write(array('I', [col for _, col in items]).tobytes())
+            file.write(''.join(item.get_id()
+                               for item in items.values()).encode())
+            file.write(doors.tobytes())
+
+
+def load_compiled_game(filename: str,
+                       compact: bool = False) -> list['Level']:
+    """ Reads a game file made by compile_game.
+
+    Parameters:
+        filename: The path to the compiled game file
+        compact: Keep each level's items in an ItemTable
+
+    Returns:
+        A list of all Level instances to play in the game
+
+    Raises:
+        ValueError: If the file isn't a compiled game file of this version
+    """
+    with open(filename, 'rb') as file:
+        data = mmap.mmap(file.fileno(), ZERO, access=mmap.ACCESS_READ)
+
+    # Every section is copied straight out of the mapped file
+    with data:
+        magic, version, count = FILE_HEADER.unpack_from(data, ZERO)
+        if magic != COMPILED_MAGIC or version != COMPILED_VERSION:
+            raise ValueError(f'{filename} is not a compiled game file')
+
+        offset = FILE_HEADER.size
+        levels = []
+        for _ in range(count):
+            num_rows, num_cols, start_row, start_col, num_codes, num_items, \
+                num_doors = LEVEL_HEADER.unpack_from(data, offset)
+            offset = offset + LEVEL_HEADER.size
+
+            codes = data[offset:offset + num_codes]
+            offset = offset + num_codes
+            rows = array('I', data[offset:offset + 4 * num_items])
+            offset = offset + 4 * num_items
+            cols = array('I', data[offset:offset + 4 * num_items])
+            offset = offset + 4 * num_items
+            ids = data[offset:offset + num_items].decode()
+            offset = offset + num_items
+            doors = array('I', data[offset:offset + 4 * num_doors])
+            offset = offset + 4 * num_doors
+
+            level = Level([num_rows, num_cols], compact)
+            level.get_maze().set_tile_codes(codes, list(doors))
+            for position, entity_id in zip(zip(rows, cols), ids):
+                level.add_entity(position, entity_id)
+            if start_row != NO_START:
+                level.add_player_start((start_row, start_col))
+            levels.append(level)
+
+    return levels
+
+
+class LazyLevels(Sequence):
+    """The levels of a game file, each of which is only read from the file
+       the first time it is used.
+
+       Creating one scans the file once to find where each level starts, so
+       its length is known straight away. Levels can be evicted once they
+       are no longer needed; using one again reads it afresh.
+    """
+    def __init__(self, filename: str, compact: bool = False) -> None:
+        """
+        Parameters:
+            filename (str): The path to the game file
+            compact (bool): Keep each level's items in an ItemTable
+        """
+        self._filename = filename
+        self._compact = compact
+        self._offsets = []
+        self._loaded = {}
+        header = MAZE_HEADER.encode()
+
+        # Records the byte offset of every level's header line
+        offset = ZERO
+        with open(filename, 'rb') as file:
+            for line in file:
+                if line.strip().startswith(header):
+                    self._offsets.append(offset)
+                offset = offset + len(line)
+        self._offsets.append(offset)
+
+    def __len__(self) -> int:
+        """
+        Returns:
+            int: the number of levels in the game file
+        """
+        return len(self._offsets) - ONE
+
+    def __getitem__(self, index: int) -> Level:
+        """Returns the level at the index, reading it if it isn't loaded.
+
+        Parameters:
+            index (int): the level number, starting from zero
+
+        Returns:
+            Level: the level at that index
+        """
+        if index < ZERO:
+            index = index + len(self)
+
+        if not ZERO <= index < len(self):
+            raise IndexError('level index out of range')
+
+        if index not in self._loaded:
+            self._loaded[index] = self._read_level(index)
+
+        return self._loaded[index]
+
+    def is_loaded(self, index: int) -> bool:
+        """
+        Returns:
+            bool: True if the level at the index is currently held in memory
+        """
+        return index in self._loaded
+
+    def evict(self, index: int) -> None:
+        """Forgets the level at the index, if it is loaded.
+
+        Parameters:
+            index (int): the level number, starting from zero
+        """
+        self._loaded.pop(index, None)
+
+    def _read_level(self, index: int) -> Level:
+        """
+        Parameters:
+            index (int): the level number, starting from zero
+
+        Returns:
+            Level: a new Level read from the game file
+        """
+        start, end = self._offsets[index], self._offsets[index + ONE]
+        with open(self._filename, 'rb') as file:
+            file.seek(start)
+            lines = file.read(end - start).decode().splitlines()
+
+        level = Level(read_dimensions(lines[ZERO].strip()), self._compact)
+        for line in lines[ONE:]:
+            line = line.strip()
+            if len(line) > 0:
+                level.add_row(line)
+
+        return level
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: the text required to construct a new LazyLevels for the
+                 same game file
+        """
+        return f"{type(self).__name__}('{self._filename}', " \
+               f"compact={self._compact})"
+
+
 class Tile:
     """Represents the floor for a (row, column) position.
     """
@@ -141,9 +473,20 @@ class Door(Tile):
         super().__init__()
         self._id = EMPTY
 
+    def lock(self):
+        """Locks the door again.
+        """
+        self.__init__()
+
 
 class Entity(object):
-    """Provides base functionality for all entities in the game."""
+    """Provides base functionality for all entities in the game.
+
+       Entities use __slots__ rather than an instance __dict__, as levels
+       can hold millions of items.
+    """
+    __slots__ = ('_position', '_id')
+
     def __init__(self, position: tuple[int, int]) -> None:
         """
         Parameters:
@@ -198,6 +541,8 @@ class DynamicEntity(Entity):
 
        Inherits functionality from Entity
     """
+    __slots__ = ()
+
     def __init__(self, position: tuple[int, int]):
         super().__init__(position)
         self._id = DYNAMIC_ENTITY
@@ -213,14 +558,21 @@ class Player(DynamicEntity):
 
        Inherits functionality from DynamicEntity
     """
-    def __init__(self, position: tuple[int, int]):
+    __slots__ = ('_hunger', '_thirst', '_health', '_inventory', '_player_inv')
+
+    def __init__(self, position: tuple[int, int], count_only: bool = False):
+        """
+        Parameters:
+            position (tuple[int, int]): the player's starting position
+            count_only (bool): only count stackable items in the inventory
+        """
         super().__init__(position)
         self._id = PLAYER
         self._hunger = ZERO
         self._thirst = ZERO
         self._health = MAX_HEALTH
         self._inventory = []
-        self._player_inv = Inventory(self._inventory)
+        self._player_inv = Inventory(self._inventory, count_only)
 
     def get_hunger(self) -> int:
         """
@@ -289,6 +641,25 @@ class Player(DynamicEntity):
         """
         self._player_inv.add_item(item)
 
+    def get_state(self) -> tuple:
+        """
+        Returns:
+            tuple: the players position, stats and inventory, which can be
+                   given to set_state to return to them
+        """
+        return (self._position, self._health, self._hunger, self._thirst,
+                self._player_inv.get_state())
+
+    def set_state(self, state: tuple) -> None:
+        """Returns the player to a state from get_state.
+
+        Parameters:
+            state (tuple): the state to return to
+        """
+        self._position, self._health, self._hunger, self._thirst, \
+            inventory = state
+        self._player_inv.set_state(inventory)
+
 
 class Item(Entity):
     """Subclass of Entity which provides base functionality for all items
@@ -296,21 +667,27 @@ class Item(Entity):
 
        Inherits functionality from Entity
     """
+    __slots__ = ()
+
     def __init__(self, position: tuple[int, int]):
         super().__init__(position)
         self._id = ITEM
 
     def apply(self, player: Player) -> None:
-        """Applies the items effect, if any, to the given player.
+        """Applies the items effect, if any, to the given player. Every kind
+           of item has its effect registered in ITEM_EFFECTS by its id.
 
         Parameters:
             player (Player): The player that the item takes effect on
 
         Raises:
-            NotImplementedError: If no effect is applied
+            NotImplementedError: If no effect is registered for the item
                                  Else applies the change
         """
-        raise NotImplementedError
+        effect = ITEM_EFFECTS.get(self._id)
+        if effect is None:
+            raise NotImplementedError
+        effect.apply(player)
 
 
 class Potion(Item):
@@ -318,60 +695,57 @@ class Potion(Item):
 
        Inherits functionality from Item
     """
+    __slots__ = ()
+
     def __init__(self, position: tuple[int, int]):
         super().__init__(position)
         self._id = POTION
 
-    def apply(self, player: Player) -> None:
-        # Run the change health def in player Class
-        player.change_health(POTION_AMOUNT)
-
 
 class Coin(Item):
     """A coin is an item that has no effect when applied
 
        Inherits functionality from Item
     """
+    __slots__ = ()
+
     def __init__(self, position: tuple[int, int]):
         super().__init__(position)
         self._id = COIN
 
-    def apply(self, player: Player) -> None:
-        return None
-
 
 class Water(Item):
     """Water is an item that will decrease the players thirst
 
        Inherits functionality from Item
     """
+    __slots__ = ()
+
     def __init__(self, position: tuple[int, int]):
         super().__init__(position)
         self._id = WATER
 
-    def apply(self, player: Player) -> None:
-        player.change_thirst(WATER_AMOUNT)
-
 
 class Food(Item):
     """Method that decreases the players hunger
 
        Inherits functionality from Item
     """
+    __slots__ = ('_food_amount',)
+
     def __init__(self, position: tuple[int, int]):
         super().__init__(position)
         self._id = FOOD
         self._food_amount = 0
 
-    def apply(self, player: Player) -> None:
-        player.change_hunger(self._food_amount)
-
 
 class Apple(Food):
     """Apple is a type of food that decreases the players hunger
        
        Inherits functionality from Food
     """
+    __slots__ = ()
+
     def __init__(self, position: tuple[int, int]):
         super().__init__(position)
         self._id = APPLE
@@ -383,22 +757,246 @@ class Honey(Food):
        
        Inherits functionality from Food
     """
+    __slots__ = ()
+
     def __init__(self, position: tuple[int, int]):
         super().__init__(position)
         self._id = HONEY
         self._food_amount = HONEY_AMOUNT
 
 
+class ItemEffect:
+    """What one kind of item is and what using it does, as a record of the
+       change it makes to each of the player's stats. The player keeps each
+       stat within its limits, as it does for every other change.
+    """
+    def __init__(self, item_id: str, name: str, item_type: type,
+                 health: int = ZERO, hunger: int = ZERO, thirst: int = ZERO,
+                 usable: bool = True, stackable: bool = False) -> None:
+        """
+        Parameters:
+            item_id (str): the character for the item in game files
+            name (str): the item's name, as typed after "i "
+            item_type (type): the Item subclass for the item
+            health (int): change to the player's health when used
+            hunger (int): change to the player's hunger when used
+            thirst (int): change to the player's thirst when used
+            usable (bool): the player can use the item with "i <name>"
+            stackable (bool): a count-only Inventory only counts the item
+        """
+        self._id = item_id
+        self._name = name
+        self._type = item_type
+        self._changes = (health, hunger, thirst)
+        self._usable = usable
+        self._stackable = stackable
+
+    def get_id(self) -> str:
+        """
+        Returns:
+            str: the character for the item in game files
+        """
+        return self._id
+
+    def get_name(self) -> str:
+        """
+        Returns:
+            str: the item's name
+        """
+        return self._name
+
+    def get_changes(self) -> tuple[int, int, int]:
+        """
+        Returns:
+            tuple[int, int, int]: the change to (health, hunger, thirst)
+        """
+        return self._changes
+
+    def is_usable(self) -> bool:
+        """
+        Returns:
+            bool: True if the player can use the item
+        """
+        return self._usable
+
+    def is_stackable(self) -> bool:
+        """
+        Returns:
+            bool: True if a count-only Inventory only counts the item
+        """
+        return self._stackable
+
+    def make(self, position: tuple[int, int]) -> Item:
+        """
+        Parameters:
+            position (tuple[int, int]): where the item is
+
+        Returns:
+            Item: a new item of this kind
+        """
+        return self._type(position)
+
+    def apply(self, player: Player) -> None:
+        """Makes the item's changes to the player's stats.
+
+        Parameters:
+            player (Player): the player using the item
+        """
+        health, hunger, thirst = self._changes
+        if health:
+            player.change_health(health)
+        if hunger:
+            player.change_hunger(hunger)
+        if thirst:
+            player.change_thirst(thirst)
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the item's id, name and changes
+        """
+        return f"{type(self).__name__}('{self._id}', '{self._name}', " \
+               f"changes={self._changes})"
+
+
+def register_item(effect: ItemEffect) -> None:
+    """Adds a kind of item to the game, so that levels load it from its id
+       and the player can use it by its name. Registering an id again
+       replaces its effect.
+
+    Parameters:
+        effect (ItemEffect): the kind of item
+    """
+    global ENTITY_PATTERN
+    item_id, name = effect.get_id(), effect.get_name()
+
+    # Anything listed under the name the id had before is forgotten
+    replaced = ITEM_EFFECTS.get(item_id)
+    if replaced is not None:
+        if ITEM_EFFECTS_BY_NAME.get(replaced.get_name()) is replaced:
+            del ITEM_EFFECTS_BY_NAME[replaced.get_name()]
+        if replaced.get_name() in STACKABLE_NAME:
+            STACKABLE_NAME.remove(replaced.get_name())
+    ITEM_EFFECTS[item_id] = effect
+    ITEM_EFFECTS_BY_NAME[name] = effect
+
+    # The lists are changed in place, as other modules hold on to them, and
+    # names keep the same index as their ids
+    if item_id in ITEMS:
+        ITEMS_NAME[ITEMS.index(item_id)] = name
+    else:
+        ITEMS.append(item_id)
+        ITEMS_NAME.append(name)
+
+    if item_id in USABLE:
+        index = USABLE.index(item_id)
+        if effect.is_usable():
+            USABLE_NAME[index] = name
+        else:
+            del USABLE[index]
+            del USABLE_NAME[index]
+    elif effect.is_usable():
+        USABLE.append(item_id)
+        USABLE_NAME.append(name)
+
+    if effect.is_stackable() and name not in STACKABLE_NAME:
+        STACKABLE_NAME.append(name)
+    elif not effect.is_stackable() and name in STACKABLE_NAME:
+        STACKABLE_NAME.remove(name)
+
+    ITEM_CODES.setdefault(item_id, ITEMS.index(item_id) + ONE)
+    ENTITY_PATTERN = re.compile(
+        '[' + re.escape(''.join(ITEMS) + PLAYER) + ']')
+
+
+for effect in (ItemEffect(WATER, 'Water', Water, thirst=WATER_AMOUNT),
+               ItemEffect(HONEY, 'Honey', Honey, hunger=HONEY_AMOUNT),
+               ItemEffect(COIN, 'Coin', Coin, usable=False, stackable=True),
+               ItemEffect(POTION, 'Potion', Potion, health=POTION_AMOUNT),
+               ItemEffect(APPLE, 'Apple', Apple, hunger=APPLE_AMOUNT)):
+    register_item(effect)
+
+
+class ItemStack:
+    """Holds any number of one kind of item as a count, keeping only the
+       first item added so that it can be handed back when one is removed.
+
+       Supports the same operations Inventory uses on a deque of items.
+    """
+    def __init__(self, item: Item) -> None:
+        """
+        Parameters:
+            item (Item): the first item in the stack
+        """
+        self._item = item
+        self._count = ONE
+
+    def append(self, item: Item) -> None:
+        """Adds one more item to the stack."""
+        self._count = self._count + ONE
+
+    def appendleft(self, item: Item) -> None:
+        """Adds one more item to the stack."""
+        self._count = self._count + ONE
+
+    def popleft(self) -> Item:
+        """Removes one item from the stack.
+
+        Returns:
+            Item: a copy of the item kept for the stack
+        """
+        self._count = self._count - ONE
+        return copy(self._item)
+
+    def pop(self) -> Item:
+        """Removes one item from the stack.
+
+        Returns:
+            Item: a copy of the item kept for the stack
+        """
+        return self.popleft()
+
+    def __len__(self) -> int:
+        """
+        Returns:
+            int: the number of items in the stack
+        """
+        return self._count
+
+    def __iter__(self):
+        """
+        Returns:
+            An iterator over a copy of the stack's item for each count
+        """
+        return (copy(self._item) for _ in range(self._count))
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with its item and count
+        """
+        return f'{type(self).__name__}({self._item!r}) * {self._count}'
+
+
 class Inventory:
-    """An Inventory contains and manages a collection of items."""
-    def __init__(self, initial_items: Optional[list[Item, ...]] = None) -> None:
+    """An Inventory contains and manages a collection of items.
+
+       Items of each name are kept in a deque, so adding and removing one is
+       O(1). In count-only mode, items that stack (see STACKABLE_NAME) are
+       kept as an ItemStack, which stores a count instead of every item.
+    """
+    def __init__(self, initial_items: Optional[list[Item, ...]] = None,
+                 count_only: bool = False) -> None:
         """
         Parameters:
             initial_items (Optional[list[Item, ...]]): Adds initial items to
                                                        players inventory
             Defaults to None.
+            count_only (bool): Only count the stackable items instead of
+                               keeping each one. Defaults to False.
         """
         self._inventory = {}
+        self._count_only = count_only
 
         if initial_items is not None:
             for items in initial_items:
@@ -410,27 +1008,58 @@ class Inventory:
         Parameters:
             item (Item): Item collected
         """
-        # Adds given item in a dictionary
-        # First checks if item type is already in dictionary, then adds
-        # otherwise adds to dictionary
-        if item.get_name() in self._inventory.keys():
-            # \ is used so the rest of the line can go to the next line
-            # and not go pass the character limit
-            self._inventory[item.get_name()] = \
-                self._inventory[item.get_name()] + [item]
+        # Adds given item to its name's collection
+        # otherwise starts a new collection for that name
+        name = item.get_name()
+        items = self._inventory.get(name)
+
+        if items is not None:
+            items.append(item)
+
+        elif self._count_only and name in STACKABLE_NAME:
+            self._inventory[name] = ItemStack(item)
 
         else:
-            self._inventory.update({item.get_name(): [item]})
+            self._inventory[name] = deque([item])
+
+    def get_items(self) -> Mapping[str, Collection[Item]]:
+        """
+        Returns:
+            Mapping[str, Collection[Item]]: a read-only view mapping the
+                                            names of all items in the
+                                            inventory to the items held with
+                                            that name, which must not be
+                                            changed. Use get_count for how
+                                            many there are.
+        """
+        return MappingProxyType(self._inventory)
+
+    def get_count(self, item_name: str) -> int:
+        """
+        Parameters:
+            item_name (str): name of the item to count
 
-    def get_items(self) -> dict[str, list[Item, ...]]:
+        Returns:
+            int: how many items with that name are in the inventory
+        """
+        items = self._inventory.get(item_name)
+        return ZERO if items is None else len(items)
+
+    def get_state(self) -> dict:
         """
         Returns:
-            dict[str, list[Item, ...]]: a dictionary mapping the names of all
-                                        items in the inventory to lists
-                                        containing each instance of the item
-                                        with that name
+            dict: a copy of the items held, which can be given to set_state
+                  to return to them
+        """
+        return {name: copy(items) for name, items in self._inventory.items()}
+
+    def set_state(self, state: dict) -> None:
+        """Returns the inventory to a state from get_state.
+
+        Parameters:
+            state (dict): the state to return to
         """
-        return self._inventory
+        self._inventory = {name: copy(items) for name, items in state.items()}
 
     def remove_item(self, item_name: str) -> Optional[Item]:
         """Removes and returns the first instance of the item from the inventory
@@ -441,30 +1070,61 @@ class Inventory:
         Returns:
             Optional[Item]: First instance of item_name from inventory
         """
-        # removes the first instance of item from dictionary
+        # removes the first instance of item from the collection
         # then checks if the item type contains nothing
         # if it contains no iteam eg (Water(2,3)) item type is deleted
-        if item_name in self._inventory:
-            removed_item = self._inventory[item_name].pop(0)
+        items = self._inventory.get(item_name)
+        if items is not None:
+            removed_item = items.popleft()
+
+            if len(items) == ZERO:
+                self._inventory.pop(item_name)
+
+            return removed_item
+
+    def remove_last_item(self, item_name: str) -> Optional[Item]:
+        """Removes and returns the most recently added instance of the item,
+           which undoes add_item.
 
-            if len(self._inventory[item_name]) == 0:
+        Parameters:
+            item_name (str): item that need to be removed
+
+        Returns:
+            Optional[Item]: Last instance of item_name from inventory
+        """
+        items = self._inventory.get(item_name)
+        if items is not None:
+            removed_item = items.pop()
+
+            if len(items) == ZERO:
                 self._inventory.pop(item_name)
 
             return removed_item
 
+    def return_item(self, item: Item) -> None:
+        """Puts an item back at the front of its collection, which undoes
+           remove_item.
+
+        Parameters:
+            item (Item): Item previously removed
+        """
+        name = item.get_name()
+        items = self._inventory.get(name)
+
+        if items is not None:
+            items.appendleft(item)
+
+        else:
+            self.add_item(item)
+
     def __str__(self) -> str:
         """
         Returns:
             str: a string containing information about quantities 
                  of items available in the inventory
         """
-        self._combined_inventory = []
-
-        for items in self._inventory.keys():
-            self._combined_inventory.append\
-                (f'{items}: {len(self._inventory[items])}')
-
-        return f"{NEW_LINE.join(self._combined_inventory)}"
+        return NEW_LINE.join(f'{name}: {len(items)}'
+                             for name, items in self._inventory.items())
 
     def __repr__(self) -> str:
         """Returns a string that could be used to construct a new
@@ -473,11 +1133,16 @@ class Inventory:
         Returns:
             str: Name of the Class with list of items in inventory 
         """
-        return f'{type(self).__name__}(initial_items={self._inventory})'
+        items = {name: list(items) for name, items in self._inventory.items()}
+        return f'{type(self).__name__}(initial_items={items})'
 
 
 class Maze:
-    """A Maze instance represents the space in which a level takes place."""
+    """A Maze instance represents the space in which a level takes place.
+
+       Tiles are stored as one flat, row-major bytearray of tile codes, and
+       each code maps to a single shared Tile instance owned by the maze.
+    """
     def __init__(self, dimensions: tuple[int, int]) -> None:
         """Sets up an empty maze of given dimensions
 
@@ -487,15 +1152,28 @@ class Maze:
         self._dimensions = dimensions
         self._row = dimensions[1]
         self._column = dimensions[0]
-        self._new_row = []
-        self._tile = []
-        self._maze = []
-        self._tiles = []
-        # Sets up the classes
+        self._num_rows = ZERO
+        self._codes = bytearray()
+        self._tiles = None
+        self._doors = []
+        self._unlocked = False
+        # Built when first needed by get_moves, and shared between copies
+        # until one of them has to change it. A copy made before it was
+        # built borrows its origin's once it needs one
+        self._moves = None
+        self._moves_shared = False
+        self._origin = None
+        # Padded cells per row, and for each move in MOVE_DELTAS, the padded
+        # cell it reaches less row * width + column of where it starts
+        self._width = self._row + 2
+        self._offsets = {delta: (delta[0] + ONE) * self._width + delta[1] + ONE
+                         for delta in MOVE_DELTAS.values()}
+        # Sets up the classes, indexed by their tile code
         self._wall = Wall()
         self._door = Door()
         self._lava = Lava()
         self._empty = Empty()
+        self._tile_table = [self._wall, self._empty, self._lava, self._door]
 
     def get_dimensions(self) -> tuple[int, int]:
         """
@@ -513,54 +1191,219 @@ class Maze:
         Precondition:
             addition of a row must not violate the maze dimensions.
         """
-        self._tile = []
-
-        # Checks if it violates dimensions
-        # for each letter in given row the ID and Tile Type are
-        # added in 2 lists
-        if len(row) == self._row and len(self._maze) <= self._column:
-            for char in row:
-                if char == WALL:
-                    self._new_row.append(self._wall.get_id())
-                    self._tile.append(self._wall)
-
-                elif char == DOOR:
-                    self._new_row.append(self._door.get_id())
-                    self._tile.append(self._door)
-
-                elif char == LAVA:
-                    self._new_row.append(self._lava.get_id())
-                    self._tile.append(self._lava)
+        # Checks if it violates dimensions, then converts the whole row to
+        # tile codes in one pass (anything that isn't a tile is Empty)
+        if len(row) == self._row and self._num_rows < self._column:
+            start = len(self._codes)
+            self._codes += row.encode('ascii', 'replace').translate(
+                TILE_TRANSLATION)
+            self._num_rows = self._num_rows + ONE
+            self._tiles = None
+            self._moves = None
+            self._origin = None
+
+            # Keeps the index of every door so they never need searching for
+            door = self._codes.find(DOOR_CODE, start)
+            while door != -ONE:
+                self._doors.append(door)
+                door = self._codes.find(DOOR_CODE, door + ONE)
+
+    def get_tile_codes(self) -> bytes:
+        """
+        Returns:
+            bytes: the row-major tile codes of this maze, one per cell.
+        """
+        return self._codes
 
-                else:
-                    self._new_row.append(self._empty.get_id())
-                    self._tile.append(self._empty)
+    def set_tile_codes(self, codes: bytes,
+                       doors: Optional[list[int]] = None) -> None:
+        """Replaces every tile in the maze at once.
 
-        self._tiles.append(self._tile)
-        self._maze.append(''.join(self._new_row))
-        self._new_row.clear()
+        Parameters:
+            codes (bytes): row-major tile codes for whole rows of the maze
+            doors (Optional[list[int]]): index of every door in codes, found
+                                         by searching codes if not given
+        """
+        self._codes = codes
+        self._num_rows = len(codes) // self._row if self._row else ZERO
+        self._tiles = None
+        self._moves = None
+        self._origin = None
+
+        if doors is None:
+            doors = []
+            door = codes.find(DOOR_CODE)
+            while door != -ONE:
+                doors.append(door)
+                door = codes.find(DOOR_CODE, door + ONE)
+        self._doors = doors
+
+    def copy(self) -> Maze:
+        """
+        Returns:
+            Maze: a new maze sharing this maze's tile codes, with doors of
+                  its own that can be unlocked separately
+        """
+        maze = Maze(self._dimensions)
+        maze.set_tile_codes(self._codes, self._doors)
+        if self._unlocked:
+            maze.unlock_door()
+
+        # The move table is shared if there is one, and otherwise left to
+        # be built once, by whichever maze needs it first
+        if self._moves is not None:
+            maze._moves = self._moves
+            maze._moves_shared = self._moves_shared = True
+        else:
+            maze._origin = self if self._origin is None else self._origin
+        return maze
 
-    def get_tiles(self) -> list[list[Tile]]:
+    def get_tile_table(self) -> list[Tile]:
         """
         Returns:
-            list[list[Tile]]: Returns the Tile instances in this maze.
+            list[Tile]: the Tile instance for each tile code in this maze.
         """
-        return self._tiles
+        return self._tile_table
 
-    def unlock_door(self) -> None:
-        """Unlocks any doors that exist in the maze
+    def get_door_positions(self) -> list[tuple[int, int]]:
         """
-        self._door.unlock()  # Updates the Door() Class
-        count = ZERO
+        Returns:
+            list[tuple[int, int]]: the (row, column) position of every door
+                                   in this maze.
+        """
+        return [divmod(door, self._row) for door in self._doors]
 
-        # iterates through each row and changes the ID
-        # representation to Empty
+    def is_unlocked(self) -> bool:
+        """
+        Returns:
+            bool: True if the doors in this maze have been unlocked.
+        """
+        return self._unlocked
 
-        for row in self._maze:
-            if DOOR in row:
-                self._maze[count] = row.replace(DOOR, EMPTY)
+    def get_tiles(self) -> list[list[Tile]]:
+        """
+        Returns:
+            list[list[Tile]]: Returns the Tile instances in this maze.
+        """
+        # Built on demand from the tile codes and kept until a row is added
+        if self._tiles is None:
+            table = self._tile_table
+            codes = self._codes
+            width = self._row
+            self._tiles = [[table[code] for code in codes[start:start + width]]
+                           for start in range(ZERO, len(codes), width)]
 
-            count = count + ONE  # The number of the row
+        return self._tiles
+
+    def unlock_door(self) -> None:
+        """Unlocks any doors that exist in the maze
+        """
+        # Every door cell shares the one Door() instance, so unlocking it
+        # updates all of them, and it only ever needs doing once
+        if not self._unlocked:
+            self._door.unlock()
+            self._unlocked = True
+            self._update_door_moves()
+
+    def lock_door(self) -> None:
+        """Locks the doors in the maze again, e.g. when restoring a snapshot
+        """
+        if self._unlocked:
+            self._door.lock()
+            self._unlocked = False
+            self._update_door_moves()
+
+    def get_moves(self) -> bytearray:
+        """What moving onto each cell does, with the doors as they are now:
+           BLOCKED_MOVE if its tile blocks, or else the damage it does. The
+           cells are padded with a border on every side, so (row, column) is
+           cell (row + 1) * (columns + 2) + column + 1, and the border holds
+           BLOCKED_MOVE along the top and left edges and EXIT_MOVE along the
+           bottom and right.
+
+        Returns:
+            bytearray: one byte for each padded cell
+        """
+        if self._moves is None:
+            origin = self._origin
+            if origin is None:
+                self._build_moves()
+            else:
+                self._origin = None
+                self._moves = origin.get_moves()
+                self._moves_shared = origin._moves_shared = True
+                if origin._unlocked != self._unlocked:
+                    self._update_door_moves()
+        return self._moves
+
+    def get_move(self, position: tuple[int, int],
+                 delta: tuple[int, int]) -> int:
+        """
+        Parameters:
+            position (tuple[int, int]): (row, column) in the maze to move from
+            delta (tuple[int, int]): (row, column) change, usually one of the
+                                     values of MOVE_DELTAS
+
+        Returns:
+            int: BLOCKED_MOVE, EXIT_MOVE, or the damage done by the move
+        """
+        moves = self._moves
+        if moves is None:
+            moves = self.get_moves()
+
+        offset = self._offsets.get(delta)
+        if offset is not None:
+            return moves[position[0] * self._width + position[1] + offset]
+
+        # Longer moves can jump the border, so are checked against the edges
+        row = position[0] + delta[0]
+        column = position[1] + delta[1]
+        if row >= self._num_rows or column >= self._row:
+            return EXIT_MOVE
+
+        if row < ZERO or column < ZERO:
+            return BLOCKED_MOVE
+
+        return moves[(row + ONE) * self._width + column + ONE]
+
+    def _build_moves(self) -> None:
+        """Works out what moving onto every cell does for get_moves, with
+           the doors as they are now.
+        """
+        columns = self._row
+        blocked = bytes([BLOCKED_MOVE])
+        leaving = bytes([EXIT_MOVE])
+        kinds = self._codes.translate(bytes(
+            BLOCKED_MOVE if tile.is_blocking() else tile.damage()
+            for tile in self._tile_table).ljust(256, blocked))
+
+        # Each row is followed by the right border of that row and the left
+        # border of the next
+        rows = (leaving + blocked).join(
+            kinds[start:start + columns]
+            for start in range(ZERO, self._num_rows * columns, columns or ONE))
+        self._moves = bytearray(blocked * (self._width + ONE) + rows
+                                + leaving * (self._width + ONE))
+        self._moves_shared = False
+
+    def _update_door_moves(self) -> None:
+        """Changes the moves onto each door in the table from get_moves,
+           after the doors have been locked or unlocked.
+        """
+        if self._moves is None:
+            return
+
+        if self._moves_shared:
+            self._moves = bytearray(self._moves)
+            self._moves_shared = False
+
+        width = self._width
+        columns = self._row
+        kind = BLOCKED_MOVE if self._door.is_blocking() \
+            else self._door.damage()
+        for door in self._doors:
+            row, column = divmod(door, columns)
+            self._moves[(row + ONE) * width + column + ONE] = kind
 
     def get_tile(self, position: tuple[int, int]) -> Tile:
         """Returns the Tile instance at the given position.
@@ -570,15 +1413,32 @@ class Maze:
 
         Returns:
             Tile: Type of Tile
+
+        Raises:
+            IndexError: If the position is outside of the maze
         """
-        return self._tiles[position[0]][position[1]]
+        row, column = position
+        # Negative positions count back from the end, as with lists
+        if row < ZERO:
+            row = row + self._num_rows
+
+        if column < ZERO:
+            column = column + self._row
+
+        if not (ZERO <= row < self._num_rows and ZERO <= column < self._row):
+            raise IndexError('maze position out of range')
+
+        return self._tile_table[self._codes[row * self._row + column]]
 
     def __str__(self) -> str:
         """
         Returns:
             str: Returns the string representation of this maze
         """
-        return NEW_LINE.join(self._maze)
+        chars = bytes(ord(tile.get_id()) for tile in self._tile_table)
+        text = self._codes.translate(chars.ljust(256, b'?')).decode('ascii')
+        return NEW_LINE.join(text[start:start + self._row]
+                             for start in range(ZERO, len(text), self._row))
 
     def __repr__(self) -> str:
         """Returns a string that could be copied and pasted to construct a
@@ -590,20 +1450,379 @@ class Maze:
         return f'{type(self).__name__}({self._dimensions})'
 
 
+class ItemTable(Mapping):
+    """A compact store of a level's items, by position, as parallel arrays:
+       the cell (row * columns + column) of each item, in order, and a
+       one-byte code for its kind. Each item takes five bytes.
+
+       Item instances are only made when one is looked up, so looking up
+       the same position twice gives equal but distinct items. Deleting an
+       item leaves its slot empty for the next item put at that cell.
+    """
+    def __init__(self, columns: int) -> None:
+        """
+        Parameters:
+            columns (int): number of columns in the level
+        """
+        self._columns = columns
+        self._cells = array('I')
+        self._kinds = bytearray()
+        self._count = ZERO
+
+    def _find(self, position: tuple[int, int]) -> int:
+        """
+        Parameters:
+            position (tuple[int, int]): (row, column) on the maze
+
+        Returns:
+            int: the slot holding the position's cell, or -1 if there is none
+        """
+        row, column = position
+        if row < ZERO or not ZERO <= column < self._columns:
+            return -ONE
+        cell = row * self._columns + column
+        cells = self._cells
+        # Nothing is after the last item, which is where new items go
+        if not cells or cell > cells[-ONE]:
+            return -ONE
+        slot = bisect_left(cells, cell)
+        if cells[slot] == cell:
+            return slot
+        return -ONE
+
+    def __getitem__(self, position: tuple[int, int]) -> Item:
+        item = self.get(position)
+        if item is None:
+            raise KeyError(position)
+        return item
+
+    def get(self, position: tuple[int, int],
+            default: Optional[Item] = None) -> Optional[Item]:
+        slot = self._find(position)
+        if slot < ZERO or not self._kinds[slot]:
+            return default
+        return ITEM_EFFECTS[ITEMS[self._kinds[slot] - ONE]].make(position)
+
+    def __setitem__(self, position: tuple[int, int], item: Item) -> None:
+        kind = ITEM_CODES[item.get_id()]
+        cell = position[0] * self._columns + position[1]
+        cells = self._cells
+
+        # Items are read in order, so nearly all of them go on the end
+        if not cells or cell > cells[-ONE]:
+            cells.append(cell)
+            self._kinds.append(kind)
+            self._count = self._count + ONE
+            return
+
+        slot = bisect_left(cells, cell)
+        if slot < len(cells) and cells[slot] == cell:
+            if not self._kinds[slot]:
+                self._count = self._count + ONE
+            self._kinds[slot] = kind
+        else:
+            cells.insert(slot, cell)
+            self._kinds.insert(slot, kind)
+            self._count = self._count + ONE
+
+    def __delitem__(self, position: tuple[int, int]) -> None:
+        slot = self._find(position)
+        if slot < ZERO or not self._kinds[slot]:
+            raise KeyError(position)
+        self._kinds[slot] = ZERO
+        self._count = self._count - ONE
+
+    def __contains__(self, position: object) -> bool:
+        slot = self._find(position)
+        return slot >= ZERO and self._kinds[slot] != ZERO
+
+    def __iter__(self):
+        columns = self._columns
+        return (divmod(cell, columns)
+                for cell, kind in zip(self._cells, self._kinds) if kind)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def copy(self) -> ItemTable:
+        """
+        Returns:
+            ItemTable: a new table holding the same items
+        """
+        table = ItemTable(self._columns)
+        table._cells = self._cells[:]
+        table._kinds = self._kinds[:]
+        table._count = self._count
+        return table
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with its number of columns and items
+        """
+        return f'{type(self).__name__}({self._columns}, items={self._count})'
+
+
+class ItemIndex:
+    """The positions of a level's items, by kind, in square buckets of the
+       maze, so finding the items in part of the maze only looks at the
+       buckets that overlap it rather than at every item.
+
+       Distances are counted in steps, |rows apart| + |columns apart|, as
+       if there were no walls, so they never exceed the length of a path.
+    """
+    def __init__(self, size: int = ITEM_BUCKET) -> None:
+        """
+        Parameters:
+            size (int): rows and columns in each bucket
+        """
+        self._size = size
+        # item id -> {(bucket row, bucket column): positions in the bucket}
+        self._buckets = {}
+        self._bucket_rows = ZERO
+        self._bucket_columns = ZERO
+
+    def add(self, position: tuple[int, int], kind: str) -> None:
+        """
+        Parameters:
+            position (tuple[int, int]): (row, column) of the item
+            kind (str): the item's id, e.g. COIN
+        """
+        bucket = (position[0] // self._size, position[1] // self._size)
+        self._buckets.setdefault(kind, {}).setdefault(bucket, set()).add(
+            position)
+        if bucket[0] >= self._bucket_rows:
+            self._bucket_rows = bucket[0] + ONE
+        if bucket[1] >= self._bucket_columns:
+            self._bucket_columns = bucket[1] + ONE
+
+    def discard(self, position: tuple[int, int], kind: str) -> None:
+        """Forgets an item, if it is in the index.
+
+        Parameters:
+            position (tuple[int, int]): (row, column) of the item
+            kind (str): the item's id
+        """
+        buckets = self._buckets.get(kind)
+        if buckets is None:
+            return
+
+        bucket = (position[0] // self._size, position[1] // self._size)
+        positions = buckets.get(bucket)
+        if positions is not None:
+            positions.discard(position)
+            if not positions:
+                del buckets[bucket]
+
+    def _by_kind(self, kinds: Optional[Collection[str]]) -> list[dict]:
+        """
+        Parameters:
+            kinds (Optional[Collection[str]]): item ids, or None for all
+
+        Returns:
+            list[dict]: the buckets of each of those kinds that has any
+        """
+        if kinds is None:
+            return list(self._buckets.values())
+        return [self._buckets[kind] for kind in kinds
+                if kind in self._buckets]
+
+    def find_in_area(self, first: tuple[int, int], last: tuple[int, int],
+                     kinds: Optional[Collection[str]] = None
+                     ) -> Iterator[tuple[int, int]]:
+        """
+        Parameters:
+            first (tuple[int, int]): (row, column) of the top left corner
+            last (tuple[int, int]): (row, column) of the bottom right corner
+            kinds (Optional[Collection[str]]): ids of the items to find,
+                                               defaults to every kind
+
+        Returns:
+            Iterator[tuple[int, int]]: the position of every item of those
+                                       kinds between the corners, inclusive
+        """
+        first_row, first_column = first
+        last_row, last_column = last
+        size = self._size
+        rows = range(max(first_row, ZERO) // size,
+                     min(last_row // size + ONE, self._bucket_rows))
+        columns = range(max(first_column, ZERO) // size,
+                        min(last_column // size + ONE, self._bucket_columns))
+
+        for buckets in self._by_kind(kinds):
+            # Whichever is fewer, the buckets in the area or those holding
+            # this kind, is looked through
+            if len(buckets) < len(rows) * len(columns):
+                found = [positions for bucket, positions in buckets.items()
+                         if bucket[0] in rows and bucket[1] in columns]
+            else:
+                found = [buckets[bucket_row, bucket_column]
+                         for bucket_row in rows for bucket_column in columns
+                         if (bucket_row, bucket_column) in buckets]
+
+            for positions in found:
+                for position in positions:
+                    if first_row <= position[0] <= last_row \
+                            and first_column <= position[1] <= last_column:
+                        yield position
+
+    def find_near(self, position: tuple[int, int], radius: int,
+                  kinds: Optional[Collection[str]] = None
+                  ) -> Iterator[tuple[int, int]]:
+        """
+        Parameters:
+            position (tuple[int, int]): (row, column) to search around
+            radius (int): the most steps away an item can be
+            kinds (Optional[Collection[str]]): ids of the items to find,
+                                               defaults to every kind
+
+        Returns:
+            Iterator[tuple[int, int]]: the position of every item of those
+                                       kinds within radius steps
+        """
+        row, column = position
+        for found in self.find_in_area((row - radius, column - radius),
+                                       (row + radius, column + radius),
+                                       kinds):
+            if abs(found[0] - row) + abs(found[1] - column) <= radius:
+                yield found
+
+    def find_nearest(self, position: tuple[int, int],
+                     kinds: Optional[Collection[str]] = None,
+                     radius: Optional[int] = None,
+                     skip: Collection[tuple[int, int]] = ()
+                     ) -> Optional[tuple[int, int]]:
+        """Looks through the buckets in rings around the position, stopping
+           once no bucket left can hold anything nearer.
+
+        Parameters:
+            position (tuple[int, int]): (row, column) to search around
+            kinds (Optional[Collection[str]]): ids of the items to find,
+                                               defaults to every kind
+            radius (Optional[int]): the most steps away an item can be
+            skip (Collection[tuple[int, int]]): positions to leave out
+
+        Returns:
+            Optional[tuple[int, int]]: the position of the nearest item of
+                                       those kinds, the first in row order
+                                       of any equally near, or None
+        """
+        kind_buckets = self._by_kind(kinds)
+        if not any(kind_buckets):
+            return None
+
+        size = self._size
+        row, column = position
+        centre_row, centre_column = row // size, column // size
+        rings = max(centre_row, self._bucket_rows - centre_row,
+                    centre_column, self._bucket_columns - centre_column)
+        if radius is not None:
+            rings = min(rings, radius // size + ONE)
+
+        best = None
+        best_distance = None
+        for ring in range(rings + ONE):
+            # Every tile in this ring's buckets is at least this far away
+            if best is not None and best_distance <= (ring - ONE) * size:
+                break
+
+            for bucket_row in range(centre_row - ring, centre_row + ring + ONE):
+                # Only the first and last rows of a ring are whole
+                step = ONE if abs(bucket_row - centre_row) == ring \
+                    else 2 * ring
+                for bucket_column in range(centre_column - ring,
+                                           centre_column + ring + ONE, step):
+                    bucket = (bucket_row, bucket_column)
+                    for buckets in kind_buckets:
+                        for found in buckets.get(bucket, ()):
+                            distance = abs(found[0] - row) \
+                                + abs(found[1] - column)
+                            if radius is not None and distance > radius \
+                                    or found in skip:
+                                continue
+                            if best is None or (distance, found) \
+                                    < (best_distance, best):
+                                best, best_distance = found, distance
+        return best
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the size of its buckets
+        """
+        return f'{type(self).__name__}({self._size})'
+
+
+class LevelItems(Mapping):
+    """The items currently in a level: the items it holds, less those that
+       have been removed. Neither is copied to make the mapping.
+    """
+    def __init__(self, items: dict[tuple[int, int], Item],
+                 removed: dict[tuple[int, int], Item]) -> None:
+        """
+        Parameters:
+            items (dict[tuple[int, int], Item]): every item in the level,
+                                                 including removed ones
+            removed (dict[tuple[int, int], Item]): the items removed
+        """
+        self._items = items
+        self._removed = removed
+
+    def __getitem__(self, position: tuple[int, int]) -> Item:
+        if position in self._removed:
+            raise KeyError(position)
+        return self._items[position]
+
+    def get(self, position: tuple[int, int],
+            default: Optional[Item] = None) -> Optional[Item]:
+        item = self._items.get(position)
+        if item is None or position in self._removed:
+            return default
+        return item
+
+    def __contains__(self, position: object) -> bool:
+        return position in self._items and position not in self._removed
+
+    def __iter__(self):
+        removed = self._removed
+        if not removed:
+            return iter(self._items)
+        return (position for position in self._items
+                if position not in removed)
+
+    def __len__(self) -> int:
+        return len(self._items) - len(self._removed)
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: the items as a dict
+        """
+        return repr(dict(self))
+
+
 class Level:
     """A Level instance keeps track of both the maze and the non-player
        entities placed on the maze for a single level."""
-    def __init__(self, dimensions: tuple[int, int]) -> None:
+    def __init__(self, dimensions: tuple[int, int],
+                 compact: bool = False) -> None:
         """Sets up a new level with empty maze using the given dimensions.
 
         Parameters:
             dimensions (tuple[int, int]): dimensions of the maze (row, column)
+            compact (bool): keep the items in an ItemTable instead of a dict
         """
         self._dimensions = dimensions
         self._row = dimensions[1]
         self._column = dimensions[0]
-        self._items = {}
-        self._has_coin = []
+        self._items = ItemTable(self._row) if compact else {}
+        self._removed = {}
+        self._shared = False
+        # Built when first searched, for the items not yet removed. Once
+        # shared with copies it holds every item in _items, removed or not
+        self._index = None
+        self._index_shared = False
+        self._coins = ZERO
         self._row_count = ZERO
         self._start = None
         self._maze = Maze(self._dimensions)
@@ -615,18 +1834,51 @@ class Level:
         """
         return self._maze
 
+    def copy(self) -> Level:
+        """Copies the level so it can be played separately. The tiles and
+           the items it was loaded with are shared with this level rather
+           than copied, so this is O(items removed so far).
+
+        Returns:
+            Level: a new level in the same state as this one
+        """
+        # Neither level may change the shared items from now on, only
+        # the record of what has been removed from them
+        self._shared = True
+        if self._index is not None and not self._index_shared:
+            for position, item in self._removed.items():
+                self._index.add(position, item.get_id())
+            self._index_shared = True
+        # Made without __init__, which would build a maze only to replace it
+        level = Level.__new__(Level)
+        level._dimensions = self._dimensions
+        level._row = self._row
+        level._column = self._column
+        level._items = self._items
+        level._shared = True
+        level._index = self._index
+        level._index_shared = self._index_shared
+        level._removed = dict(self._removed)
+        level._coins = self._coins
+        level._row_count = self._row_count
+        level._start = self._start
+        level._maze = self._maze.copy()
+        return level
+
     def attempt_unlock_door(self) -> None:
         """Unlocks the doors in the maze if there are no coins remaining.
         """
-        # puts all the values from dictionary in a list
-        # checks that list if it doesn't contain coin
-        for item in self._items.values():
-            self._has_coin.append(item.get_id())
-
-        if COIN not in self._has_coin:
+        # The number of coins left is kept up to date as items are added
+        # and removed, so there is no need to look through the items
+        if self._coins == ZERO:
             self._maze.unlock_door()
 
-        self._has_coin = []
+    def get_coins_remaining(self) -> int:
+        """
+        Returns:
+            int: the number of coins still to be collected in this level.
+        """
+        return self._coins
 
     def add_row(self, row: str) -> None:
         """Adds the tiles and entities from the row to this level.
@@ -634,20 +1886,16 @@ class Level:
         Parameters:
             row (str): row of maze
         """
-        column_num = ZERO
-
-        # iterates through row and gets the entities and assigns it a class
+        # finds the entities in the row and assigns them a class
         # the walls in the row are added using the def from the Maze class
-        for char in row:
-            position = self._row_count, column_num
-
-            if char in ITEMS:
-                self.add_entity(position, char)
+        for entity in ENTITY_PATTERN.finditer(row):
+            position = self._row_count, entity.start()
 
-            elif char == PLAYER:
+            if entity.group() == PLAYER:
                 self.add_player_start(position)
 
-            column_num = column_num + ONE
+            else:
+                self.add_entity(position, entity.group())
 
         self._row_count = self._row_count + ONE  # Keeps track of row
                                                  # in this maze
@@ -660,20 +1908,47 @@ class Level:
             position (tuple[int, int]): (row, column) position on maze
             entity_id (str): item on maze to be collected
         """
-        if entity_id == POTION:
-            self._items[position] = Potion(position)
-
-        elif entity_id == HONEY:
-            self._items[position] = Honey(position)
-
-        elif entity_id == APPLE:
-            self._items[position] = Apple(position)
+        # Every kind of item is registered in ITEM_EFFECTS by its id
+        effect = ITEM_EFFECTS.get(entity_id)
+        if effect is not None:
+            self.put_item(effect.make(position))
 
-        elif entity_id == WATER:
-            self._items[position] = Water(position)
+    def put_item(self, item: Item) -> None:
+        """Places the item at its position, keeping the coin count up to date.
+           Also used to put back an item that was removed.
 
-        elif entity_id == COIN:
-            self._items[position] = Coin(position)
+        Parameters:
+            item (Item): item to place on the maze
+        """
+        position = item.get_position()
+        replaced = self.get_item(position)
+
+        # Putting back a removed item only needs it forgetting that it was
+        # removed, anything else is added, copying shared items first.
+        # Items are compared by kind, as an ItemTable makes new instances
+        held = self._items.get(position)
+        if held is None or held.get_id() != item.get_id():
+            if self._shared:
+                self._items = self._items.copy()
+                self._shared = False
+                self._index = None
+                self._index_shared = False
+            self._items[position] = item
+
+            if self._index is not None:
+                if held is not None:
+                    self._index.discard(position, held.get_id())
+                self._index.add(position, item.get_id())
+        elif self._index is not None and not self._index_shared \
+                and position in self._removed:
+            self._index.add(position, item.get_id())
+        self._removed.pop(position, None)
+
+        if replaced is not None and replaced.get_id() == COIN:
+            self._coins = self._coins - ONE
+
+        if item.get_id() == COIN:
+            self._coins = self._coins + ONE
 
     def get_dimensions(self) -> tuple[int, int]:
         """
@@ -682,14 +1957,112 @@ class Level:
         """
         return self._dimensions
 
-    def get_items(self) -> dict[tuple[int, int], Item]:
+    def get_items(self) -> Mapping[tuple[int, int], Item]:
+        """
+        Returns:
+            Mapping[tuple[int, int], Item]: a mapping from position to the
+                                            Item at that position for all
+                                            items currently in this level.
+        """
+        return LevelItems(self._items, self._removed)
+
+    def get_item(self, position: tuple[int, int]) -> Optional[Item]:
         """
+        Parameters:
+            position (tuple[int, int]): (row, column) on the maze
+
         Returns:
-            dict[tuple[int, int], Item]: a mapping from position to the Item
-                                         at that position for all items
-                                         currently in this level.
+            Optional[Item]: the item currently at the position, if any
         """
-        return self._items
+        item = self._items.get(position)
+        if item is not None and position in self._removed:
+            return None
+        return item
+
+    def _get_index(self) -> ItemIndex:
+        """
+        Returns:
+            ItemIndex: the positions of the items in this level, built when
+                       first needed. A shared index also holds the removed
+                       items, which _skipped leaves out
+        """
+        if self._index is None:
+            index = ItemIndex()
+            removed = self._removed
+            for position, item in self._items.items():
+                if position not in removed:
+                    index.add(position, item.get_id())
+            self._index = index
+            self._index_shared = False
+        return self._index
+
+    def _skipped(self) -> dict[tuple[int, int], Item]:
+        """
+        Returns:
+            dict[tuple[int, int], Item]: the removed items that searching
+                                         the index can still find
+        """
+        return self._removed if self._index_shared else {}
+
+    def get_items_in_area(self, first: tuple[int, int],
+                          last: tuple[int, int],
+                          kinds: Optional[Collection[str]] = None
+                          ) -> dict[tuple[int, int], Item]:
+        """
+        Parameters:
+            first (tuple[int, int]): (row, column) of the top left corner
+            last (tuple[int, int]): (row, column) of the bottom right corner
+            kinds (Optional[Collection[str]]): ids of the items to find,
+                                               e.g. [COIN], defaults to all
+
+        Returns:
+            dict[tuple[int, int], Item]: the items currently between the
+                                         corners, inclusive
+        """
+        index = self._get_index()
+        removed = self._skipped()
+        return {position: self._items[position] for position
+                in index.find_in_area(first, last, kinds)
+                if position not in removed}
+
+    def get_items_near(self, position: tuple[int, int], radius: int,
+                       kinds: Optional[Collection[str]] = None
+                       ) -> dict[tuple[int, int], Item]:
+        """
+        Parameters:
+            position (tuple[int, int]): (row, column) to search around
+            radius (int): the most steps away an item can be, counted as
+                          |rows apart| + |columns apart|
+            kinds (Optional[Collection[str]]): ids of the items to find,
+                                               defaults to all
+
+        Returns:
+            dict[tuple[int, int], Item]: the items currently within radius
+        """
+        index = self._get_index()
+        removed = self._skipped()
+        return {found: self._items[found] for found
+                in index.find_near(position, radius, kinds)
+                if found not in removed}
+
+    def get_nearest_item(self, position: tuple[int, int],
+                         kinds: Optional[Collection[str]] = None,
+                         radius: Optional[int] = None) -> Optional[Item]:
+        """
+        Parameters:
+            position (tuple[int, int]): (row, column) to search from
+            kinds (Optional[Collection[str]]): ids of the items to find,
+                                               defaults to all
+            radius (Optional[int]): the most steps away the item can be,
+                                    counted as |rows apart| + |columns apart|
+
+        Returns:
+            Optional[Item]: the nearest item of those kinds currently in the
+                            level, or None if there is none within radius
+        """
+        index = self._get_index()
+        found = index.find_nearest(position, kinds, radius, self._skipped())
+        return None if found is None else self._items[found]
 
     def remove_item(self, position: tuple[int, int]) -> None:
         """Deletes the item from the given position
@@ -701,7 +2074,59 @@ class Level:
         Precondition:
             There is an Item instance at the position
         """
-        self._items.pop(position)
+        item = self.get_item(position)
+        if item is None:
+            raise KeyError(position)
+        self._removed[position] = item
+
+        # A level's own index just forgets the item, but a shared one must
+        # keep it for the other levels, so is only rebuilt for this level
+        # once searching it would mostly find removed items
+        if self._index is not None:
+            if not self._index_shared:
+                self._index.discard(position, item.get_id())
+            elif len(self._removed) > REBUILD_SHARE * len(self._items):
+                self._index = None
+                self._index_shared = False
+
+        if item.get_id() == COIN:
+            self._coins = self._coins - ONE
+
+    def get_state(self) -> tuple[dict[tuple[int, int], Item], bool]:
+        """Captures what has changed in this level since it was loaded.
+
+        Returns:
+            tuple[dict[tuple[int, int], Item], bool]: the items removed from
+                                                      each position, and if
+                                                      the doors are unlocked
+        """
+        return dict(self._removed), self._maze.is_unlocked()
+
+    def set_state(self, state: tuple[dict[tuple[int, int], Item], bool]
+                  ) -> None:
+        """Returns the level to a state from get_state. Only positions that
+           differ between the two states are touched.
+
+        Parameters:
+            state (tuple[dict[tuple[int, int], Item], bool]): the state to
+                                                              return to
+        """
+        removed, unlocked = state
+
+        # Puts back items that weren't removed yet in that state
+        for position, item in list(self._removed.items()):
+            if position not in removed:
+                self.put_item(item)
+
+        # Takes away items that had been removed by then
+        for position, item in removed.items():
+            if position not in self._removed and position in self._items:
+                self.remove_item(position)
+
+        if unlocked:
+            self._maze.unlock_door()
+        else:
+            self._maze.lock_door()
 
     def add_player_start(self, position: tuple[int, int]) -> None:
         """Adds the start position for the player in this level.
@@ -726,7 +2151,7 @@ class Level:
             str: a string representation of this level.
         """
         return f'Maze: {Maze.__str__(self._maze)}\nItems: ' \
-               f'{self._items}\nPlayer start: {self._start}'
+               f'{dict(self.get_items())}\nPlayer start: {self._start}'
 
     def __repr__(self) -> str:
         """Returns a string that could be copied and pasted to construct a
@@ -738,30 +2163,189 @@ class Level:
         return f'{type(self).__name__}({self._dimensions})'
 
 
+class GameSnapshot:
+    """A point in a game that a Model can be returned to.
+
+       Only the current level's changes are stored, as an overlay of the items
+       removed from it, so taking a snapshot costs O(changes) rather than a
+       copy of the whole level. Later levels are always unplayed at that point.
+    """
+    def __init__(self, level: int, valid_move: int,
+                 flags: tuple[bool, bool, bool], player: tuple,
+                 level_state: tuple[dict[tuple[int, int], Item], bool]
+                 ) -> None:
+        """
+        Parameters:
+            level (int): index of the current level
+            valid_move (int): valid moves made since hunger and thirst last
+                              changed
+            flags (tuple[bool, bool, bool]): won, lost and levelled up
+            player (tuple): the state of the player, from Player.get_state
+            level_state (tuple[dict[tuple[int, int], Item], bool]): the state
+                of the current level, from Level.get_state
+        """
+        self._level = level
+        self._valid_move = valid_move
+        self._flags = flags
+        self._player = player
+        self._level_state = level_state
+
+    def get_level_number(self) -> int:
+        """
+        Returns:
+            int: the index of the level the snapshot was taken on
+        """
+        return self._level
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the level and player position
+        """
+        return f'{type(self).__name__}(level={self._level}, ' \
+               f'position={self._player[0]})'
+
+
+class TurnDelta:
+    """What changed in the game during one turn, so that the turn can be
+       undone and redone in O(1) no matter how large the level is.
+
+       Stats and positions are stored as the change actually made, after any
+       limits were applied, so adding them back exactly reverses the turn.
+    """
+    def __init__(self, move: tuple[int, int], stats: tuple[int, int, int],
+                 valid_move: int, level: int = ZERO,
+                 item: Optional[Item] = None, consumed: bool = False,
+                 unlocked: bool = False, won: bool = False,
+                 level_state: Optional[tuple] = None) -> None:
+        """
+        Parameters:
+            move (tuple[int, int]): change in the player's (row, column)
+            stats (tuple[int, int, int]): change in (health, hunger, thirst)
+            valid_move (int): change in the count of valid moves
+            level (int): number of levels moved up, zero or one
+            item (Optional[Item]): the item collected or used, if any
+            consumed (bool): True if the item was used rather than collected
+            unlocked (bool): True if the doors unlocked this turn
+            won (bool): True if this turn won the game
+            level_state (Optional[tuple]): the state of the level that was
+                                           left, kept only if it was evicted
+        """
+        self._move = move
+        self._stats = stats
+        self._valid_move = valid_move
+        self._level = level
+        self._item = item
+        self._consumed = consumed
+        self._unlocked = unlocked
+        self._won = won
+        self._level_state = level_state
+
+    def get_move(self) -> tuple[int, int]:
+        """
+        Returns:
+            tuple[int, int]: the change in the player's (row, column)
+        """
+        return self._move
+
+    def get_stats(self) -> tuple[int, int, int]:
+        """
+        Returns:
+            tuple[int, int, int]: the change in (health, hunger, thirst)
+        """
+        return self._stats
+
+    def get_item(self) -> Optional[Item]:
+        """
+        Returns:
+            Optional[Item]: the item collected or used this turn, if any
+        """
+        return self._item
+
+    def is_consumed(self) -> bool:
+        """
+        Returns:
+            bool: True if the item was used rather than collected
+        """
+        return self._consumed
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the changes made
+        """
+        return f'{type(self).__name__}(move={self._move}, ' \
+               f'stats={self._stats}, level={self._level}, ' \
+               f'item={self._item!r}, consumed={self._consumed}, ' \
+               f'unlocked={self._unlocked}, won={self._won})'
+
+
 class Model:
     """Used to understand and mutate the game state. Keeps track of a Player,
        and multiple Level instances. Provides the interface through which the
         controller can request information about the game state, and request
         changes to the game state.
     """
-    def __init__(self, game_file: str) -> None:
+    def __init__(self, game_file: str, lazy: bool = False,
+                 evict_completed: bool = False,
+                 record_history: bool = False,
+                 instrumentation: Optional[Instrumentation] = None,
+                 levels: Optional[list[Level]] = None,
+                 compact: bool = False,
+                 history_limit: Optional[int] = HISTORY_LIMIT) -> None:
         """Sets up the model from the game file
 
         Parameters:
             game_file (str): contains game information
+            lazy (bool): only read each level from the file when it is
+                         reached, instead of all of them up front
+            evict_completed (bool): with lazy, forget each level once the
+                                    player has moved past it
+            record_history (bool): keep a TurnDelta for each turn so that
+                                   turns can be undone and redone
+            instrumentation (Optional[Instrumentation]): times the methods
+                                                         in INSTRUMENTED
+            levels (Optional[list[Level]]): levels already loaded from the
+                                            game file, to play instead of
+                                            loading it again
+            compact (bool): keep each level's items in an ItemTable, which
+                            uses a few bytes per item
+            history_limit (Optional[int]): the most turns kept for undo, or
+                                           None to keep every turn
         """
         self._game_file = game_file
-        self._levels = load_game(self._game_file)
+        lazy = lazy and levels is None \
+            and not is_compiled_game(self._game_file)
+        if levels is not None:
+            self._levels = levels
+        elif lazy:
+            self._levels = LazyLevels(self._game_file, compact)
+        else:
+            # Only what changes while playing is held by each game
+            self._levels = [level.copy()
+                            for level in load_template(self._game_file,
+                                                       compact)]
+        self._evict_completed = lazy and evict_completed
         self._won = False
         self._lost = False
         self._level_up = False
         self._current_level = ZERO
         self._valid_move = ZERO
+        self._history = deque(maxlen=history_limit) if record_history \
+            else None
+        self._undone = []
         self._max_level = len(self._levels) - ONE  # Compensates due to lists
                                                    # starting from zero
         # Gets players position from maze
         self._player = Player(Model.get_level(self).get_player_start())
 
+        # Timed versions replace the methods on this instance only, so an
+        # uninstrumented model calls the methods directly
+        if instrumentation is not None:
+            for name in INSTRUMENTED:
+                setattr(self, name,
+                        instrumentation.timed(name, getattr(self, name)))
+
     def has_won(self) -> bool:
         """ A game has been won if all the levels have been successfully
             completed
@@ -792,6 +2376,13 @@ class Model:
         """
         return self._levels[self._current_level]
 
+    def get_level_number(self) -> int:
+        """
+        Returns:
+            int: the index of the current level, starting from zero
+        """
+        return self._current_level
+
     def level_up(self) -> None:
         """Changes the level to the next level in the game.
            If no more levels remain, the player has won the game.
@@ -802,6 +2393,9 @@ class Model:
             self._won = True
 
         else:
+            if self._evict_completed:
+                self._levels.evict(self._current_level)
+
             self._current_level = self._current_level + ONE
             self._level_up = True
             start_pos = self.get_level().get_player_start()
@@ -815,44 +2409,258 @@ class Model:
         """
         return self._level_up
 
+    def snapshot(self) -> GameSnapshot:
+        """
+        Returns:
+            GameSnapshot: the current state of the game, which can be given
+                          to restore to return to it
+        """
+        return GameSnapshot(self._current_level, self._valid_move,
+                            (self._won, self._lost, self._level_up),
+                            self._player.get_state(),
+                            self.get_level().get_state())
+
+    def restore(self, snapshot: GameSnapshot) -> None:
+        """Returns the game to the state it was in when the snapshot was taken.
+           The same snapshot can be restored any number of times.
+
+        Parameters:
+            snapshot (GameSnapshot): a snapshot taken from this model
+        """
+        pristine = ({}, False)
+
+        # Levels reached since the snapshot go back to being unplayed
+        for index in range(snapshot._level + ONE, self._current_level + ONE):
+            if not isinstance(self._levels, LazyLevels) \
+                    or self._levels.is_loaded(index):
+                self._levels[index].set_state(pristine)
+
+        self._current_level = snapshot._level
+        self._valid_move = snapshot._valid_move
+        self._won, self._lost, self._level_up = snapshot._flags
+        self._player.set_state(snapshot._player)
+        self.get_level().set_state(snapshot._level_state)
+
     def move_player(self, delta: tuple[int, int]) -> None:
         """Tries to move the player by the requested (row, column) change
 
         Parameters:
-            delta (tuple[int, int]): Requested player movement
+            delta (tuple[int, int]): Requested player movement, usually one
+                                     of the values of MOVE_DELTAS
         """
-        cur_pos = self._player.get_position()
-        # current x, y pos plus movement x,y
-        new_pos = (cur_pos[0] + delta[0],
-                   cur_pos[1] + delta[1])
+        before = self._begin_turn()
+        item = None
+        maze = self.get_current_maze()
+        position = self._player.get_position()
+        move = maze.get_move(position, delta)
 
-        # tries to get tile for the next position
-        # if it is out of the scope of dimension
-        # which can only happen when moving out of maze from door
-        # activates level up
-
-        try:
-            self.get_current_maze().get_tile(new_pos)
-            next_tile = self.get_current_maze().get_tile(new_pos)
-
-            if not next_tile.is_blocking():
-                self._player.set_position(new_pos)
-                self._player.change_health(-ONE)
-                self._player.change_health(-(next_tile.damage()))
-                self._valid_move = self._valid_move + ONE
-                self.get_level().attempt_unlock_door()
-
-                if new_pos in Model.get_current_items(self):
-                    Model.attempt_collect_item(self, new_pos)
-
-                # every five moves updates thirst and hunger
-                if self._valid_move == TIME_TO_CHANGE:
-                    self._player.change_hunger(ONE)
-                    self._player.change_thirst(ONE)
-                    self._valid_move = ZERO
-        except:
+        # Leaving the maze by its bottom or right edge activates level up
+        if move == EXIT_MOVE:
             self.level_up()
 
+        elif move != BLOCKED_MOVE:
+            new_pos = (position[0] + delta[0], position[1] + delta[1])
+            self._player.set_position(new_pos)
+            self._player.change_health(-ONE)
+            self._player.change_health(-move)
+            self._valid_move = self._valid_move + ONE
+
+            # Collecting an item also checks if the doors can unlock
+            item = self.get_level().get_item(new_pos)
+            if item is not None:
+                self.attempt_collect_item(new_pos)
+
+            else:
+                self.attempt_unlock_door()
+
+            # every five moves updates thirst and hunger
+            if self._valid_move == TIME_TO_CHANGE:
+                self._player.change_hunger(ONE)
+                self._player.change_thirst(ONE)
+                self._valid_move = ZERO
+
+        if before is not None:
+            self._end_turn(before, item)
+
+    def use_item(self, item_name: str) -> Optional[Item]:
+        """Applies the first item with the given name in the players
+           inventory to the player, removing it from the inventory.
+
+        Parameters:
+            item_name (str): name of the item to use
+
+        Returns:
+            Optional[Item]: the item used, or None if the player has none
+        """
+        before = self._begin_turn()
+        item = self.get_player_inventory().remove_item(item_name)
+
+        if item is not None:
+            ITEM_EFFECTS[item.get_id()].apply(self._player)
+
+            if before is not None:
+                self._end_turn(before, item, True)
+
+        return item
+
+    def get_history(self) -> list[TurnDelta]:
+        """
+        Returns:
+            list[TurnDelta]: the turns made that can be undone, oldest
+                             first. Empty unless recording history
+        """
+        return list(self._history or [])
+
+    def is_recording_history(self) -> bool:
+        """
+        Returns:
+            bool: True if turns are kept so that they can be undone
+        """
+        return self._history is not None
+
+    def can_undo(self) -> bool:
+        """
+        Returns:
+            bool: True if there is a turn to undo
+        """
+        return bool(self._history)
+
+    def can_redo(self) -> bool:
+        """
+        Returns:
+            bool: True if there is an undone turn to redo
+        """
+        return bool(self._undone)
+
+    def undo(self) -> bool:
+        """Reverses the most recent turn.
+
+        Returns:
+            bool: True if a turn was undone
+        """
+        if not self._history:
+            return False
+
+        turn = self._history.pop()
+        self._apply_turn(turn, -ONE)
+        self._undone.append(turn)
+        return True
+
+    def redo(self) -> bool:
+        """Makes the most recently undone turn again.
+
+        Returns:
+            bool: True if a turn was redone
+        """
+        if not self._undone:
+            return False
+
+        turn = self._undone.pop()
+        self._apply_turn(turn, ONE)
+        self._history.append(turn)
+        return True
+
+    def _begin_turn(self) -> Optional[tuple]:
+        """
+        Returns:
+            Optional[tuple]: what _end_turn needs to work out the changes
+                             made this turn, or None if not recording history
+        """
+        if self._history is None:
+            return None
+
+        return (self._current_level, self.get_level(),
+                self._player.get_position(), self.get_player_stats(),
+                self._valid_move, self.get_current_maze().is_unlocked(),
+                self._won)
+
+    def _end_turn(self, before: tuple, item: Optional[Item],
+                  consumed: bool = False) -> None:
+        """Records the changes made since _begin_turn as a TurnDelta.
+
+        Parameters:
+            before (tuple): the value returned from _begin_turn
+            item (Optional[Item]): the item collected or used, if any
+            consumed (bool): True if the item was used rather than collected
+        """
+        level_num, level, position, stats, valid_move, unlocked, won = before
+        new_position = self._player.get_position()
+        new_stats = self.get_player_stats()
+        level_state = None
+
+        # An evicted level can't be kept, so what was changed in it is
+        if self._evict_completed and self._current_level != level_num:
+            level_state = level.get_state()
+
+        self._history.append(TurnDelta(
+            (new_position[0] - position[0], new_position[1] - position[1]),
+            (new_stats[0] - stats[0], new_stats[1] - stats[1],
+             new_stats[2] - stats[2]),
+            self._valid_move - valid_move, self._current_level - level_num,
+            item, consumed, level.get_maze().is_unlocked() != unlocked,
+            self._won != won, level_state))
+        self._undone.clear()
+
+    def _apply_turn(self, turn: TurnDelta, direction: int) -> None:
+        """Makes or reverses the changes in a turn.
+
+        Parameters:
+            turn (TurnDelta): the turn to change the game by
+            direction (int): ONE to make the turn again, -ONE to reverse it
+        """
+        player = self._player
+        inventory = self.get_player_inventory()
+
+        # The player's position is moved by the turn's change below, so
+        # levels are changed without moving them to the start
+        if turn._level and direction == ONE:
+            if self._evict_completed:
+                self._levels.evict(self._current_level)
+            self._current_level = self._current_level + turn._level
+
+        elif turn._level:
+            self._current_level = self._current_level - turn._level
+            if turn._level_state is not None:
+                self.get_level().set_state(turn._level_state)
+
+        level = self.get_level()
+        position = player.get_position()
+        player.set_position((position[0] + direction * turn._move[0],
+                             position[1] + direction * turn._move[1]))
+        health, hunger, thirst = turn._stats
+        player.change_health(direction * health)
+        player.change_hunger(direction * hunger)
+        player.change_thirst(direction * thirst)
+        self._valid_move = self._valid_move + direction * turn._valid_move
+
+        item = turn._item
+        if item is not None and turn._consumed:
+            if direction == ONE:
+                inventory.remove_item(item.get_name())
+            else:
+                inventory.return_item(item)
+
+        elif item is not None:
+            if direction == ONE:
+                level.remove_item(item.get_position())
+                inventory.add_item(item)
+            else:
+                inventory.remove_last_item(item.get_name())
+                level.put_item(item)
+
+        if turn._unlocked and direction == ONE:
+            level.get_maze().unlock_door()
+
+        elif turn._unlocked:
+            level.get_maze().lock_door()
+
+        if turn._won:
+            self._won = direction == ONE
+
+        # has_lost works out if the game is lost again from the stats
+        self._lost = False
+        self._level_up = self._current_level > ZERO
+
     def attempt_collect_item(self, position: tuple[int, int]) -> None:
         """Collects the item at the given position if one exists.
 
@@ -860,8 +2668,13 @@ class Model:
             position (tuple[int, int]): (row, column) of player position
         """
 
-        self._player.add_item(self.get_level().get_items().get(position))
+        self._player.add_item(self.get_level().get_item(position))
         self.get_level().remove_item(position)
+        self.attempt_unlock_door()
+
+    def attempt_unlock_door(self) -> None:
+        """Unlocks the doors of the current level if no coins remain.
+        """
         self.get_level().attempt_unlock_door()
 
     def get_player(self) -> Player:
@@ -895,12 +2708,12 @@ class Model:
         """
         return self.get_level().get_maze()
 
-    def get_current_items(self) -> dict[tuple[int, int], Item]:
+    def get_current_items(self) -> Mapping[tuple[int, int], Item]:
         """
         Returns:
-            dict[tuple[int, int], Item]: a dictionary mapping tuple positions
-                                         to the item that currently exists at
-                                         that position on the maze.
+            Mapping[tuple[int, int], Item]: a mapping from tuple positions
+                                            to the item that currently exists
+                                            at that position on the maze.
         """
         return self.get_level().get_items()
 
@@ -920,8 +2733,115 @@ class Model:
         return f"{type(self).__name__}('{self._game_file}')"
 
 
+def parse_moves(command: str) -> Optional[str]:
+    """
+    Parameters:
+        command (str): moves from MOVE_DELTAS, each optionally preceded by
+                       how many times to make it, e.g. "wwwddds" or "10d"
+
+    Returns:
+        Optional[str]: every move in order, one character each, or None if
+                       the command is not a batch of moves
+
+    Raises:
+        ValueError: with the message to show, if a move is made zero times
+                    or the batch would make more than MAX_BATCH moves
+    """
+    if MOVE_BATCH.fullmatch(command) is None:
+        return None
+
+    moves = []
+    total = ZERO
+    for count, move in MOVE_REPEAT.findall(command):
+        repeat = int(count) if count else ONE
+        if repeat == ZERO:
+            raise ValueError(ZERO_MOVES)
+
+        total = total + repeat
+        if total > MAX_BATCH:
+            raise ValueError(TOO_MANY_MOVES)
+        moves.append(move * repeat)
+    return ''.join(moves)
+
+
+def hash_game_file(filename: str) -> str:
+    """
+    Parameters:
+        filename: The path to the game file
+
+    Returns:
+        The SHA-256 of the file's contents, in hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stats_checksum(stats: tuple[int, int, int]) -> str:
+    """
+    Parameters:
+        stats: The (health, hunger, thirst) from Model.get_player_stats
+
+    Returns:
+        A short checksum of the stats, as written to replay logs
+    """
+    return f'{zlib.crc32(REPLAY_STATS.pack(*stats)):08x}'
+
+
+class ReplayWriter:
+    """Writes the inputs of a game session to a replay log as they are made.
+
+       The log is only ever appended to and is buffered, so recording costs
+       little more than the string for each input.
+    """
+    def __init__(self, game_file: str, log_file: str,
+                 check_interval: int = REPLAY_CHECK_INTERVAL) -> None:
+        """
+        Parameters:
+            game_file (str): path of the game being played
+            log_file (str): path to write the replay log to
+            check_interval (int): number of inputs between stat checksums
+        """
+        self._file = open(log_file, 'w')
+        self._check_interval = check_interval
+        self._inputs = ZERO
+        self._checked = True
+        self._file.write(f'{REPLAY_HEADER}\n{REPLAY_GAME} '
+                         f'{hash_game_file(game_file)} {game_file}\n')
+
+    def record(self, entry: str, stats: tuple[int, int, int]) -> None:
+        """Adds an input to the log.
+
+        Parameters:
+            entry (str): a move, "i <Item>", or undo or redo
+            stats (tuple[int, int, int]): the player's stats after the input
+        """
+        self._file.write(entry + NEW_LINE)
+        self._inputs = self._inputs + ONE
+        self._checked = self._inputs % self._check_interval == ZERO
+        if self._checked:
+            self._file.write(f'{REPLAY_CHECK} {stats_checksum(stats)}\n')
+
+    def close(self, stats: tuple[int, int, int]) -> None:
+        """Finishes the log with a checksum of the final stats.
+
+        Parameters:
+            stats (tuple[int, int, int]): the player's final stats
+        """
+        if not self._file.closed:
+            if not self._checked:
+                self._file.write(f'{REPLAY_CHECK} {stats_checksum(stats)}\n')
+            self._file.close()
+
+
 class MazeRunner:
-    def __init__(self, game_file: str, view: UserInterface) -> None:
+    def __init__(self, game_file: str, view: UserInterface,
+                 replay_file: Optional[str] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 levels: Optional[list[Level]] = None,
+                 undo: bool = True) -> None:
         """Creates a new MazeRunner game with the given view and a new Model
            instantiated using the given game file.
 
@@ -929,79 +2849,218 @@ class MazeRunner:
             game_file (str): contains game information
             view (UserInterface): Abstract class providing an interface
                                   for any MazeRunner View class.
-        """
-        self._model = Model(game_file)
-        self._player_inv = self._model.get_player_inventory().get_items()
+            replay_file (Optional[str]): path to write a replay log of the
+                                         session to, if any
+            instrumentation (Optional[Instrumentation]): times the model,
+                                                         drawing and waiting
+                                                         for input each turn
+            levels (Optional[list[Level]]): levels already loaded from the
+                                            game file, to play instead of
+                                            loading it again
+            undo (bool): keep the last HISTORY_LIMIT turns so that they can
+                         be undone and redone
+        """
+        self._model = Model(game_file, record_history=undo,
+                            instrumentation=instrumentation, levels=levels)
         self._finished = False
-        self.display()
         self._view = view
+        self._replay = None
+        if replay_file is not None:
+            self._replay = ReplayWriter(game_file, replay_file)
+        self._instrumentation = instrumentation
+        # Inputs that are always carried out the same way, anything else is
+        # an item to use or a batch of moves
+        self._commands = {UNDO: self._undo, REDO: self._redo}
+        for move in MOVE_DELTAS:
+            self._commands[move] = partial(self.make_moves, move)
+        if instrumentation is not None:
+            self.display = instrumentation.timed('render', self.display)
+            self._read_move = instrumentation.timed('input', self._read_move)
+            self._end_turn = instrumentation.end_turn
+        self.display()
+
+    def record(self, entry: str) -> None:
+        """Adds an input to the replay log, if one is being written.
+
+        Parameters:
+            entry (str): the input that was made
+        """
+        if self._replay is not None:
+            self._replay.record(entry, self._model.get_player_stats())
 
     def display(self):
-        """Gets the text display for the Game
+        """Draws the game with the view
         """
-        TextInterface().draw(self._model.get_current_maze(),
-                             self._model.get_current_items(),
-                             self._model.get_player().get_position(),
-                             self._model.get_player_inventory(),
-                             self._model.get_player_stats())
+        self._view.draw(self._model.get_current_maze(),
+                        self._model.get_current_items(),
+                        self._model.get_player().get_position(),
+                        self._model.get_player_inventory(),
+                        self._model.get_player_stats())
 
     def play(self) -> None:
         """Executes the entire game until a win or loss occurs
         """
-        # Loop continues till game lost or won
+        try:
+            self._play()
+        finally:
+            if self._replay is not None:
+                self._replay.close(self._model.get_player_stats())
+            if self._instrumentation is not None:
+                self._instrumentation.close()
+
+    def _read_move(self, prompt: str) -> str:
+        """
+        Parameters:
+            prompt (str): shown to the user
+
+        Returns:
+            str: the move the user entered
+        """
+        return input(prompt)
+
+    def _end_turn(self, **fields) -> None:
+        """Ends a turn. Does nothing unless the game is instrumented.
+
+        Parameters:
+            fields: describes the turn, e.g. the input
+        """
+
+    def _output(self, *text: str) -> None:
+        """Shows a message to the user.
+
+        Parameters:
+            text (str): the message, as print takes it
+        """
+        print(*text)
+
+    def is_finished(self) -> bool:
+        """
+        Returns:
+            bool: True once the game has been won or lost
+        """
+        return self._finished
+
+    def _play(self) -> None:
+        """Reads and makes moves until a win or loss occurs
+        """
+        # Loop continues till game lost or won, or the input ends when it
+        # is read from a file or pipe
         while not self._finished:
-            not_usable = True
-            print()
-            move = input("Enter a move: ")
+            self._output()
+            try:
+                move = self._read_move("Enter a move: ")
+            except EOFError:
+                return
+            self.take_turn(move)
+
+    def take_turn(self, move: str) -> None:
+        """Makes the move entered by the user and shows the result.
+
+        Parameters:
+            move (str): a move or batch of moves, "i <Item>", or undo or redo
+        """
+        command = self._commands.get(move)
+        if command is not None:
+            command()
+
+        elif 'i ' in move:  # Checks if move is "i xxxx"
+            self._use_items(move)
+
+        else:
+            try:
+                moves = parse_moves(move)
+            except ValueError as error:
+                self._output(str(error))
+            else:
+                if moves:
+                    self.make_moves(moves)
+
+        self._end_turn(input=move)
+
+    def _use_items(self, move: str) -> None:
+        """Uses every item named in the move, from the player's inventory.
+
+        Parameters:
+            move (str): "i <Item>", or any input containing "i "
+        """
+        not_usable = True
+        # "i <name>" is looked up directly, anything else is searched
+        # for the name of every item that can be used
+        effect = ITEM_EFFECTS_BY_NAME.get(move[2:]) \
+            if move.startswith('i ') else None
+        if effect is not None and effect.is_usable():
+            names = [effect.get_name()]
+        else:
+            names = [item for item in USABLE_NAME if item in move]
+
+        for item in names:  # Applies each item to the player
+            not_usable = False
 
-            if 'i ' in move:  # Checks if move is "i xxxx"
-                for item in USABLE_NAME:  # Checks if  "xxxx" part is an item
-                    if item in move:  # Checks if item was in user input
-                                      # Applies the item to the player
-                        not_usable = False
-                        if item in self._player_inv.keys():
-                            item_pos = self._player_inv[item][0].get_position()
+            # if item not in players inventory executes this
+            if self._model.use_item(item) is None:
+                self._output(ITEM_UNAVAILABLE_MESSAGE)
 
-                            if item == USABLE_NAME[0]:
-                                Water(item_pos).apply(self._model.get_player())
+            self.record(f'i {item}')
 
-                            elif item == USABLE_NAME[1]:
-                                Honey(item_pos).apply(self._model.get_player())
+        if not_usable:  # if Item not an real item
+            self._output()
+            self._output(NO_ITEM)
+            self._output()
 
-                            elif item == USABLE_NAME[2]:
-                                Potion(item_pos).apply(self._model.get_player())
+        self.display()
 
-                            elif item == USABLE_NAME[3]:
-                                Apple(item_pos).apply(self._model.get_player())
+    def _undo(self) -> None:
+        """Steps back to before the last turn made."""
+        if not self._model.undo():
+            self._output(NOTHING_TO_UNDO)
 
-                            self._model.get_player_inventory().remove_item(item)
+        # Without history undo does nothing, and a replay of it mustn't
+        if self._model.is_recording_history():
+            self.record(UNDO)
+        self.display()
 
-                        else:  # if item not in players inventory executes this
-                            print(ITEM_UNAVAILABLE_MESSAGE)
+    def _redo(self) -> None:
+        """Steps forward to after the last turn undone."""
+        if not self._model.redo():
+            self._output(NOTHING_TO_REDO)
 
-                if not_usable:  # if Item not an real item
-                    print()
-                    print(NO_ITEM)
-                    print()
+        if self._model.is_recording_history():
+            self.record(REDO)
+        self.display()
 
-                self.display()
+    def make_moves(self, moves: str) -> None:
+        """Makes each move in turn, stopping early if the game is won or lost
+           or the player reaches the next level, then draws the game once.
+
+        Parameters:
+            moves (str): moves from MOVE_DELTAS, one character each
+        """
+        level = self._model.get_level_number()
+        passed = []
+        for move in moves:
+            # Each move is its own turn, so undo and replays still step
+            # one move at a time
+            self._model.move_player(MOVE_DELTAS[move])
+            self.record(move)
+            passed.append(self._model.get_player().get_position())
 
-            # if valid move updates player position
             # Checks if the game has been won or lost
-            elif move in MOVE_DELTAS:
-                self._model.move_player(MOVE_DELTAS[move])
+            if self._model.has_lost() is True:
+                self._finished = True
+                self._output(LOSS_MESSAGE)
+                return
 
-                if self._model.has_lost() is True:
-                    self._finished = True
-                    print(LOSS_MESSAGE)
-                    break
+            elif self._model.has_won() is True:
+                self._finished = True
+                self._output(WIN_MESSAGE)
+                return
 
-                elif self._model.has_won() is True:
-                    self._finished = True
-                    print(WIN_MESSAGE)
-                    break
+            if self._model.get_level_number() != level:
+                break
 
-                self.display()
+        # Items may have been collected anywhere along the way
+        self._view.mark_changed(passed)
+        self.display()
 
 
 def main():
@@ -1009,7 +3068,25 @@ def main():
        given text file
     """
     given_file = input("Enter game file: ")
-    MazeRunner(given_file, UserInterface()).play()
+
+    # Only terminals understand the cursor movement used to redraw
+    # just the parts of the maze that change
+    if os.environ.get(VIEWPORT_ENVIRONMENT):
+        rows, columns = os.environ[VIEWPORT_ENVIRONMENT].lower().split('x')
+        view = ViewportTextInterface(int(rows), int(columns),
+                                     bool(os.environ.get(FOG_ENVIRONMENT)))
+    elif sys.stdout.isatty():
+        view = IncrementalTextInterface()
+    else:
+        view = TextInterface()
+
+    # A path given on the command line records a replay log of the session
+    replay_file = sys.argv[ONE] if len(sys.argv) > ONE else None
+    instrumentation = None
+    if os.environ.get(PROFILE_ENVIRONMENT):
+        instrumentation = Instrumentation(
+            JsonLinesSink(os.environ[PROFILE_ENVIRONMENT]))
+    MazeRunner(given_file, view, replay_file, instrumentation).play()
 
 
 if __name__ == '__main__':
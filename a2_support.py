@@ -1,4 +1,13 @@
+import shutil
+import sys
+from typing import Iterable, Optional
 from constants import PLAYER
+from visibility import visible_positions
+
+ESCAPE = '\x1b'
+CLEAR_SCREEN = ESCAPE + '[2J' + ESCAPE + '[H'
+FOG = '.'
+
 
 class UserInterface:
     """ Abstract class providing an interface for any MazeRunner View class. """
@@ -22,6 +31,16 @@ class UserInterface:
         self._draw_level(maze, items, player_position)
         self._draw_inventory(inventory)
         self._draw_player_stats(player_stats)
+
+    def mark_changed(self, positions: Iterable[tuple[int, int]]) -> None:
+        """ Notes positions that may have changed since the last frame,
+            besides where the player was and is. Only needed by views that
+            redraw part of the maze at a time.
+
+        Parameters:
+            positions: (row, column) of each position, e.g. those the player
+                       passed through in a batch of moves
+        """
     
     def _draw_inventory(self, inventory: 'Inventory') -> None:
         """ Draws the inventory information. Implemented in subclasses.
@@ -62,22 +81,235 @@ class TextInterface(UserInterface):
         items: dict[tuple[int, int], 'Item'],
         player_position: tuple[int, int]
     ) -> None:
-        num_rows, num_cols = maze.get_dimensions()
-        for row in range(num_rows):
-            row_str = ''
-            for col in range(num_cols):
-                if (row, col) == player_position:
-                    row_str += PLAYER
-                elif (row, col) in items:
-                    row_str += items.get((row, col)).get_id()
-                else:
-                    row_str += maze.get_tile((row, col)).get_id()
-            print(row_str)
+        print('\n'.join(self._level_rows(maze, items, player_position)))
     
     def _draw_inventory(self, inventory: 'Inventory') -> None:
-        text = str(inventory) if inventory.get_items() != {} else 'Empty'
-        print('---------------\nInventory\n' + text + '\n' + '---------------')
+        print(self._inventory_text(inventory))
     
     def _draw_player_stats(self, player_stats: tuple[int, int, int]) -> None:
+        print(self._player_stats_text(player_stats))
+
+    def _level_rows(
+        self,
+        maze: 'Maze',
+        items: dict[tuple[int, int], 'Item'],
+        player_position: tuple[int, int]
+    ) -> list[str]:
+        """ Returns the text for each row of the maze with its items and
+            the player on it. """
+        num_rows, num_cols = maze.get_dimensions()
+        rows = []
+        for row in range(num_rows):
+            row_chars = []
+            for col in range(num_cols):
+                row_chars.append(self._cell_text(
+                    maze, items, player_position, (row, col)))
+            rows.append(''.join(row_chars))
+        return rows
+
+    def _cell_text(
+        self,
+        maze: 'Maze',
+        items: dict[tuple[int, int], 'Item'],
+        player_position: tuple[int, int],
+        position: tuple[int, int]
+    ) -> str:
+        """ Returns the character drawn at one position of the maze. """
+        if position == player_position:
+            return PLAYER
+        item = items.get(position)
+        if item is not None:
+            return item.get_id()
+        return maze.get_tile(position).get_id()
+
+    def _inventory_text(self, inventory: 'Inventory') -> str:
+        text = str(inventory) or 'Empty'
+        return '---------------\nInventory\n' + text + '\n' + '---------------'
+
+    def _player_stats_text(self, player_stats: tuple[int, int, int]) -> str:
         hp, hunger, thirst = player_stats
-        print(f'HP: {hp}\nhunger: {hunger}\nthirst: {thirst}')
+        return f'HP: {hp}\nhunger: {hunger}\nthirst: {thirst}'
+
+
+class IncrementalTextInterface(TextInterface):
+    """ A TextInterface for ANSI terminals that keeps the last frame on
+        screen and only redraws the cells that changed since then: where the
+        player was and now is, items that were collected, and doors that
+        unlocked. Each frame is sent to the terminal in a single write.
+
+        The whole maze is only drawn for the first frame and whenever the
+        maze changes (a new level), or after redraw() is called. Items are
+        only collected where the player moves to, and only put back by undo
+        where the player was, so only the player's cells and those passed
+        to mark_changed are redrawn.
+
+        Cells are found by their position on screen, which is only right
+        while the whole frame fits in the terminal. Frames that would
+        scroll or wrap are drawn in full instead.
+    """
+    def __init__(
+        self,
+        output=None,
+        size: Optional[tuple[int, int]] = None
+    ) -> None:
+        """
+        Parameters:
+            output: Text stream to draw to, defaults to sys.stdout
+            size: (rows, columns) of the terminal, looked up for each frame
+                  if not given
+        """
+        self._output = output
+        self._size = size
+        self.redraw()
+
+    def redraw(self) -> None:
+        """ Forgets the last frame so the next one is drawn in full. """
+        self._maze = None
+        self._player_position = None
+        self._marked = set()
+        self._unlocked = False
+
+    def mark_changed(self, positions: Iterable[tuple[int, int]]) -> None:
+        self._marked.update(positions)
+
+    def draw(
+        self,
+        maze: 'Maze',
+        items: dict[tuple[int, int], 'Item'],
+        player_position: tuple[int, int],
+        inventory: 'Inventory',
+        player_stats: tuple[int, int, int]
+    ) -> None:
+        footer = self._inventory_text(inventory) + '\n' \
+            + self._player_stats_text(player_stats) + '\n'
+        frame = []
+        if maze is not self._maze or not self._fits(maze, footer):
+            frame.append(CLEAR_SCREEN)
+            frame.append('\n'.join(
+                self._level_rows(maze, items, player_position)) + '\n')
+            self._unlocked = maze.is_unlocked()
+        else:
+            for row, col in self._changed_cells(maze, items, player_position):
+                frame.append(f'{ESCAPE}[{row + 1};{col + 1}H')
+                frame.append(self._cell_text(
+                    maze, items, player_position, (row, col)))
+            frame.append(
+                f'{ESCAPE}[{maze.get_dimensions()[0] + 1};1H{ESCAPE}[J')
+
+        # Everything below the maze is small, so it is always redrawn
+        frame.append(footer)
+
+        output = self._output if self._output is not None else sys.stdout
+        output.write(''.join(frame))
+        output.flush()
+        self._marked.clear()
+        self._maze = maze
+        self._player_position = player_position
+
+    def _fits(self, maze: 'Maze', footer: str) -> bool:
+        """ Returns True if the maze and the footer below it fit in the
+            terminal without scrolling, leaving the cursor on screen. """
+        if self._size is not None:
+            rows, columns = self._size
+        else:
+            columns, rows = shutil.get_terminal_size()
+        num_rows, num_cols = maze.get_dimensions()
+        lines = sum(max(1, -(-len(line) // columns))
+                    for line in footer.split('\n')[:-1])
+        return num_cols <= columns and num_rows + lines < rows
+
+    def _changed_cells(
+        self,
+        maze: 'Maze',
+        items: dict[tuple[int, int], 'Item'],
+        player_position: tuple[int, int]
+    ) -> set[tuple[int, int]]:
+        """ Returns the positions that may look different from the last
+            frame. """
+        # An item collected or put back is on one of the player's cells,
+        # or on a cell marked as changed
+        changed = {self._player_position, player_position}
+        changed.update(self._marked)
+
+        if maze.is_unlocked() != self._unlocked:
+            changed.update(maze.get_door_positions())
+            self._unlocked = maze.is_unlocked()
+
+        num_rows, num_cols = maze.get_dimensions()
+        return {(row, col) for row, col in changed - {None}
+                if 0 <= row < num_rows and 0 <= col < num_cols}
+
+
+class ViewportTextInterface(TextInterface):
+    """ A TextInterface that only draws a window of the maze around the
+        player, so each frame costs the same however large the maze is.
+
+        The window is centred on the player, except where that would show
+        past the edge of the maze. With fog, only the tiles the player has
+        line of sight to are drawn, and the rest of the window shows FOG.
+    """
+    def __init__(self, rows: int, columns: int, fog: bool = False) -> None:
+        """
+        Parameters:
+            rows: Number of rows of the maze to show at once
+            columns: Number of columns of the maze to show at once
+            fog: Hide the tiles the player can't see
+        """
+        self._rows = rows
+        self._columns = columns
+        self._fog = fog
+
+    def _level_rows(
+        self,
+        maze: 'Maze',
+        items: dict[tuple[int, int], 'Item'],
+        player_position: tuple[int, int]
+    ) -> list[str]:
+        """ Returns the text for each row of the window onto the maze. """
+        num_rows, num_cols = maze.get_dimensions()
+        top, left = self._window_corner(maze, player_position)
+        rows = range(top, min(top + self._rows, num_rows))
+        cols = range(left, min(left + self._columns, num_cols))
+
+        visible = None
+        if self._fog:
+            # Far enough to reach every corner of the window
+            visible = visible_positions(
+                maze, self._centre(maze, player_position),
+                max(self._rows, self._columns))
+
+        lines = []
+        for row in rows:
+            row_chars = []
+            for col in cols:
+                if visible is None or (row, col) in visible:
+                    row_chars.append(self._cell_text(
+                        maze, items, player_position, (row, col)))
+                else:
+                    row_chars.append(FOG)
+            lines.append(''.join(row_chars))
+        return lines
+
+    def _centre(
+        self,
+        maze: 'Maze',
+        player_position: tuple[int, int]
+    ) -> tuple[int, int]:
+        """ Returns the tile the player is on, wrapping negative positions
+            as Maze.get_tile does. """
+        num_rows, num_cols = maze.get_dimensions()
+        row, col = player_position
+        return (min(max(row + num_rows if row < 0 else row, 0), num_rows - 1),
+                min(max(col + num_cols if col < 0 else col, 0), num_cols - 1))
+
+    def _window_corner(
+        self,
+        maze: 'Maze',
+        player_position: tuple[int, int]
+    ) -> tuple[int, int]:
+        """ Returns the (row, column) of the top left tile in the window. """
+        num_rows, num_cols = maze.get_dimensions()
+        row, col = self._centre(maze, player_position)
+        top = min(row - self._rows // 2, num_rows - self._rows)
+        left = min(col - self._columns // 2, num_cols - self._columns)
+        return max(top, 0), max(left, 0)
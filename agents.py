@@ -0,0 +1,413 @@
+"""Synthetic players that drive a Model, for load testing.
+
+Each agent looks at a Model through its public getters and chooses the next
+input as a player would type it into MazeRunner.play: a move such as 'w',
+or 'i Water' to use an item. play_agent makes each input through
+Model.move_player and Model.use_item, so agents exercise exactly the code
+that real sessions do. run_agents plays many agents over a process pool and
+summarise reports how they did.
+
+    python agents.py games/game2.txt --agents 1000 --kinds greedy planner
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+from multiprocessing import Pool
+from typing import Optional
+from a2 import Model, ZERO, ONE
+from constants import *
+from simulator import SimulationResult
+import pathfinding
+
+MAX_STEPS = 10000
+USE_PREFIX = 'i '
+# Stats at which the planner uses an item rather than risk losing
+THIRST_LIMIT = MAX_THIRST - 2
+HUNGER_LIMIT = MAX_HUNGER - 2
+HEALTH_LIMIT = 20
+# Hunger or thirst at which the planner goes out of its way for supplies
+SUPPLY_LIMIT = MAX_HUNGER - 4
+# Furthest the planner goes out of its way for supplies it doesn't need yet
+DETOUR = 3
+FOOD = [(HONEY, 'Honey'), (APPLE, 'Apple')]
+STEP_MOVES = {delta: move for move, delta in MOVE_DELTAS.items()}
+
+
+class Agent:
+    """ Abstract class for a synthetic player. """
+    _name = 'agent'
+
+    def __init__(self, seed: int = ZERO) -> None:
+        """
+        Parameters:
+            seed (int): seed for any random choices the agent makes
+        """
+        self._seed = seed
+        self._random = random.Random(seed)
+
+    def get_name(self) -> str:
+        """
+        Returns:
+            str: the kind of agent, as used in AGENTS
+        """
+        return self._name
+
+    def get_seed(self) -> int:
+        """
+        Returns:
+            int: seed for any random choices the agent makes
+        """
+        return self._seed
+
+    def choose(self, model: Model) -> str:
+        """ Chooses the next input. Implemented in subclasses.
+
+        Parameters:
+            model (Model): the game being played
+
+        Returns:
+            str: a move from MOVE_DELTAS, or USE_PREFIX and an item name
+        """
+        raise NotImplementedError
+
+    def _random_move(self) -> str:
+        """
+        Returns:
+            str: any move, chosen at random
+        """
+        return self._random.choice(list(MOVE_DELTAS))
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: the text required to construct a new agent of the same kind
+                 with the same seed
+        """
+        return f'{type(self).__name__}({self._seed})'
+
+
+class RandomAgent(Agent):
+    """ Makes random moves, and never uses items. """
+    _name = 'random'
+
+    def choose(self, model: Model) -> str:
+        return self._random_move()
+
+
+class GreedyAgent(Agent):
+    """ Walks the shortest way to the nearest coin, then to the nearest way
+        out once the doors unlock. Moves at random when neither can be
+        reached.
+    """
+    _name = 'greedy'
+
+    def choose(self, model: Model) -> str:
+        maze = model.get_current_maze()
+        position = model.get_player().get_position()
+        for targets in self._targets(model):
+            if not targets:
+                continue
+            step = self._first_step(maze, position, targets)
+            if step is not None:
+                return step
+        return self._random_move()
+
+    def _targets(self, model: Model) -> list[list[tuple[int, int]]]:
+        """
+        Parameters:
+            model (Model): the game being played
+
+        Returns:
+            list[list[tuple[int, int]]]: groups of positions to head for,
+                                         the nearest of the first group
+                                         that can be reached being chosen
+        """
+        items = model.get_current_items()
+        coins = [position for position, item in items.items()
+                 if item.get_id() == COIN]
+        return [coins, _exits(model)]
+
+    def _first_step(self, maze, position: tuple[int, int],
+                    targets: list[tuple[int, int]]) -> Optional[str]:
+        """
+        Parameters:
+            maze (Maze): the maze being played
+            position (tuple[int, int]): where the player is
+            targets (list[tuple[int, int]]): positions to head for
+
+        Returns:
+            Optional[str]: the move starting a shortest way to the nearest
+                           target, or None if none can be reached. Standing
+                           on an exit, it is the move out of the maze.
+        """
+        field = pathfinding.nearest_field(maze, targets)
+        distance = field.get(position)
+        if distance is None:
+            return None
+
+        if distance == ZERO:
+            rows = maze.get_dimensions()[0]
+            return DOWN if position[0] == rows - ONE else RIGHT
+
+        # Every neighbour one step nearer is on a shortest path, and picking
+        # between them at random lets agents with different seeds differ
+        moves = [move for delta, move in STEP_MOVES.items()
+                 if field.get((position[0] + delta[0],
+                               position[1] + delta[1])) == distance - ONE]
+        return self._random.choice(moves) if moves else None
+
+
+class PlannerAgent(GreedyAgent):
+    """ A GreedyAgent that also keeps itself alive: it uses water, food and
+        potions before its stats reach their limits, picks up supplies it
+        lacks when they are close, and heads for them when it runs low.
+    """
+    _name = 'planner'
+
+    def choose(self, model: Model) -> str:
+        health, hunger, thirst = model.get_player_stats()
+        inventory = model.get_player_inventory()
+
+        if thirst >= THIRST_LIMIT and inventory.get_count('Water'):
+            return USE_PREFIX + 'Water'
+        if hunger >= HUNGER_LIMIT:
+            for _, name in FOOD:
+                if inventory.get_count(name):
+                    return USE_PREFIX + name
+        if health <= HEALTH_LIMIT and inventory.get_count('Potion'):
+            return USE_PREFIX + 'Potion'
+
+        return super().choose(model)
+
+    def _targets(self, model: Model) -> list[list[tuple[int, int]]]:
+        _, hunger, thirst = model.get_player_stats()
+        inventory = model.get_player_inventory()
+        food_held = any(inventory.get_count(name) for _, name in FOOD)
+
+        # Supplies that aren't held are picked up when they are close by,
+        # and fetched from anywhere once they are needed
+        nearby, needed = set(), set()
+        if not inventory.get_count('Water'):
+            (needed if thirst >= SUPPLY_LIMIT else nearby).add(WATER)
+        if not food_held:
+            (needed if hunger >= SUPPLY_LIMIT else nearby).update(
+                item for item, _ in FOOD)
+
+        items = model.get_current_items()
+        supplies = [position for position, item in items.items()
+                    if item.get_id() in needed]
+        # Only supplies within DETOUR steps of the player, ignoring walls,
+        # can be within DETOUR moves
+        position = model.get_player().get_position()
+        close = list(model.get_level().get_items_near(position, DETOUR,
+                                                      nearby)) \
+            if nearby else []
+        if close and pathfinding.steps_within(
+                model.get_current_maze(), position, close, DETOUR) is not None:
+            supplies.extend(close)
+        return [supplies] + super()._targets(model)
+
+
+AGENTS = {agent._name: agent
+          for agent in (RandomAgent, GreedyAgent, PlannerAgent)}
+
+
+def _exits(model: Model) -> list[tuple[int, int]]:
+    """
+    Parameters:
+        model (Model): the game being played
+
+    Returns:
+        list[tuple[int, int]]: the open positions on the bottom row and right
+                               column, from which the player can leave the
+                               maze for the next level
+    """
+    maze = model.get_current_maze()
+    rows, columns = maze.get_dimensions()
+    edge = [(rows - ONE, column) for column in range(columns)] \
+        + [(row, columns - ONE) for row in range(rows - ONE)]
+    return [position for position in edge
+            if not maze.get_tile(position).is_blocking()]
+
+
+class AgentResult(SimulationResult):
+    """The outcome of one agent playing a game."""
+    def __init__(self, agent: str, seed: int, seconds: float,
+                 stats: tuple[int, int, int], won: bool, lost: bool,
+                 steps: int, level: int, position: tuple[int, int],
+                 inventory: dict[str, int]) -> None:
+        """
+        Parameters:
+            agent (str): the kind of agent, as used in AGENTS
+            seed (int): the agent's seed
+            seconds (float): time taken to play
+            stats, won, lost, level, position, inventory: as SimulationResult
+            steps (int): number of inputs made
+        """
+        super().__init__(stats, won, lost, steps, level, position, inventory)
+        self._agent = agent
+        self._seed = seed
+        self._seconds = seconds
+
+    def get_agent(self) -> str:
+        """
+        Returns:
+            str: the kind of agent, as used in AGENTS
+        """
+        return self._agent
+
+    def get_seed(self) -> int:
+        """
+        Returns:
+            int: the agent's seed
+        """
+        return self._seed
+
+    def get_seconds(self) -> float:
+        """
+        Returns:
+            float: time taken to play
+        """
+        return self._seconds
+
+
+def play_agent(agent: Agent, game_file: str,
+               max_steps: int = MAX_STEPS) -> AgentResult:
+    """Lets an agent play a game until it ends or the agent runs out of
+       inputs.
+
+    Parameters:
+        agent (Agent): the player
+        game_file (str): path of the game to play
+        max_steps (int): most inputs to make
+
+    Returns:
+        AgentResult: the state the game ended in
+    """
+    start = time.perf_counter()
+    model = Model(game_file)
+    steps = ZERO
+
+    while steps < max_steps and not model.has_won() \
+            and not model.has_lost():
+        choice = agent.choose(model)
+        steps = steps + ONE
+        if choice in MOVE_DELTAS:
+            model.move_player(MOVE_DELTAS[choice])
+        elif choice.startswith(USE_PREFIX):
+            model.use_item(choice[len(USE_PREFIX):])
+
+    held = model.get_player_inventory()
+    inventory = {name: held.get_count(name) for name in held.get_items()}
+    return AgentResult(agent.get_name(), agent.get_seed(),
+                       time.perf_counter() - start, model.get_player_stats(),
+                       model.has_won(), model.has_lost(), steps,
+                       model.get_level_number(),
+                       model.get_player().get_position(), inventory)
+
+
+def _play_in_worker(game_file: str, kind: str, seed: int,
+                    max_steps: int) -> AgentResult:
+    """
+    Parameters:
+        game_file (str): path of the game to play
+        kind (str): the kind of agent, as used in AGENTS
+        seed (int): the agent's seed
+        max_steps (int): most inputs to make
+
+    Returns:
+        AgentResult: the state the game ended in
+    """
+    return play_agent(AGENTS[kind](seed), game_file, max_steps)
+
+
+def run_agents(game_file: str, agents: list[tuple[str, int]],
+               processes: Optional[int] = None, max_steps: int = MAX_STEPS,
+               chunksize: int = 16) -> list[AgentResult]:
+    """Plays many agents, each with a game of its own, across a pool of
+       processes.
+
+    Parameters:
+        game_file (str): path of the game to play
+        agents (list[tuple[str, int]]): the kind and seed of each agent
+        processes (Optional[int]): number of worker processes, defaults to
+                                   the number of CPUs
+        max_steps (int): most inputs each agent makes
+        chunksize (int): number of agents sent to a worker at once
+
+    Returns:
+        list[AgentResult]: the result of each agent, in the same order
+    """
+    with Pool(processes) as pool:
+        return pool.starmap(_play_in_worker,
+                            [(game_file, kind, seed, max_steps)
+                             for kind, seed in agents], chunksize)
+
+
+def summarise(results: list[AgentResult],
+              seconds: float) -> dict[str, dict[str, float]]:
+    """
+    Parameters:
+        results (list[AgentResult]): results from run_agents
+        seconds (float): wall time taken to get them
+
+    Returns:
+        dict[str, dict[str, float]]: for each kind of agent, and for 'all',
+                                     the number of games, the fraction won
+                                     and lost, the mean inputs taken to win,
+                                     and the inputs and games per second
+    """
+    kinds = {}
+    for result in results:
+        kinds.setdefault(result.get_agent(), []).append(result)
+    kinds['all'] = results
+
+    summary = {}
+    for kind, games in kinds.items():
+        wins = [game.get_steps() for game in games if game.has_won()]
+        steps = sum(game.get_steps() for game in games)
+        summary[kind] = {
+            'games': len(games),
+            'win_rate': len(wins) / len(games) if games else ZERO,
+            'loss_rate': sum(game.has_lost() for game in games) / len(games)
+            if games else ZERO,
+            'mean_steps_to_win': sum(wins) / len(wins) if wins else ZERO,
+            'steps': steps,
+        }
+    summary['all']['steps_per_sec'] = \
+        summary['all']['steps'] / seconds if seconds else ZERO
+    summary['all']['games_per_sec'] = len(results) / seconds if seconds \
+        else ZERO
+    return summary
+
+
+def main():
+    """Plays many synthetic players through a game file and reports how they
+       did.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('game_file')
+    parser.add_argument('--agents', type=int, default=300,
+                        help='number of agents of each kind')
+    parser.add_argument('--kinds', nargs='+', choices=list(AGENTS),
+                        default=list(AGENTS))
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-steps', type=int, default=MAX_STEPS)
+    parser.add_argument('--seed', type=int, default=ZERO)
+    args = parser.parse_args()
+
+    agents = [(kind, args.seed + index) for kind in args.kinds
+              for index in range(args.agents)]
+    start = time.perf_counter()
+    results = run_agents(args.game_file, agents, args.processes,
+                         args.max_steps)
+    elapsed = time.perf_counter() - start
+
+    for kind, values in summarise(results, elapsed).items():
+        print(kind + ': ' + ', '.join(f'{name}: {value:,.3g}'
+                                      for name, value in values.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,463 @@
+"""Level analytics over NumPy arrays, for measuring many levels at once.
+
+MazeArrays and LevelArrays turn a Maze or Level into arrays: the tile codes
+as int8, which tiles block movement, the damage of each tile and the code of
+the item on each tile. The functions below work on whole arrays at a time,
+so measuring a level never loops over its tiles in Python: open neighbour
+counts, dead ends and junctions, connected components, distance to the
+nearest wall and shortest walking distances.
+
+NumPy is optional. The rest of the game never imports this module, and it
+raises ImportError when used without NumPy installed.
+
+    python analytics.py games/ --processes 4
+"""
+from __future__ import annotations
+import argparse
+import glob
+import json
+import os
+from multiprocessing import Pool
+from typing import Optional
+from a2 import Maze, Level, load_game, ZERO, ONE, ITEMS, ITEMS_NAME, \
+    ITEM_CODES, LAVA_CODE, DOOR_CODE
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Item codes are those of ItemTable, which never uses this one
+NO_ITEM_CODE = 0
+UNREACHED = -1
+NOT_OPEN = 0
+GAME_PATTERN = '*.txt'
+HEATMAP_BLOCK = 8
+
+
+def _require_numpy() -> None:
+    """
+    Raises:
+        ImportError: if NumPy is not installed
+    """
+    if np is None:
+        raise ImportError('analytics needs NumPy: pip install numpy')
+
+
+class MazeArrays:
+    """A maze's tiles as arrays of shape (rows, columns).
+
+       The arrays are copies, made when this is constructed, so the maze can
+       still have rows added and doors unlocked afterwards; blocking and
+       damage are those of the tiles at that time.
+    """
+    def __init__(self, maze: Maze) -> None:
+        """
+        Parameters:
+            maze (Maze): the maze to convert
+
+        Raises:
+            ImportError: if NumPy is not installed
+        """
+        _require_numpy()
+        columns = maze.get_dimensions()[1]
+        codes = maze.get_tile_codes()
+        rows = len(codes) // columns if columns else ZERO
+        table = maze.get_tile_table()
+
+        self._tiles = np.frombuffer(bytes(codes), dtype=np.int8,
+                                    count=rows * columns
+                                    ).reshape(rows, columns)
+        # Each property is looked up by tile code, as the Tile flyweights are
+        self._blocking = np.array([tile.is_blocking() for tile in table],
+                                  dtype=bool)[self._tiles]
+        self._damage = np.array([tile.damage() for tile in table],
+                                dtype=np.int16)[self._tiles]
+
+    def get_shape(self) -> tuple[int, int]:
+        """
+        Returns:
+            tuple[int, int]: the number of (rows, columns) in the arrays
+        """
+        return self._tiles.shape
+
+    def get_tiles(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: the int8 tile code of each tile, e.g. WALL_CODE
+        """
+        return self._tiles
+
+    def get_blocking(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: True for each tile the player can't move onto
+        """
+        return self._blocking
+
+    def get_damage(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: the damage each tile does when moved onto
+        """
+        return self._damage
+
+    def get_walkable(self, through_doors: bool = True) -> np.ndarray:
+        """
+        Parameters:
+            through_doors (bool): treat doors as open, even if locked
+
+        Returns:
+            np.ndarray: True for each tile the player can move onto
+        """
+        walkable = ~self._blocking
+        if through_doors:
+            walkable = walkable | (self._tiles == DOOR_CODE)
+        return walkable
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the shape of its arrays
+        """
+        return f'{type(self).__name__}({self.get_shape()})'
+
+
+class LevelArrays(MazeArrays):
+    """A level's maze and items as arrays of shape (rows, columns)."""
+    def __init__(self, level: Level) -> None:
+        """
+        Parameters:
+            level (Level): the level to convert, with the items it has now
+
+        Raises:
+            ImportError: if NumPy is not installed
+        """
+        super().__init__(level.get_maze())
+        self._start = level.get_player_start()
+        self._items = np.zeros(self.get_shape(), dtype=np.int8)
+
+        items = level.get_items()
+        if items:
+            positions = np.array(list(items.keys()), dtype=np.intp)
+            codes = np.fromiter((ITEM_CODES[item.get_id()]
+                                 for item in items.values()),
+                                dtype=np.int8, count=len(items))
+            self._items[positions[:, 0], positions[:, 1]] = codes
+
+    def get_player_start(self) -> Optional[tuple[int, int]]:
+        """
+        Returns:
+            Optional[tuple[int, int]]: where the player starts the level
+        """
+        return self._start
+
+    def get_item_codes(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: the int8 code of the item on each tile, from
+                        ITEM_CODES, or NO_ITEM_CODE
+        """
+        return self._items
+
+    def get_item_mask(self, item_id: Optional[str] = None) -> np.ndarray:
+        """
+        Parameters:
+            item_id (Optional[str]): the kind of item, e.g. COIN, or None for
+                                     every kind
+
+        Returns:
+            np.ndarray: True for each tile holding an item of that kind
+        """
+        if item_id is None:
+            return self._items != NO_ITEM_CODE
+        return self._items == ITEM_CODES[item_id]
+
+    def get_item_counts(self) -> dict[str, int]:
+        """
+        Returns:
+            dict[str, int]: the number of each kind of item, by item name
+        """
+        counts = np.bincount(self._items.ravel(),
+                             minlength=len(ITEMS) + ONE)
+        return {name: int(counts[ITEM_CODES[item]])
+                for item, name in zip(ITEMS, ITEMS_NAME)}
+
+
+def _shifted(grid: np.ndarray, fill) -> list[np.ndarray]:
+    """
+    Parameters:
+        grid (np.ndarray): a 2D array
+        fill: value for cells that would come from outside the grid
+
+    Returns:
+        list[np.ndarray]: the value above, below, left and right of each cell
+    """
+    padded = np.pad(grid, ONE, constant_values=fill)
+    return [padded[:-2, 1:-1], padded[2:, 1:-1],
+            padded[1:-1, :-2], padded[1:-1, 2:]]
+
+
+def neighbour_counts(open_tiles: np.ndarray) -> np.ndarray:
+    """
+    Parameters:
+        open_tiles (np.ndarray): True for each tile that can be moved onto
+
+    Returns:
+        np.ndarray: for every tile, how many of the four next to it are open
+    """
+    counts = np.zeros(open_tiles.shape, dtype=np.int8)
+    for neighbours in _shifted(open_tiles, False):
+        counts += neighbours
+    return counts
+
+
+def dead_ends(open_tiles: np.ndarray) -> np.ndarray:
+    """
+    Parameters:
+        open_tiles (np.ndarray): True for each tile that can be moved onto
+
+    Returns:
+        np.ndarray: True for each open tile with exactly one open neighbour
+    """
+    return open_tiles & (neighbour_counts(open_tiles) == ONE)
+
+
+def junctions(open_tiles: np.ndarray) -> np.ndarray:
+    """
+    Parameters:
+        open_tiles (np.ndarray): True for each tile that can be moved onto
+
+    Returns:
+        np.ndarray: True for each open tile with three or more open
+                    neighbours
+    """
+    return open_tiles & (neighbour_counts(open_tiles) >= 3)
+
+
+def label_components(open_tiles: np.ndarray) -> tuple[np.ndarray, int]:
+    """Labels the groups of open tiles connected by moves.
+
+    Every tile starts as its own group. Each round joins the groups at both
+    ends of every open edge to the smaller label, then follows labels to
+    their roots, so the number of rounds grows with the log of the size of
+    the groups rather than their length.
+
+    Parameters:
+        open_tiles (np.ndarray): True for each tile that can be moved onto
+
+    Returns:
+        tuple[np.ndarray, int]: the int32 label of each tile's group,
+                                numbered from one in row-major order of their
+                                first tile, or NOT_OPEN, and the number of
+                                groups
+    """
+    rows, columns = open_tiles.shape
+    flat = open_tiles.ravel()
+    cells = np.arange(flat.size, dtype=np.int32).reshape(rows, columns)
+
+    # Open edges between horizontal then vertical neighbours
+    across = open_tiles[:, :-1] & open_tiles[:, 1:]
+    down = open_tiles[:-1, :] & open_tiles[1:, :]
+    first = np.concatenate((cells[:, :-1][across], cells[:-1, :][down]))
+    second = np.concatenate((cells[:, 1:][across], cells[1:, :][down]))
+
+    parents = np.arange(flat.size, dtype=np.int32)
+    while True:
+        low = np.minimum(parents[first], parents[second])
+        high = np.maximum(parents[first], parents[second])
+        joined = low != high
+        if not joined.any():
+            break
+        np.minimum.at(parents, high[joined], low[joined])
+        # Points every tile straight at the root of its group
+        while True:
+            grandparents = parents[parents]
+            if np.array_equal(grandparents, parents):
+                break
+            parents = grandparents
+
+    roots = flat & (parents == np.arange(flat.size))
+    numbers = np.cumsum(roots, dtype=np.int32)
+    labels = np.where(flat, numbers[parents], NOT_OPEN)
+    return labels.reshape(rows, columns), int(numbers[-1]) if flat.size \
+        else ZERO
+
+
+def wall_distance(open_tiles: np.ndarray) -> np.ndarray:
+    """
+    Parameters:
+        open_tiles (np.ndarray): True for each tile that can be moved onto
+
+    Returns:
+        np.ndarray: the number of moves from each tile to the nearest tile
+                    that isn't open, with everything outside the maze
+                    counting as closed, and zero on closed tiles
+    """
+    # Each round peels one layer off the open tiles, so it takes as many
+    # rounds as the widest open area is deep
+    distances = np.zeros(open_tiles.shape, dtype=np.int32)
+    remaining = open_tiles.copy()
+    while remaining.any():
+        distances += remaining
+        inside = remaining.copy()
+        for neighbours in _shifted(remaining, False):
+            inside &= neighbours
+        remaining = inside
+    return distances
+
+
+def path_distance(open_tiles: np.ndarray,
+                  sources: list[tuple[int, int]]) -> np.ndarray:
+    """Walks out from every source at once, as a breadth first search over
+       a whole frontier of tiles per step.
+
+    Parameters:
+        open_tiles (np.ndarray): True for each tile that can be moved onto
+        sources (list[tuple[int, int]]): (row, column) to measure from
+
+    Returns:
+        np.ndarray: the fewest moves from any source to each tile, or
+                    UNREACHED
+    """
+    rows, columns = open_tiles.shape
+    # A blocking border means neighbours never need bounds checks
+    width = columns + 2
+    walkable = np.pad(open_tiles, ONE, constant_values=False).ravel()
+    distances = np.full(walkable.size, UNREACHED, dtype=np.int32)
+    offsets = np.array([-width, width, -ONE, ONE], dtype=np.intp)
+
+    frontier = np.array([(row + ONE) * width + column + ONE
+                         for row, column in sources], dtype=np.intp)
+    frontier = np.unique(frontier[walkable[frontier]]) if len(frontier) \
+        else frontier
+    steps = ZERO
+    while frontier.size:
+        distances[frontier] = steps
+        steps = steps + ONE
+        reached = (frontier[:, None] + offsets).ravel()
+        reached = reached[walkable[reached] & (distances[reached] < ZERO)]
+        frontier = np.unique(reached)
+
+    return distances.reshape(rows + 2, width)[1:-1, 1:-1]
+
+
+def heatmap(mask: np.ndarray, block: int = HEATMAP_BLOCK) -> np.ndarray:
+    """
+    Parameters:
+        mask (np.ndarray): True for each tile to count, e.g. an item mask
+        block (int): size of the square of tiles each count covers
+
+    Returns:
+        np.ndarray: the number of True tiles in each block, with partial
+                    blocks at the bottom and right edges
+    """
+    rows, columns = mask.shape
+    padded = np.pad(mask, ((ZERO, -rows % block), (ZERO, -columns % block)))
+    return padded.reshape(padded.shape[0] // block, block,
+                          padded.shape[1] // block, block
+                          ).sum(axis=(1, 3), dtype=np.int32)
+
+
+def summarise_level(level: Level) -> dict:
+    """
+    Parameters:
+        level (Level): the level to measure
+
+    Returns:
+        dict: measurements of the level, made of JSON types
+    """
+    arrays = LevelArrays(level)
+    tiles = arrays.get_tiles()
+    walkable = arrays.get_walkable()
+    open_count = int(walkable.sum())
+    lava = int((tiles == LAVA_CODE).sum())
+    item_count = int(arrays.get_item_mask().sum())
+    labels, components = label_components(walkable)
+
+    start = arrays.get_player_start()
+    reachable = ZERO
+    exit_distance = None
+    if start is not None and walkable[start]:
+        reachable = int((labels == labels[start]).sum())
+        distances = path_distance(walkable, [start])
+        exits = distances[tiles == DOOR_CODE]
+        exits = exits[exits != UNREACHED]
+        if exits.size:
+            exit_distance = int(exits.min())
+
+    return {'rows': arrays.get_shape()[0], 'columns': arrays.get_shape()[1],
+            'open': open_count, 'lava': lava,
+            'lava_coverage': lava / open_count if open_count else ZERO,
+            'dead_ends': int(dead_ends(walkable).sum()),
+            'junctions': int(junctions(walkable).sum()),
+            'components': components, 'reachable': reachable,
+            'exit_distance': exit_distance,
+            'max_wall_distance': int(wall_distance(walkable).max(
+                initial=ZERO)),
+            'items': arrays.get_item_counts(),
+            'item_density': item_count / open_count if open_count else ZERO,
+            'max_items_per_block': int(heatmap(arrays.get_item_mask()).max(
+                initial=ZERO))}
+
+
+def summarise_game(game_file: str) -> list[dict]:
+    """
+    Parameters:
+        game_file (str): path of the game to measure
+
+    Returns:
+        list[dict]: the measurements of each level, in order, with the game
+                    file and level number
+    """
+    summaries = []
+    for number, level in enumerate(load_game(game_file)):
+        summary = {'game': game_file, 'level': number}
+        summary.update(summarise_level(level))
+        summaries.append(summary)
+    return summaries
+
+
+def summarise_directory(directory: str, pattern: str = GAME_PATTERN,
+                        processes: Optional[int] = None) -> list[dict]:
+    """Measures every game file in a directory across a pool of processes.
+
+    Parameters:
+        directory (str): where the game files are
+        pattern (str): glob matching the names of the game files
+        processes (Optional[int]): number of worker processes, defaults to
+                                   the number of CPUs
+
+    Returns:
+        list[dict]: the measurements of each level of each game, with the
+                    games in order of their paths
+    """
+    _require_numpy()
+    game_files = sorted(glob.glob(os.path.join(directory, pattern)))
+    with Pool(processes) as pool:
+        return [summary for summaries in pool.map(summarise_game, game_files)
+                for summary in summaries]
+
+
+def main():
+    """Measures the levels of game files, writing one line of JSON for each.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('paths', nargs='+',
+                        help='game files, or directories of them')
+    parser.add_argument('--pattern', default=GAME_PATTERN,
+                        help='names of the game files in directories')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if os.path.isdir(path):
+            summaries = summarise_directory(path, args.pattern, args.processes)
+        else:
+            summaries = summarise_game(path)
+        for summary in summaries:
+            print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
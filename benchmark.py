@@ -0,0 +1,334 @@
+"""Benchmarks for the hot paths of the game.
+
+Times load_game, Model.move_player, TextInterface.draw, Inventory and
+Level.attempt_unlock_door on levels generated from fixed seeds, so that the
+results of two commits can be compared. Results are written as JSON:
+
+    python benchmark.py --output before.json
+    (make changes)
+    python benchmark.py --output after.json --compare before.json
+
+Each result records the best time of several repeats in seconds, and the
+rate of the operation it measures. Comparing reports every benchmark that
+got slower by more than the tolerance, and exits with an error if any did.
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from a2 import Model, Level, Inventory, Coin, Water, load_game, ZERO, ONE
+from a2_support import TextInterface, IncrementalTextInterface
+from constants import *
+from generator import generate_game
+
+REPEATS = 5
+# Slowdown allowed before a benchmark counts as a regression
+TOLERANCE = 0.25
+SEED = 0
+SMALL_SIZE = 21
+HUGE_SIZE = 2000
+ROOM_SIZE = 300
+DRAW_SIZE = 100
+INVENTORY_COUNT = 100000
+UNLOCK_ITEMS = 100000
+UNLOCK_CALLS = 1000000
+# Small loads are repeated so that each timing is long enough to be stable
+SMALL_LOADS = 200
+# Full frames are slow enough that fewer are drawn
+FULL_FRAMES = 20
+FRAMES = 2000
+
+
+def best_time(function, repeats: int = REPEATS) -> float:
+    """
+    Parameters:
+        function: called with no arguments
+        repeats (int): number of times to call it
+
+    Returns:
+        float: the fastest of the calls, in seconds
+    """
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def result(seconds: float, count: int, unit: str) -> dict[str, float]:
+    """
+    Parameters:
+        seconds (float): the time taken
+        count (int): the number of operations done in that time
+        unit (str): what an operation is, e.g. "steps"
+
+    Returns:
+        dict[str, float]: the time and the rate, as written to the JSON
+    """
+    return {'seconds': seconds, 'count': count,
+            f'{unit}_per_sec': count / seconds if seconds else ZERO}
+
+
+def write_room(filename: str, size: int, item: str = EMPTY) -> None:
+    """Writes a game with one square room, walled in, with the door in the
+       bottom right corner.
+
+    Parameters:
+        filename (str): path to write the game file to
+        size (int): number of rows and columns in the level
+        item (str): the entity filling every open tile, or EMPTY for none
+    """
+    with open(filename, 'w') as file:
+        file.write(f'Maze 1 - {size} {size}\n')
+        file.write(WALL * size + '\n')
+        for row in range(ONE, size - ONE):
+            inside = item * (size - 2)
+            if row == ONE:
+                inside = PLAYER + inside[ONE:]
+            door = DOOR if row == size - 2 else WALL
+            file.write(WALL + inside + door + '\n')
+        file.write(WALL * size + '\n')
+
+
+def snake(size: int) -> str:
+    """
+    Parameters:
+        size (int): number of rows and columns in a room from write_room
+
+    Returns:
+        str: moves visiting every open tile of the room from the start
+    """
+    width = size - 2
+    moves = []
+    for row in range(width):
+        moves.append((RIGHT if row % 2 == ZERO else LEFT) * (width - ONE))
+        if row < width - ONE:
+            moves.append(DOWN)
+    return ''.join(moves)
+
+
+def bench_load(directory: str, huge_size: int) -> dict[str, dict]:
+    """
+    Parameters:
+        directory (str): where to write the generated game files
+        huge_size (int): number of rows and columns in the huge level
+
+    Returns:
+        dict[str, dict]: a result for loading a small and a huge game
+    """
+    results = {}
+    for name, size, loads in (('load_game_small', SMALL_SIZE, SMALL_LOADS),
+                              ('load_game_huge', huge_size, ONE)):
+        game = os.path.join(directory, f'{name}.txt')
+        generate_game(game, size, size, seed=SEED)
+
+        def run() -> None:
+            for _ in range(loads):
+                load_game(game)
+
+        results[name] = result(best_time(run), loads * size * size, 'tiles')
+    return results
+
+
+def bench_move(directory: str) -> dict[str, dict]:
+    """
+    Parameters:
+        directory (str): where to write the game files
+
+    Returns:
+        dict[str, dict]: a result for moving through an empty room, and
+                         through a room with an item on every tile
+    """
+    results = {}
+    moves = [MOVE_DELTAS[move] for move in snake(ROOM_SIZE)]
+    for name, item in (('move_player_open', EMPTY),
+                       ('move_player_items', COIN)):
+        game = os.path.join(directory, f'{name}.txt')
+        write_room(game, ROOM_SIZE, item)
+
+        def run() -> None:
+            model = Model(game)
+            for delta in moves:
+                model.move_player(delta)
+
+        # Loading is timed on its own and taken away
+        load = best_time(lambda: Model(game))
+        results[name] = result(max(best_time(run) - load, ZERO),
+                               len(moves), 'steps')
+    return results
+
+
+def bench_draw(directory: str) -> dict[str, dict]:
+    """
+    Parameters:
+        directory (str): where to write the game file
+
+    Returns:
+        dict[str, dict]: a result for drawing full frames with TextInterface
+                         and for drawing frames after a move with
+                         IncrementalTextInterface
+    """
+    game = os.path.join(directory, 'draw.txt')
+    generate_game(game, DRAW_SIZE, DRAW_SIZE, seed=SEED)
+    model = Model(game)
+
+    def draw(view) -> None:
+        view.draw(model.get_current_maze(), model.get_current_items(),
+                  model.get_player().get_position(),
+                  model.get_player_inventory(), model.get_player_stats())
+
+    def full() -> None:
+        view = TextInterface()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(FULL_FRAMES):
+                draw(view)
+
+    def incremental() -> None:
+        # A terminal big enough for the whole maze, so nothing scrolls
+        view = IncrementalTextInterface(io.StringIO(),
+                                        (DRAW_SIZE * 2, DRAW_SIZE * 2))
+        draw(view)
+        for move in (UP, DOWN, LEFT, RIGHT) * (FRAMES // 4):
+            model.move_player(MOVE_DELTAS[move])
+            draw(view)
+
+    return {'draw_full': result(best_time(full), FULL_FRAMES, 'frames'),
+            'draw_incremental': result(best_time(incremental), FRAMES,
+                                       'frames')}
+
+
+def bench_inventory() -> dict[str, dict]:
+    """
+    Returns:
+        dict[str, dict]: a result for adding then removing many items, with
+                         and without count-only mode
+    """
+    items = [Coin((ZERO, ZERO)) if index % 2 else Water((ZERO, ZERO))
+             for index in range(INVENTORY_COUNT)]
+    results = {}
+    for name, count_only in (('inventory', False),
+                             ('inventory_count_only', True)):
+        def run() -> None:
+            inventory = Inventory(count_only=count_only)
+            for item in items:
+                inventory.add_item(item)
+            for item in items:
+                inventory.remove_item(item.get_name())
+
+        results[name] = result(best_time(run), 2 * len(items), 'operations')
+    return results
+
+
+def bench_unlock() -> dict[str, dict]:
+    """
+    Returns:
+        dict[str, dict]: a result for checking if the doors unlock on a level
+                         holding many items
+    """
+    level = Level((ONE, UNLOCK_ITEMS))
+    level.add_row(COIN * UNLOCK_ITEMS)
+
+    def run() -> None:
+        for _ in range(UNLOCK_CALLS):
+            level.attempt_unlock_door()
+
+    return {'attempt_unlock_door': result(best_time(run), UNLOCK_CALLS,
+                                          'calls')}
+
+
+def git_commit() -> str:
+    """
+    Returns:
+        str: the commit the benchmarks ran on, or an empty string if it
+             isn't known
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run_benchmarks(huge_size: int = HUGE_SIZE) -> dict:
+    """Runs every benchmark.
+
+    Parameters:
+        huge_size (int): number of rows and columns in the huge level
+
+    Returns:
+        dict: the results, with the commit and environment they came from
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        results.update(bench_load(directory, huge_size))
+        results.update(bench_move(directory))
+        results.update(bench_draw(directory))
+    results.update(bench_inventory())
+    results.update(bench_unlock())
+    return {'commit': git_commit(), 'python': platform.python_version(),
+            'platform': platform.platform(), 'huge_size': huge_size,
+            'results': results}
+
+
+def compare(before: dict, after: dict,
+            tolerance: float = TOLERANCE) -> dict[str, float]:
+    """
+    Parameters:
+        before (dict): results from run_benchmarks on an earlier commit
+        after (dict): results from run_benchmarks on a later commit
+        tolerance (float): slowdown allowed, as a fraction of the time before
+
+    Returns:
+        dict[str, float]: for each benchmark in both that got slower by more
+                          than the tolerance, the time after over before
+    """
+    regressions = {}
+    for name, old in before['results'].items():
+        new = after['results'].get(name)
+        if new is None or not old['seconds']:
+            continue
+        ratio = new['seconds'] / old['seconds']
+        if ratio > ONE + tolerance:
+            regressions[name] = ratio
+    return regressions
+
+
+def main():
+    """Runs the benchmarks, writing the results as JSON.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--output', help='file to write, default stdout')
+    parser.add_argument('--compare', help='results to compare against')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--huge-size', type=int, default=HUGE_SIZE)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.huge_size)
+    text = json.dumps(results, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as file:
+            regressions = compare(json.load(file), results, args.tolerance)
+        for name, ratio in regressions.items():
+            print(f'{name}: {ratio:.2f}x slower')
+        raise SystemExit(ONE if regressions else ZERO)
+
+
+if __name__ == '__main__':
+    main()
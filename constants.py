@@ -1,3 +1,6 @@
+ZERO = 0
+ONE = 1
+
 LAVA = 'L'
 WALL = '#'
 EMPTY = ' '
@@ -0,0 +1,432 @@
+"""Procedural generation of MazeRunner game files.
+
+Levels are written a row at a time as they are generated, so the size of a
+level is limited only by disk space. Mazes are perfect (every open tile can
+be reached) and are built by one of:
+
+    kruskal      Eller's algorithm, the row by row form of Kruskal's, which
+                 only keeps the current row and a union-find of its sets
+    backtracker  recursive backtracking, run on bands of BAND_ROWS cell rows
+    prim         randomised Prim's, run on bands of BAND_ROWS cell rows
+
+Bands are joined by a single passage, so the whole maze stays perfect while
+only one band is held in memory. Each level's door is placed on the right
+border, as Model.move_player only moves to the next level when the player
+steps past the last row or column.
+"""
+from __future__ import annotations
+import argparse
+import math
+import random
+from typing import Iterator, Optional
+from a2 import ZERO, ONE, MAZE_HEADER
+from constants import *
+
+ALGORITHMS = ['kruskal', 'backtracker', 'prim']
+# Number of cell rows generated at once by the band based algorithms
+BAND_ROWS = 32
+# Chance of two neighbouring cells in different sets joining in Eller's
+MERGE_CHANCE = 0.5
+# Chance of each extra cell in a set opening downwards in Eller's
+DOWN_CHANCE = 0.3
+# Chance of a lava pool starting on each cell row, and its largest radius
+LAVA_CHANCE = 0.05
+LAVA_RADIUS = 3
+# Chance of each open tile holding each kind of item
+ITEM_DENSITY = {COIN: 0.01, WATER: 0.004, APPLE: 0.004, HONEY: 0.002,
+                POTION: 0.002}
+
+
+def generate_game(filename: str, rows: int, columns: int, levels: int = ONE,
+                  algorithm: str = ALGORITHMS[0],
+                  seed: Optional[int] = None,
+                  lava_chance: float = LAVA_CHANCE,
+                  item_density: Optional[dict[str, float]] = None) -> None:
+    """Writes a new game file that load_game can read.
+
+    Parameters:
+        filename (str): path to write the game file to
+        rows (int): number of rows in each level, at least 3
+        columns (int): number of columns in each level, at least 3
+        levels (int): number of levels in the game
+        algorithm (str): one of ALGORITHMS
+        seed (Optional[int]): seed for a repeatable game
+        lava_chance (float): chance of a lava pool starting on each row
+        item_density (Optional[dict[str, float]]): chance of each open tile
+                                                   holding each kind of item,
+                                                   defaults to ITEM_DENSITY
+
+    Raises:
+        ValueError: if the algorithm is unknown or a level is too small
+    """
+    generator = random.Random(seed)
+    with open(filename, 'w') as file:
+        for level in range(levels):
+            if level > ZERO:
+                file.write('\n')
+            file.write(f'{MAZE_HEADER} {level + ONE} - {rows} {columns}\n')
+            for line in generate_level(rows, columns, algorithm, generator,
+                                       lava_chance, item_density):
+                file.write(line)
+                file.write('\n')
+
+
+def generate_level(rows: int, columns: int,
+                   algorithm: str = ALGORITHMS[0],
+                   generator: Optional[random.Random] = None,
+                   lava_chance: float = LAVA_CHANCE,
+                   item_density: Optional[dict[str, float]] = None
+                   ) -> Iterator[str]:
+    """Generates the rows of a level's maze one at a time.
+
+    Parameters:
+        rows (int): number of rows in the level, at least 3
+        columns (int): number of columns in the level, at least 3
+        algorithm (str): one of ALGORITHMS
+        generator (Optional[random.Random]): source of randomness
+        lava_chance (float): chance of a lava pool starting on each row
+        item_density (Optional[dict[str, float]]): chance of each open tile
+                                                   holding each kind of item
+
+    Yields:
+        str: each row of the level, from the top
+
+    Raises:
+        ValueError: if the algorithm is unknown or the level is too small
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unknown algorithm {algorithm!r}, expected one of '
+                         f'{ALGORITHMS}')
+    if rows < 3 or columns < 3:
+        raise ValueError(f'A level must be at least 3 by 3, not {rows} by '
+                         f'{columns}')
+
+    generator = generator or random.Random()
+    density = ITEM_DENSITY if item_density is None else item_density
+    cell_rows, cell_columns = (rows - ONE) // 2, (columns - ONE) // 2
+    start = (2 * generator.randrange(cell_rows) + ONE,
+             2 * generator.randrange(cell_columns) + ONE)
+    door_row = 2 * generator.randrange(cell_rows) + ONE
+    pools = []
+
+    if algorithm == 'kruskal':
+        passages = _eller(cell_rows, cell_columns, generator)
+    else:
+        passages = _bands(cell_rows, cell_columns, generator,
+                          _backtrack if algorithm == 'backtracker' else _prim)
+
+    yield WALL * columns
+    row = ONE
+    for right, down in passages:
+        for line in _cell_lines(right, down, columns):
+            if row == rows - ONE:
+                break
+
+            # Pools start on cell rows and stay until they have been passed
+            if row % 2 == ONE and generator.random() < lava_chance:
+                radius = generator.randint(ONE, LAVA_RADIUS)
+                pools.append((row + radius,
+                              generator.randrange(ONE, 2 * cell_columns),
+                              radius))
+            pools = [pool for pool in pools if pool[0] + pool[2] >= row]
+            _add_lava(line, row, pools, 2 * cell_columns - ONE)
+            _add_items(line, density, generator)
+
+            if row == start[0]:
+                line[start[1]] = PLAYER
+            if row == door_row:
+                # Opens up any extra column left by an even width
+                for column in range(2 * cell_columns, columns - ONE):
+                    line[column] = EMPTY
+                line[columns - ONE] = DOOR
+
+            yield ''.join(line)
+            row = row + ONE
+
+    # An even height leaves a solid row above the border
+    yield WALL * columns
+
+
+def _cell_lines(right: list[bool], down: list[bool],
+                columns: int) -> tuple[list[str], list[str]]:
+    """
+    Parameters:
+        right (list[bool]): if each cell in the row opens to the right
+        down (list[bool]): if each cell in the row opens downwards
+        columns (int): number of columns in the level
+
+    Returns:
+        tuple[list[str], list[str]]: the tiles of the row of cells, and of
+                                     the row of walls below it
+    """
+    cells = [WALL] * columns
+    walls = [WALL] * columns
+    for index, opens_down in enumerate(down):
+        column = 2 * index + ONE
+        cells[column] = EMPTY
+        if index < len(right) and right[index]:
+            cells[column + ONE] = EMPTY
+        if opens_down:
+            walls[column] = EMPTY
+    return cells, walls
+
+
+def _add_lava(line: list[str], row: int,
+              pools: list[tuple[int, int, int]], last_column: int) -> None:
+    """Turns the parts of the row inside a lava pool into lava. Pools are
+       kept off the border and any extra column, so every lava tile can be
+       reached.
+
+    Parameters:
+        line (list[str]): the tiles of the row
+        row (int): index of the row
+        pools (list[tuple[int, int, int]]): the (row, column, radius) of the
+                                            centre of each pool
+        last_column (int): the last column a pool may cover
+    """
+    for centre_row, centre_column, radius in pools:
+        distance = abs(row - centre_row)
+        if distance <= radius:
+            width = math.isqrt(radius * radius - distance * distance)
+            first = max(centre_column - width, ONE)
+            last = min(centre_column + width, last_column)
+            for column in range(first, last + ONE):
+                line[column] = LAVA
+
+
+def _add_items(line: list[str], density: dict[str, float],
+               generator: random.Random) -> None:
+    """Places items on the empty tiles of the row.
+
+    Parameters:
+        line (list[str]): the tiles of the row
+        density (dict[str, float]): chance of each open tile holding each
+                                    kind of item
+        generator (random.Random): source of randomness
+    """
+    total = sum(density.values())
+    if total <= ZERO:
+        return
+
+    # Jumps straight to the next tile with an item, instead of rolling for
+    # every tile
+    kinds, weights = list(density), list(density.values())
+    scale = math.log(ONE - min(total, 0.999999))
+    empty = [column for column, tile in enumerate(line) if tile == EMPTY]
+    index = int(math.log(ONE - generator.random()) / scale)
+    while index < len(empty):
+        line[empty[index]] = generator.choices(kinds, weights)[0]
+        index = index + ONE + int(math.log(ONE - generator.random()) / scale)
+
+
+def _eller(cell_rows: int, cell_columns: int,
+           generator: random.Random
+           ) -> Iterator[tuple[list[bool], list[bool]]]:
+    """Eller's algorithm, which builds the maze a row at a time by merging
+       sets of connected cells as Kruskal's algorithm does.
+
+    Parameters:
+        cell_rows (int): number of rows of cells
+        cell_columns (int): number of columns of cells
+        generator (random.Random): source of randomness
+
+    Yields:
+        tuple[list[bool], list[bool]]: if each cell in the row opens to the
+                                       right, and if it opens downwards
+    """
+    sets = list(range(cell_columns))
+    next_set = cell_columns
+
+    for cell_row in range(cell_rows):
+        last = cell_row == cell_rows - ONE
+        parent = {}
+
+        def find(item: int) -> int:
+            root = item
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while item != root:
+                parent[item], item = root, parent.get(item, item)
+            return root
+
+        right = []
+        for column in range(cell_columns - ONE):
+            first, second = find(sets[column]), find(sets[column + ONE])
+            # The last row joins every set that is left
+            join = first != second and (last
+                                        or generator.random() < MERGE_CHANCE)
+            if join:
+                parent[second] = first
+            right.append(join)
+        sets = [find(item) for item in sets]
+
+        down = [False] * cell_columns
+        if not last:
+            # Every set carries on into the next row at least once
+            members = {}
+            for column, item in enumerate(sets):
+                members.setdefault(item, []).append(column)
+            for columns in members.values():
+                down[generator.choice(columns)] = True
+                for column in columns:
+                    if generator.random() < DOWN_CHANCE:
+                        down[column] = True
+
+            for column in range(cell_columns):
+                if not down[column]:
+                    sets[column] = next_set
+                    next_set = next_set + ONE
+
+        yield right, down
+
+
+def _bands(cell_rows: int, cell_columns: int, generator: random.Random,
+           carve) -> Iterator[tuple[list[bool], list[bool]]]:
+    """Builds the maze a band of rows at a time, joining each band to the
+       one above it with a single passage.
+
+    Parameters:
+        cell_rows (int): number of rows of cells
+        cell_columns (int): number of columns of cells
+        generator (random.Random): source of randomness
+        carve: function carving a perfect maze into a band, given its rows,
+               columns and the generator
+
+    Yields:
+        tuple[list[bool], list[bool]]: if each cell in the row opens to the
+                                       right, and if it opens downwards
+    """
+    for first in range(ZERO, cell_rows, BAND_ROWS):
+        height = min(BAND_ROWS, cell_rows - first)
+        right, down = carve(height, cell_columns, generator)
+        if first + height < cell_rows:
+            down[-ONE][generator.randrange(cell_columns)] = True
+        yield from zip(right, down)
+
+
+def _backtrack(height: int, width: int, generator: random.Random
+               ) -> tuple[list[list[bool]], list[list[bool]]]:
+    """Carves a perfect maze with an iterative recursive backtracker.
+
+    Parameters:
+        height (int): number of rows of cells
+        width (int): number of columns of cells
+        generator (random.Random): source of randomness
+
+    Returns:
+        tuple[list[list[bool]], list[list[bool]]]: for each row, if each
+            cell opens to the right, and if it opens downwards
+    """
+    right = [[False] * (width - ONE) for _ in range(height)]
+    down = [[False] * width for _ in range(height)]
+    visited = bytearray(height * width)
+    cell = generator.randrange(height * width)
+    visited[cell] = ONE
+    stack = [cell]
+
+    while stack:
+        cell = stack[-ONE]
+        row, column = divmod(cell, width)
+        neighbours = [other for other, allowed in
+                      ((cell - width, row > ZERO),
+                       (cell + width, row < height - ONE),
+                       (cell - ONE, column > ZERO),
+                       (cell + ONE, column < width - ONE))
+                      if allowed and not visited[other]]
+        if not neighbours:
+            stack.pop()
+            continue
+
+        other = generator.choice(neighbours)
+        _open(right, down, width, cell, other)
+        visited[other] = ONE
+        stack.append(other)
+
+    return right, down
+
+
+def _prim(height: int, width: int, generator: random.Random
+          ) -> tuple[list[list[bool]], list[list[bool]]]:
+    """Carves a perfect maze with randomised Prim's algorithm.
+
+    Parameters:
+        height (int): number of rows of cells
+        width (int): number of columns of cells
+        generator (random.Random): source of randomness
+
+    Returns:
+        tuple[list[list[bool]], list[list[bool]]]: for each row, if each
+            cell opens to the right, and if it opens downwards
+    """
+    right = [[False] * (width - ONE) for _ in range(height)]
+    down = [[False] * width for _ in range(height)]
+    in_maze = bytearray(height * width)
+    frontier = []
+
+    def add(cell: int) -> None:
+        in_maze[cell] = ONE
+        row, column = divmod(cell, width)
+        for other, allowed in ((cell - width, row > ZERO),
+                               (cell + width, row < height - ONE),
+                               (cell - ONE, column > ZERO),
+                               (cell + ONE, column < width - ONE)):
+            if allowed and not in_maze[other]:
+                frontier.append((cell, other))
+
+    add(generator.randrange(height * width))
+    while frontier:
+        # Takes a random passage by swapping it to the end
+        index = generator.randrange(len(frontier))
+        frontier[index], frontier[-ONE] = frontier[-ONE], frontier[index]
+        cell, other = frontier.pop()
+        if not in_maze[other]:
+            _open(right, down, width, cell, other)
+            add(other)
+
+    return right, down
+
+
+def _open(right: list[list[bool]], down: list[list[bool]], width: int,
+          cell: int, other: int) -> None:
+    """Opens the wall between two neighbouring cells in a band.
+
+    Parameters:
+        right (list[list[bool]]): if each cell opens to the right
+        down (list[list[bool]]): if each cell opens downwards
+        width (int): number of columns of cells
+        cell (int): index of one cell, row * width + column
+        other (int): index of the neighbouring cell
+    """
+    first = min(cell, other)
+    row, column = divmod(first, width)
+    if cell // width == other // width:
+        right[row][column] = True
+    else:
+        down[row][column] = True
+
+
+def main():
+    """Generates a MazeRunner game file.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('output')
+    parser.add_argument('--rows', type=int, default=21)
+    parser.add_argument('--columns', type=int, default=21)
+    parser.add_argument('--levels', type=int, default=ONE)
+    parser.add_argument('--algorithm', choices=ALGORITHMS,
+                        default=ALGORITHMS[0])
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--lava', type=float, default=LAVA_CHANCE,
+                        help='chance of a lava pool starting on each row')
+    parser.add_argument('--density', type=float, default=1.0,
+                        help='multiplies the chance of placing each item')
+    args = parser.parse_args()
+
+    generate_game(args.output, args.rows, args.columns, args.levels,
+                  args.algorithm, args.seed, args.lava,
+                  {item: chance * args.density
+                   for item, chance in ITEM_DENSITY.items()})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""Opt-in counters and timing histograms for the game's hot paths.
+
+An Instrumentation wraps functions with timed(), which counts each call and
+adds its duration to a histogram. Model and MazeRunner only wrap their
+methods when given an Instrumentation, replacing them on the instance at
+construction, so an uninstrumented game runs exactly the same code as
+before. MazeRunner also ends each turn with end_turn(), which sends the time
+spent in each wrapped function during the turn to a sink.
+"""
+from __future__ import annotations
+import json
+import time
+from typing import Callable, Optional
+from constants import ZERO, ONE
+
+NANOSECONDS = 1e9
+# Histogram buckets hold durations up to each power of two nanoseconds
+BUCKETS = 64
+
+
+class Histogram:
+    """Durations bucketed by powers of two nanoseconds, so that recording
+       one is O(1) and the memory used is fixed.
+    """
+    def __init__(self) -> None:
+        self._buckets = [ZERO] * BUCKETS
+        self._count = ZERO
+        self._total = ZERO
+        self._max = ZERO
+
+    def add(self, nanoseconds: int) -> None:
+        """Records a duration.
+
+        Parameters:
+            nanoseconds (int): the duration to record
+        """
+        bucket = min(nanoseconds.bit_length(), BUCKETS - ONE)
+        self._buckets[bucket] = self._buckets[bucket] + ONE
+        self._count = self._count + ONE
+        self._total = self._total + nanoseconds
+        if nanoseconds > self._max:
+            self._max = nanoseconds
+
+    def get_count(self) -> int:
+        """
+        Returns:
+            int: the number of durations recorded
+        """
+        return self._count
+
+    def get_total(self) -> float:
+        """
+        Returns:
+            float: the sum of the durations, in seconds
+        """
+        return self._total / NANOSECONDS
+
+    def get_mean(self) -> float:
+        """
+        Returns:
+            float: the mean duration in seconds, or zero if there are none
+        """
+        return self._total / self._count / NANOSECONDS if self._count else ZERO
+
+    def get_max(self) -> float:
+        """
+        Returns:
+            float: the longest duration, in seconds
+        """
+        return self._max / NANOSECONDS
+
+    def percentile(self, percent: float) -> float:
+        """
+        Parameters:
+            percent (float): between 0 and 100
+
+        Returns:
+            float: an upper bound on that percentile of the durations, in
+                   seconds, accurate to a factor of two
+        """
+        needed = self._count * percent / 100
+        seen = ZERO
+        for bucket, count in enumerate(self._buckets):
+            seen = seen + count
+            if count and seen >= needed:
+                return min(2 ** bucket, self._max) / NANOSECONDS
+        return self._max / NANOSECONDS
+
+    def to_dict(self) -> dict[str, float]:
+        """
+        Returns:
+            dict[str, float]: a summary of the durations, in seconds
+        """
+        return {'count': self._count, 'total': self.get_total(),
+                'mean': self.get_mean(), 'p50': self.percentile(50),
+                'p99': self.percentile(99), 'max': self.get_max()}
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the number and mean of its durations
+        """
+        return f'{type(self).__name__}(count={self._count}, ' \
+               f'mean={self.get_mean():.3g})'
+
+
+class Sink:
+    """ Abstract class for where an Instrumentation sends its records. """
+    def emit(self, record: dict) -> None:
+        """ Receives one record. Implemented in subclasses.
+
+        Parameters:
+            record: a record of a turn or a summary, made of JSON types
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """ Releases anything held by the sink. """
+
+
+class MemorySink(Sink):
+    """ Keeps every record in a list. """
+    def __init__(self) -> None:
+        self._records = []
+
+    def emit(self, record: dict) -> None:
+        self._records.append(record)
+
+    def get_records(self) -> list[dict]:
+        """
+        Returns:
+            list[dict]: the records received, oldest first
+        """
+        return self._records
+
+
+class JsonLinesSink(Sink):
+    """ Appends each record to a file as a line of JSON. """
+    def __init__(self, filename: str) -> None:
+        """
+        Parameters:
+            filename (str): path of the file to append to
+        """
+        self._file = open(filename, 'a')
+
+    def emit(self, record: dict) -> None:
+        self._file.write(json.dumps(record) + '\n')
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CallbackSink(Sink):
+    """ Passes each record to a function. """
+    def __init__(self, callback: Callable[[dict], None]) -> None:
+        """
+        Parameters:
+            callback (Callable[[dict], None]): called with each record
+        """
+        self._callback = callback
+
+    def emit(self, record: dict) -> None:
+        self._callback(record)
+
+
+class Instrumentation:
+    """Counters and timing histograms, with the time spent in each timed
+       function during the current turn.
+    """
+    def __init__(self, sink: Optional[Sink] = None) -> None:
+        """
+        Parameters:
+            sink (Optional[Sink]): where records are sent, defaults to a new
+                                   MemorySink
+        """
+        self._sink = MemorySink() if sink is None else sink
+        self._counters = {}
+        self._histograms = {}
+        self._turn_times = {}
+        self._turn = ZERO
+
+    def get_sink(self) -> Sink:
+        """
+        Returns:
+            Sink: where records are sent
+        """
+        return self._sink
+
+    def timed(self, name: str, function: Callable) -> Callable:
+        """
+        Parameters:
+            name (str): name to record the calls under
+            function (Callable): the function to time
+
+        Returns:
+            Callable: a function that calls the given one, counting the call
+                      and recording how long it took
+        """
+        histogram = self._histograms.setdefault(name, Histogram())
+        turn_times = self._turn_times
+        clock = time.perf_counter_ns
+
+        def timed_function(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                histogram.add(elapsed)
+                turn_times[name] = turn_times.get(name, ZERO) + elapsed
+
+        return timed_function
+
+    def count(self, name: str, amount: int = ONE) -> None:
+        """Adds to a counter.
+
+        Parameters:
+            name (str): the counter to add to
+            amount (int): how much to add
+        """
+        self._counters[name] = self._counters.get(name, ZERO) + amount
+
+    def get_counters(self) -> dict[str, int]:
+        """
+        Returns:
+            dict[str, int]: the value of each counter, and the number of
+                            calls to each timed function
+        """
+        counters = {name: histogram.get_count()
+                    for name, histogram in self._histograms.items()}
+        counters.update(self._counters)
+        return counters
+
+    def get_histograms(self) -> dict[str, Histogram]:
+        """
+        Returns:
+            dict[str, Histogram]: the durations of each timed function
+        """
+        return dict(self._histograms)
+
+    def end_turn(self, **fields) -> None:
+        """Sends the time spent in each timed function since the last turn
+           ended to the sink, then starts a new turn.
+
+        Parameters:
+            fields: anything else to include in the record, e.g. the input
+        """
+        self._turn = self._turn + ONE
+        record = {'turn': self._turn,
+                  'times': {name: elapsed / NANOSECONDS
+                            for name, elapsed in self._turn_times.items()}}
+        record.update(fields)
+        self._sink.emit(record)
+        self._turn_times.clear()
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: the counters and a summary of each histogram
+        """
+        return {'turns': self._turn, 'counters': self.get_counters(),
+                'histograms': {name: histogram.to_dict() for name, histogram
+                               in self._histograms.items()}}
+
+    def close(self) -> None:
+        """Sends the summary to the sink and closes it.
+        """
+        self._sink.emit(self.summary())
+        self._sink.close()
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with its sink
+        """
+        return f'{type(self).__name__}({self._sink!r})'
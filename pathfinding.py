@@ -0,0 +1,581 @@
+"""Shortest paths and distance fields over a Maze.
+
+Tiles are walkable when Tile.is_blocking() is False, and stepping onto a
+tile costs one health plus Tile.damage(), as in Model.move_player. Distance
+fields are cached per (maze, source) and dropped automatically once the
+maze's doors are unlocked, since that is the only way walkability changes.
+Each maze keeps at most CACHE_LIMIT results, forgetting the least recently
+used first.
+"""
+from __future__ import annotations
+from array import array
+from collections import OrderedDict
+from typing import Optional
+from weakref import WeakKeyDictionary
+from a2 import Maze, ZERO, ONE, DOOR_CODE
+
+UNREACHED = -1
+# Kinds of field kept in the cache
+STEPS = 'steps'
+COST = 'cost'
+# Results kept per maze
+CACHE_LIMIT = 64
+
+# maze -> (doors unlocked when cached,
+#          OrderedDict {(kind, source, through_doors): field}, oldest first)
+_cache = WeakKeyDictionary()
+
+
+class Grid:
+    """A maze's walkability and step costs, padded with a blocking border so
+       that neighbours never need bounds checks.
+
+       Cell indexes are (row + 1) * width + column, where width is the
+       number of maze columns plus one; the extra column at the end of each
+       row acts as the border on both the right of that row and the left of
+       the next.
+    """
+    def __init__(self, maze: Maze, through_doors: bool = False) -> None:
+        """
+        Parameters:
+            maze (Maze): the maze to search
+            through_doors (bool): treat locked doors as walkable
+        """
+        columns = maze.get_dimensions()[1]
+        codes = maze.get_tile_codes()
+        table = maze.get_tile_table()
+        walkable = [not tile.is_blocking() for tile in table]
+        if through_doors:
+            walkable[DOOR_CODE] = True
+
+        self._columns = columns
+        self._rows = len(codes) // columns if columns else ZERO
+        self._width = columns + ONE
+        walkable = codes.translate(bytes(walkable).ljust(256, b'\x00'))
+        # Step cost is 1 + damage, and 0 for anything that can't be entered
+        costs = codes.translate(bytes(
+            ONE + tile.damage() for tile in table).ljust(256, b'\x00'))
+
+        border = bytes(self._width)
+        self._walkable = bytearray(border)
+        self._costs = bytearray(border)
+        for start in range(ZERO, len(codes), columns):
+            self._walkable += walkable[start:start + columns] + b'\x00'
+            self._costs += costs[start:start + columns] + b'\x00'
+        self._walkable += border + b'\x00'
+        self._costs += border + b'\x00'
+
+    def get_size(self) -> int:
+        """
+        Returns:
+            int: the number of cells, including the border
+        """
+        return len(self._walkable)
+
+    def to_cell(self, position: tuple[int, int]) -> int:
+        """
+        Parameters:
+            position (tuple[int, int]): (row, column) in the maze
+
+        Returns:
+            int: the padded cell index of the position
+        """
+        return (position[0] + ONE) * self._width + position[1]
+
+    def to_position(self, cell: int) -> tuple[int, int]:
+        """
+        Parameters:
+            cell (int): a padded cell index
+
+        Returns:
+            tuple[int, int]: the (row, column) of the cell in the maze
+        """
+        row, column = divmod(cell, self._width)
+        return row - ONE, column
+
+    def contains(self, position: tuple[int, int]) -> bool:
+        """
+        Returns:
+            bool: True if the position is inside the maze
+        """
+        return ZERO <= position[0] < self._rows \
+            and ZERO <= position[1] < self._columns
+
+    def is_walkable(self, position: tuple[int, int]) -> bool:
+        """
+        Returns:
+            bool: True if the position is inside the maze and can be entered
+        """
+        return self.contains(position) \
+            and self._walkable[self.to_cell(position)] == ONE
+
+
+class DistanceField:
+    """The distance from one source to every cell of a maze."""
+    def __init__(self, grid: Grid, source: tuple[int, int],
+                 distances: array) -> None:
+        """
+        Parameters:
+            grid (Grid): the grid the distances were measured on
+            source (tuple[int, int]): where the distances were measured from
+            distances (array): distance of each padded cell, or UNREACHED
+        """
+        self._grid = grid
+        self._source = source
+        self._distances = distances
+
+    def get_source(self) -> tuple[int, int]:
+        """
+        Returns:
+            tuple[int, int]: where the distances were measured from
+        """
+        return self._source
+
+    def get(self, position: tuple[int, int]) -> Optional[int]:
+        """
+        Parameters:
+            position (tuple[int, int]): (row, column) in the maze
+
+        Returns:
+            Optional[int]: the distance to the position, None if unreachable
+        """
+        if not self._grid.contains(position):
+            return None
+
+        distance = self._distances[self._grid.to_cell(position)]
+        return None if distance == UNREACHED else distance
+
+    def path_to(self, position: tuple[int, int]
+                ) -> Optional[list[tuple[int, int]]]:
+        """Follows decreasing distances from the position back to the source.
+
+        Parameters:
+            position (tuple[int, int]): (row, column) to finish at
+
+        Returns:
+            Optional[list[tuple[int, int]]]: positions from the source to the
+                                             given position, inclusive, or
+                                             None if it can't be reached
+        """
+        if self.get(position) is None:
+            return None
+
+        return self._walk_back(self._grid.to_cell(position))
+
+    def _walk_back(self, cell: int, settled: Optional[bytearray] = None
+                   ) -> list[tuple[int, int]]:
+        """
+        Parameters:
+            cell (int): padded cell index to finish at
+            settled (Optional[bytearray]): if given, only cells marked in it
+                                           have their final distance
+
+        Returns:
+            list[tuple[int, int]]: positions from the source to the cell
+        """
+        grid = self._grid
+        distances = self._distances
+        width = grid._width
+        path = [cell]
+
+        # The previous cell is the neighbour whose distance plus the cost of
+        # stepping into this cell gives this cell's distance
+        while distances[cell] != ZERO:
+            target = distances[cell] - self._step_cost(cell)
+            for neighbour in (cell - width, cell + width, cell - ONE,
+                              cell + ONE):
+                if distances[neighbour] == target \
+                        and (settled is None or settled[neighbour]):
+                    cell = neighbour
+                    break
+            path.append(cell)
+
+        path.reverse()
+        return [grid.to_position(cell) for cell in path]
+
+    def _step_cost(self, cell: int) -> int:
+        """
+        Parameters:
+            cell (int): a padded cell index
+
+        Returns:
+            int: how much stepping into the cell adds to the distance
+        """
+        return ONE
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with its source
+        """
+        return f'{type(self).__name__}({self._source})'
+
+
+class CostField(DistanceField):
+    """The least health lost getting from one source to every cell of a maze,
+       where each step costs one plus the damage of the tile entered.
+    """
+    def _step_cost(self, cell: int) -> int:
+        return self._grid._costs[cell]
+
+
+def get_grid(maze: Maze, through_doors: bool = False) -> Grid:
+    """
+    Parameters:
+        maze (Maze): the maze to search
+        through_doors (bool): treat locked doors as walkable
+
+    Returns:
+        Grid: the cached padded grid for the maze's current doors
+    """
+    return _cached(maze, ('grid', None, through_doors),
+                   lambda: Grid(maze, through_doors))
+
+
+def distance_field(maze: Maze, source: tuple[int, int],
+                   through_doors: bool = False) -> DistanceField:
+    """Counts the fewest steps from the source to every cell (breadth first).
+
+    Parameters:
+        maze (Maze): the maze to search
+        source (tuple[int, int]): (row, column) to measure from
+        through_doors (bool): treat locked doors as walkable
+
+    Returns:
+        DistanceField: steps to each cell, cached until the doors unlock
+    """
+    return _cached(maze, (STEPS, source, through_doors),
+                   lambda: _breadth_first(get_grid(maze, through_doors),
+                                          source, [source]))
+
+
+def nearest_field(maze: Maze, sources: list[tuple[int, int]],
+                  through_doors: bool = False) -> DistanceField:
+    """Counts the fewest steps from the closest of the sources to every cell,
+       e.g. the distance to the nearest exit.
+
+    Parameters:
+        maze (Maze): the maze to search
+        sources (list[tuple[int, int]]): (row, column) positions to measure
+                                         from
+        through_doors (bool): treat locked doors as walkable
+
+    Returns:
+        DistanceField: steps to each cell, cached until the doors unlock
+    """
+    sources = tuple(sorted(set(sources)))
+    return _cached(maze, (STEPS, sources, through_doors),
+                   lambda: _breadth_first(get_grid(maze, through_doors),
+                                          sources, list(sources)))
+
+
+def cost_field(maze: Maze, source: tuple[int, int],
+               through_doors: bool = False) -> CostField:
+    """Finds the least health lost from the source to every cell (Dijkstra).
+
+    Parameters:
+        maze (Maze): the maze to search
+        source (tuple[int, int]): (row, column) to measure from
+        through_doors (bool): treat locked doors as walkable
+
+    Returns:
+        CostField: cost to reach each cell, cached until the doors unlock
+    """
+    return _cached(maze, (COST, source, through_doors),
+                   lambda: _dijkstra(get_grid(maze, through_doors), source))
+
+
+def shortest_path(maze: Maze, start: tuple[int, int], goal: tuple[int, int],
+                  through_doors: bool = False
+                  ) -> Optional[list[tuple[int, int]]]:
+    """
+    Parameters:
+        maze (Maze): the maze to search
+        start (tuple[int, int]): (row, column) to start from
+        goal (tuple[int, int]): (row, column) to finish at
+        through_doors (bool): treat locked doors as walkable
+
+    Returns:
+        Optional[list[tuple[int, int]]]: the positions along a path with the
+                                         fewest steps, including the start
+                                         and goal, or None if there isn't one
+    """
+    return distance_field(maze, start, through_doors).path_to(goal)
+
+
+def cheapest_path(maze: Maze, start: tuple[int, int], goal: tuple[int, int],
+                  through_doors: bool = False
+                  ) -> Optional[tuple[int, list[tuple[int, int]]]]:
+    """Finds the path losing the least health, using A* with the number of
+       steps left as the estimate.
+
+    Parameters:
+        maze (Maze): the maze to search
+        start (tuple[int, int]): (row, column) to start from
+        goal (tuple[int, int]): (row, column) to finish at
+        through_doors (bool): treat locked doors as walkable
+
+    Returns:
+        Optional[tuple[int, list[tuple[int, int]]]]: the health lost and the
+                                                     positions along the path,
+                                                     or None if there isn't one
+    """
+    grid = get_grid(maze, through_doors)
+    if not grid.is_walkable(start) or not grid.is_walkable(goal):
+        return None
+
+    walkable, steps, width = grid._walkable, grid._costs, grid._width
+    source, target = grid.to_cell(start), grid.to_cell(goal)
+    goal_row, goal_column = divmod(target, width)
+    costs = array('l', [UNREACHED]) * grid.get_size()
+    closed = bytearray(grid.get_size())
+    costs[source] = ZERO
+
+    # Estimates only ever rise by at most one more than a step's cost, so
+    # a small ring of buckets works as the priority queue
+    buckets = [[] for _ in range(max(steps) + 2)]
+    estimate = abs(divmod(source, width)[0] - goal_row) \
+        + abs(source % width - goal_column)
+    buckets[estimate % len(buckets)].append(source)
+    pending = ONE
+
+    while pending:
+        bucket = buckets[estimate % len(buckets)]
+        while bucket:
+            cell = bucket.pop()
+            pending = pending - ONE
+            if closed[cell]:
+                continue
+
+            closed[cell] = ONE
+            if cell == target:
+                field = CostField(grid, start, costs)
+                return costs[target], field._walk_back(target, closed)
+
+            cost = costs[cell]
+            for neighbour in (cell - width, cell + width, cell - ONE,
+                              cell + ONE):
+                if walkable[neighbour] and not closed[neighbour]:
+                    new_cost = cost + steps[neighbour]
+                    known = costs[neighbour]
+                    if known == UNREACHED or new_cost < known:
+                        costs[neighbour] = new_cost
+                        row, column = divmod(neighbour, width)
+                        priority = new_cost + abs(row - goal_row) \
+                            + abs(column - goal_column)
+                        buckets[priority % len(buckets)].append(neighbour)
+                        pending = pending + ONE
+        estimate = estimate + ONE
+
+    return None
+
+
+def unreachable(maze: Maze, source: tuple[int, int],
+                positions: list[tuple[int, int]],
+                through_doors: bool = False) -> list[tuple[int, int]]:
+    """
+    Parameters:
+        maze (Maze): the maze to search
+        source (tuple[int, int]): (row, column) to search from
+        positions (list[tuple[int, int]]): positions to check, e.g. coins
+        through_doors (bool): treat locked doors as walkable
+
+    Returns:
+        list[tuple[int, int]]: the positions that can't be reached
+    """
+    field = distance_field(maze, source, through_doors)
+    return [position for position in positions if field.get(position) is None]
+
+
+def steps_within(maze: Maze, start: tuple[int, int],
+                 targets: list[tuple[int, int]], limit: int,
+                 through_doors: bool = False) -> Optional[int]:
+    """Counts the fewest steps from the start to the nearest target, looking
+       no further than limit steps away. Only the cells within reach are
+       visited and nothing is cached, so this suits targets that change
+       every turn.
+
+    Parameters:
+        maze (Maze): the maze to search
+        start (tuple[int, int]): (row, column) to measure from
+        targets (list[tuple[int, int]]): (row, column) positions to reach
+        limit (int): the most steps to look
+        through_doors (bool): treat locked doors as walkable
+
+    Returns:
+        Optional[int]: steps to the nearest target, or None if none is
+                       within limit steps
+    """
+    grid = get_grid(maze, through_doors)
+    goals = {grid.to_cell(target) for target in targets
+             if grid.is_walkable(target)}
+    if not goals or not grid.contains(start):
+        return None
+
+    walkable = grid._walkable
+    width = grid._width
+    cell = grid.to_cell(start)
+    if cell in goals:
+        return ZERO
+
+    seen = {cell}
+    frontier = [cell]
+    for distance in range(ONE, limit + ONE):
+        next_frontier = []
+        for cell in frontier:
+            for neighbour in (cell - width, cell + width, cell - ONE,
+                              cell + ONE):
+                if walkable[neighbour] and neighbour not in seen:
+                    if neighbour in goals:
+                        return distance
+                    seen.add(neighbour)
+                    next_frontier.append(neighbour)
+        frontier = next_frontier
+    return None
+
+
+def clear_cache(maze: Optional[Maze] = None) -> None:
+    """Forgets the cached results for one maze, or for every maze.
+
+    Parameters:
+        maze (Optional[Maze]): the maze to forget, defaults to all of them
+    """
+    if maze is None:
+        _cache.clear()
+    else:
+        _cache.pop(maze, None)
+
+
+def _cached(maze: Maze, key: tuple, build):
+    """Looks up a cached result for the maze, building it if it's missing.
+
+    Parameters:
+        maze (Maze): the maze the result belongs to
+        key (tuple): identifies the result within the maze
+        build: called with no arguments to create the result
+
+    Returns:
+        The cached or newly built result
+    """
+    unlocked = maze.is_unlocked()
+    entry = _cache.get(maze)
+
+    # Unlocking the doors changes which tiles are walkable
+    if entry is None or entry[0] != unlocked:
+        entry = (unlocked, OrderedDict())
+        _cache[maze] = entry
+
+    results = entry[1]
+    result = results.get(key)
+    if result is None:
+        result = build()
+        results[key] = result
+        if len(results) > CACHE_LIMIT:
+            results.popitem(last=False)
+    else:
+        results.move_to_end(key)
+
+    return result
+
+
+def _breadth_first(grid: Grid, source, starts: list[tuple[int, int]]
+                   ) -> DistanceField:
+    """
+    Parameters:
+        grid (Grid): the grid to search
+        source: what the field is recorded as being measured from
+        starts (list[tuple[int, int]]): (row, column) positions at distance 0
+
+    Returns:
+        DistanceField: the fewest steps to every cell
+    """
+    distances = array('l', [UNREACHED]) * grid.get_size()
+
+    # Cells are marked as seen by clearing them in a copy of the grid
+    unseen = bytearray(grid._walkable)
+    width = grid._width
+    frontier = []
+    for position in starts:
+        if grid.is_walkable(position):
+            start = grid.to_cell(position)
+            distances[start] = ZERO
+            unseen[start] = ZERO
+            frontier.append(start)
+    distance = ZERO
+
+    while frontier:
+        distance = distance + ONE
+        next_frontier = []
+        add = next_frontier.append
+        for cell in frontier:
+            neighbour = cell - width
+            if unseen[neighbour]:
+                unseen[neighbour] = ZERO
+                distances[neighbour] = distance
+                add(neighbour)
+            neighbour = cell + width
+            if unseen[neighbour]:
+                unseen[neighbour] = ZERO
+                distances[neighbour] = distance
+                add(neighbour)
+            neighbour = cell - ONE
+            if unseen[neighbour]:
+                unseen[neighbour] = ZERO
+                distances[neighbour] = distance
+                add(neighbour)
+            neighbour = cell + ONE
+            if unseen[neighbour]:
+                unseen[neighbour] = ZERO
+                distances[neighbour] = distance
+                add(neighbour)
+        frontier = next_frontier
+
+    return DistanceField(grid, source, distances)
+
+
+def _dijkstra(grid: Grid, source: tuple[int, int]) -> CostField:
+    """
+    Parameters:
+        grid (Grid): the grid to search
+        source (tuple[int, int]): (row, column) to measure from
+
+    Returns:
+        CostField: the least cost to every cell
+    """
+    costs = array('l', [UNREACHED]) * grid.get_size()
+    if not grid.is_walkable(source):
+        return CostField(grid, source, costs)
+
+    walkable, steps, width = grid._walkable, grid._costs, grid._width
+    start = grid.to_cell(source)
+    costs[start] = ZERO
+
+    # Step costs are small whole numbers, so a ring of buckets indexed by
+    # cost replaces a heap (Dial's algorithm)
+    size = max(steps) + ONE
+    buckets = [[] for _ in range(size)]
+    buckets[ZERO].append(start)
+    pending = ONE
+    cost = ZERO
+
+    while pending:
+        bucket = buckets[cost % size]
+        pending = pending - len(bucket)
+        while bucket:
+            cell = bucket.pop()
+            # Skips cells that were since reached more cheaply
+            if costs[cell] != cost:
+                continue
+
+            for neighbour in (cell - width, cell + width, cell - ONE,
+                              cell + ONE):
+                if walkable[neighbour]:
+                    new_cost = cost + steps[neighbour]
+                    known = costs[neighbour]
+                    if known == UNREACHED or new_cost < known:
+                        costs[neighbour] = new_cost
+                        buckets[new_cost % size].append(neighbour)
+                        pending = pending + ONE
+        cost = cost + ONE
+
+    return CostField(grid, source, costs)
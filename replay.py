@@ -0,0 +1,372 @@
+"""Headless replay of MazeRunner replay logs.
+
+MazeRunner writes a replay log of a session when given a path for one. A
+log can be replayed here with no rendering and no input(), either through
+the compiled levels used by the simulator, which runs millions of inputs per
+second, or through Model itself to regression test changes to it. Either
+way the stat checksums in the log are compared as the inputs are made.
+"""
+from __future__ import annotations
+import argparse
+import time
+from typing import Optional
+from a2 import Model, load_game, hash_game_file, stats_checksum, ZERO, ONE, \
+    ITEMS, ITEMS_NAME, ITEM_EFFECTS, UNDO, REDO, REPLAY_HEADER, REPLAY_GAME, \
+    REPLAY_CHECK
+from constants import *
+from simulator import CompiledLevel, Playthrough, SimulationResult
+
+USE_PREFIX = 'i '
+
+
+class ReplayLog:
+    """The inputs of one recorded session, with the checksums between them.
+    """
+    def __init__(self, game_hash: str, game_file: str,
+                 entries: list[str]) -> None:
+        """
+        Parameters:
+            game_hash (str): SHA-256 of the game file that was played
+            game_file (str): path of the game file when it was recorded
+            entries (list[str]): each input or checksum line, in order
+        """
+        self._game_hash = game_hash
+        self._game_file = game_file
+        self._entries = entries
+
+    def get_game_hash(self) -> str:
+        """
+        Returns:
+            str: SHA-256 of the game file that was played
+        """
+        return self._game_hash
+
+    def get_game_file(self) -> str:
+        """
+        Returns:
+            str: path of the game file when it was recorded
+        """
+        return self._game_file
+
+    def get_entries(self) -> list[str]:
+        """
+        Returns:
+            list[str]: each input or checksum line, in order
+        """
+        return self._entries
+
+    def get_inputs(self) -> list[str]:
+        """
+        Returns:
+            list[str]: the inputs made, without the checksums
+        """
+        return [entry for entry in self._entries
+                if not entry.startswith(REPLAY_CHECK)]
+
+    def has_undo(self) -> bool:
+        """
+        Returns:
+            bool: True if the session undid or redid any turns
+        """
+        return UNDO in self._entries or REDO in self._entries
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the game and number of entries
+        """
+        return f"{type(self).__name__}('{self._game_file}', " \
+               f"entries={len(self._entries)})"
+
+
+class ReplayResult(SimulationResult):
+    """The outcome of replaying a log, along with how its checksums
+       compared.
+    """
+    def __init__(self, stats: tuple[int, int, int], won: bool, lost: bool,
+                 steps: int, level: int, position: tuple[int, int],
+                 inventory: dict[str, int], checks: int,
+                 mismatches: list[int]) -> None:
+        """
+        Parameters:
+            stats, won, lost, level, position, inventory: as SimulationResult
+            steps (int): number of inputs made
+            checks (int): number of checksums compared
+            mismatches (list[int]): number of inputs made before each
+                                    checksum that did not match
+        """
+        super().__init__(stats, won, lost, steps, level, position, inventory)
+        self._checks = checks
+        self._mismatches = mismatches
+
+    def get_checks(self) -> int:
+        """
+        Returns:
+            int: number of checksums compared
+        """
+        return self._checks
+
+    def get_mismatches(self) -> list[int]:
+        """
+        Returns:
+            list[int]: number of inputs made before each checksum that did
+                       not match
+        """
+        return self._mismatches
+
+    def is_verified(self) -> bool:
+        """
+        Returns:
+            bool: True if every checksum matched
+        """
+        return not self._mismatches
+
+
+def read_replay(filename: str) -> ReplayLog:
+    """
+    Parameters:
+        filename (str): path of the replay log
+
+    Returns:
+        ReplayLog: the session recorded in the log
+
+    Raises:
+        ValueError: if the file is not a replay log
+    """
+    with open(filename, 'r') as file:
+        lines = file.read().split('\n')
+
+    if len(lines) < 2 or lines[0] != REPLAY_HEADER \
+            or not lines[1].startswith(REPLAY_GAME + ' '):
+        raise ValueError(f'{filename} is not a replay log')
+
+    _, game_hash, game_file = lines[1].split(' ', 2)
+    return ReplayLog(game_hash, game_file,
+                     [line for line in lines[2:] if line])
+
+
+class ReplayPlaythrough(Playthrough):
+    """A Playthrough of the inputs in a replay log, which uses items from a
+       count of each kind held and compares the log's checksums.
+    """
+    def __init__(self, levels: list[CompiledLevel]) -> None:
+        """
+        Parameters:
+            levels (list[CompiledLevel]): the compiled levels, in order
+        """
+        super().__init__(levels)
+        # Change to (health, hunger, thirst) made by using each kind of item
+        self._effects = {item_id: effect.get_changes()
+                         for item_id, effect in ITEM_EFFECTS.items()}
+        self._item_ids = dict(zip(ITEMS_NAME, ITEMS))
+        self._checks = ZERO
+        self._mismatches = []
+
+    def check(self, entry: str) -> None:
+        """Compares a checksum line from the log with the player's stats.
+
+        Parameters:
+            entry (str): the checksum line
+        """
+        self._checks = self._checks + ONE
+        if entry[2:] != stats_checksum(self._stats):
+            self._mismatches.append(self._steps)
+
+    def _use_input(self, entry: str) -> bool:
+        """Compares a checksum, or uses an item if one is held.
+
+        Parameters:
+            entry (str): a checksum line or "i <Item>"
+
+        Returns:
+            bool: True unless the entry is a checksum
+        """
+        if entry[0] == REPLAY_CHECK:
+            self.check(entry)
+            return False
+
+        item = self._item_ids.get(entry[2:]) \
+            if entry.startswith(USE_PREFIX) else None
+        if self._inventory.get(item):
+            self._inventory[item] = self._inventory[item] - ONE
+            change = self._effects[item]
+            health, hunger, thirst = self._stats
+            self._stats = (min(max(health + change[0], ZERO), MAX_HEALTH),
+                           min(max(hunger + change[1], ZERO), MAX_HUNGER),
+                           min(max(thirst + change[2], ZERO), MAX_THIRST))
+        return True
+
+    def get_result(self) -> ReplayResult:
+        """
+        Returns:
+            ReplayResult: the state the game is in, and how the checksums
+                          compared
+        """
+        result = super().get_result()
+        return ReplayResult(result.get_player_stats(), result.has_won(),
+                            result.has_lost(), result.get_steps(),
+                            result.get_level(), result.get_position(),
+                            result.get_inventory(), self._checks,
+                            self._mismatches)
+
+
+class Replayer:
+    """Replays logs for one game file through its compiled levels.
+
+       Each log is a ReplayPlaythrough. Logs that undo or redo turns are
+       replayed through Model instead, as the compiled levels keep no
+       history.
+    """
+    def __init__(self, game_file: str) -> None:
+        """
+        Parameters:
+            game_file (str): path of the game the logs were recorded on
+        """
+        self._game_file = game_file
+        self._game_hash = hash_game_file(game_file)
+        self._levels = [CompiledLevel(level) for level in load_game(game_file)]
+
+    def get_game_hash(self) -> str:
+        """
+        Returns:
+            str: SHA-256 of the game file
+        """
+        return self._game_hash
+
+    def run(self, log: ReplayLog) -> ReplayResult:
+        """Replays every input in the log, comparing its checksums.
+
+        Parameters:
+            log (ReplayLog): the session to replay
+
+        Returns:
+            ReplayResult: the state the game ended in
+
+        Raises:
+            ValueError: if the log was recorded on a different game file
+        """
+        if log.get_game_hash() != self._game_hash:
+            raise ValueError(f'{log!r} was not recorded on '
+                             f'{self._game_file}')
+
+        if log.has_undo():
+            return replay_model(self._game_file, log)
+
+        entries = iter(log.get_entries())
+        game = ReplayPlaythrough(self._levels)
+        game.play(entries)
+        # Only the final checksum follows the move that ended the game
+        for entry in entries:
+            if entry[0] == REPLAY_CHECK:
+                game.check(entry)
+        return game.get_result()
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: the text required to construct a new Replayer for the same
+                 game file
+        """
+        return f"{type(self).__name__}('{self._game_file}')"
+
+
+def replay_model(game_file: str, log: ReplayLog) -> ReplayResult:
+    """Replays every input in the log through Model, the way MazeRunner.play
+       makes them.
+
+    Parameters:
+        game_file (str): path of the game the log was recorded on
+        log (ReplayLog): the session to replay
+
+    Returns:
+        ReplayResult: the state the game ended in
+    """
+    model = Model(game_file, record_history=True)
+    steps = checks = ZERO
+    mismatches = []
+    finished = False
+
+    for entry in log.get_entries():
+        if entry.startswith(REPLAY_CHECK):
+            checks = checks + ONE
+            if entry[2:] != stats_checksum(model.get_player_stats()):
+                mismatches.append(steps)
+            continue
+
+        if finished:
+            continue
+
+        steps = steps + ONE
+        if entry in MOVE_DELTAS:
+            model.move_player(MOVE_DELTAS[entry])
+            finished = model.has_lost() or model.has_won()
+
+        elif entry.startswith(USE_PREFIX):
+            model.use_item(entry[2:])
+
+        elif entry == UNDO:
+            model.undo()
+
+        elif entry == REDO:
+            model.redo()
+
+    held = model.get_player_inventory()
+    inventory = {name: held.get_count(name) for name in held.get_items()}
+    return ReplayResult(model.get_player_stats(), model.has_won(),
+                        model.has_lost(), steps, model.get_level_number(),
+                        model.get_player().get_position(), inventory,
+                        checks, mismatches)
+
+
+def replay(log_file: str, game_file: Optional[str] = None,
+           use_model: bool = False) -> ReplayResult:
+    """Reads and replays a replay log.
+
+    Parameters:
+        log_file (str): path of the replay log
+        game_file (Optional[str]): path of the game, defaults to the path
+                                   recorded in the log
+        use_model (bool): replay through Model instead of the compiled
+                          levels
+
+    Returns:
+        ReplayResult: the state the game ended in
+
+    Raises:
+        ValueError: if the log was recorded on a different game file
+    """
+    log = read_replay(log_file)
+    if game_file is None:
+        game_file = log.get_game_file()
+
+    if not use_model:
+        return Replayer(game_file).run(log)
+
+    if log.get_game_hash() != hash_game_file(game_file):
+        raise ValueError(f'{log!r} was not recorded on {game_file}')
+    return replay_model(game_file, log)
+
+
+def main():
+    """Replays a MazeRunner replay log and checks it against its checksums.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('log_file')
+    parser.add_argument('--game', help='game file, if it has moved')
+    parser.add_argument('--model', action='store_true',
+                        help='replay through Model')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = replay(args.log_file, args.game, args.model)
+    elapsed = time.perf_counter() - start
+
+    print(result)
+    print(f'checks: {result.get_checks()}, '
+          f'mismatched after inputs: {result.get_mismatches()}')
+    print(f'inputs_per_sec: {result.get_steps() / elapsed:,.1f}')
+    raise SystemExit(ZERO if result.is_verified() else ONE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""A server hosting many MazeRunner games at once over a line protocol.
+
+Each connection plays its own game: the server sends what MazeRunner would
+print, followed by the same prompts, and every line received is taken as
+one input. Games are run by MazeRunner itself through take_turn, with a
+TextInterface that collects its output for the connection instead of
+printing it, so the rules and messages are the same as playing locally.
+
+Every game file is loaded once. Each session plays copies of those levels
+that share their tiles and items, so a session only holds the state that
+changes as it is played.
+
+    python server.py games/game1.txt games/game2.txt --port 8023
+    nc localhost 8023
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+from typing import Optional
+from a2 import MazeRunner, Level, load_template, ZERO, ONE
+from a2_support import TextInterface, IncrementalTextInterface
+
+HOST = '127.0.0.1'
+PORT = 8023
+GAME_PROMPT = 'Enter game file: '
+MOVE_PROMPT = '\nEnter a move: '
+UNKNOWN_GAME = 'No game with that name is being served!'
+LINE_TOO_LONG = 'That line is too long, closing the connection.'
+# (rows, columns) assumed for a client's terminal, whose size isn't sent
+CLIENT_TERMINAL = (24, 80)
+
+
+class OutputBuffer:
+    """Text waiting to be sent to a connection."""
+    def __init__(self) -> None:
+        self._parts = []
+
+    def write(self, text: str) -> None:
+        """
+        Parameters:
+            text (str): text to add to the end of the buffer
+        """
+        self._parts.append(text)
+
+    def flush(self) -> None:
+        """Does nothing, the buffer is only sent when take is called."""
+
+    def take(self) -> str:
+        """
+        Returns:
+            str: everything written since the last take, which is removed
+        """
+        text = ''.join(self._parts)
+        self._parts.clear()
+        return text
+
+
+class ConnectionInterface(TextInterface):
+    """A TextInterface that writes to an OutputBuffer instead of printing.
+    """
+    def __init__(self, output: OutputBuffer) -> None:
+        """
+        Parameters:
+            output (OutputBuffer): where to write each frame
+        """
+        self._output = output
+
+    def _draw_level(self, maze, items, player_position) -> None:
+        self._output.write('\n'.join(
+            self._level_rows(maze, items, player_position)) + '\n')
+
+    def _draw_inventory(self, inventory) -> None:
+        self._output.write(self._inventory_text(inventory) + '\n')
+
+    def _draw_player_stats(self, player_stats) -> None:
+        self._output.write(self._player_stats_text(player_stats) + '\n')
+
+
+class Session(MazeRunner):
+    """A MazeRunner for one connection, writing its messages to the same
+       OutputBuffer as its view.
+    """
+    def __init__(self, game_file: str, levels: list[Level],
+                 output: OutputBuffer, incremental: bool = False,
+                 undo: bool = False) -> None:
+        """
+        Parameters:
+            game_file (str): the game being played
+            levels (list[Level]): the levels to play, loaded from game_file
+            output (OutputBuffer): where to write everything shown
+            incremental (bool): only send the cells that changed each turn,
+                                using ANSI cursor movement
+            undo (bool): keep recent turns so that they can be undone
+        """
+        self._buffer = output
+        if incremental:
+            view = IncrementalTextInterface(output, CLIENT_TERMINAL)
+        else:
+            view = ConnectionInterface(output)
+        super().__init__(game_file, view, levels=levels, undo=undo)
+
+    def _output(self, *text: str) -> None:
+        self._buffer.write(' '.join(text) + '\n')
+
+
+class GameServer:
+    """Serves games from a fixed set of game files to many connections.
+    """
+    def __init__(self, game_files: list[str],
+                 incremental: bool = False, undo: bool = False) -> None:
+        """
+        Parameters:
+            game_files (list[str]): paths of the games that can be played
+            incremental (bool): send only the cells that change each turn
+            undo (bool): let players undo and redo their recent turns, which
+                         keeps up to HISTORY_LIMIT turns per session
+        """
+        self._levels = {game_file: load_template(game_file)
+                        for game_file in game_files}
+        self._incremental = incremental
+        self._undo = undo
+        self._sessions = ZERO
+        self._moves = ZERO
+
+    def get_session_count(self) -> int:
+        """
+        Returns:
+            int: the number of games being played now
+        """
+        return self._sessions
+
+    def get_move_count(self) -> int:
+        """
+        Returns:
+            int: the number of inputs taken across every session
+        """
+        return self._moves
+
+    def new_session(self, game_file: str,
+                    output: OutputBuffer) -> Optional[Session]:
+        """
+        Parameters:
+            game_file (str): the game to play
+            output (OutputBuffer): where the session writes what it shows
+
+        Returns:
+            Optional[Session]: a new game, or None if the game file is not
+                               being served
+        """
+        levels = self._levels.get(game_file)
+        if levels is None:
+            return None
+        return Session(game_file, [level.copy() for level in levels], output,
+                       self._incremental, self._undo)
+
+    async def _read_line(self, reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter) -> Optional[str]:
+        """
+        Parameters:
+            reader (asyncio.StreamReader): lines from the player
+            writer (asyncio.StreamWriter): where to say a line is too long
+
+        Returns:
+            Optional[str]: the next line, or None if the connection closed
+                           or the line was too long to read
+        """
+        try:
+            line = await reader.readline()
+        except ValueError:
+            # readline gives up on a line longer than the stream's limit
+            writer.write(f'{LINE_TOO_LONG}\n'.encode())
+            await writer.drain()
+            return None
+
+        if not line:
+            return None
+        return line.decode(errors='replace')
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """Plays one game with a connection, until it is won, lost or the
+           connection closes.
+
+        Parameters:
+            reader (asyncio.StreamReader): lines from the player
+            writer (asyncio.StreamWriter): where to send the game
+        """
+        output = OutputBuffer()
+        session = None
+        self._sessions = self._sessions + ONE
+        try:
+            # One game is started straight away, otherwise the player picks
+            if len(self._levels) == ONE:
+                session = self.new_session(next(iter(self._levels)), output)
+
+            while session is None:
+                writer.write(GAME_PROMPT.encode())
+                await writer.drain()
+                line = await self._read_line(reader, writer)
+                if line is None:
+                    return
+                session = self.new_session(line.strip(), output)
+                if session is None:
+                    writer.write(f'{UNKNOWN_GAME}\n'.encode())
+
+            while not session.is_finished():
+                writer.write((output.take() + MOVE_PROMPT).encode())
+                await writer.drain()
+                line = await self._read_line(reader, writer)
+                if line is None:
+                    return
+                session.take_turn(line.rstrip('\r\n'))
+                self._moves = self._moves + ONE
+
+            writer.write(output.take().encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._sessions = self._sessions - ONE
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host: str = HOST, port: int = PORT,
+                    path: Optional[str] = None) -> None:
+        """Accepts connections until cancelled.
+
+        Parameters:
+            host (str): address to listen on
+            port (int): TCP port to listen on
+            path (Optional[str]): listen on this Unix socket instead of TCP
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+
+        async with server:
+            await server.serve_forever()
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: the text required to construct a new GameServer for the
+                 same games
+        """
+        return f'{type(self).__name__}({list(self._levels)}, ' \
+               f'incremental={self._incremental}, undo={self._undo})'
+
+
+def main():
+    """Serves MazeRunner games over TCP or a Unix socket.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('game_files', nargs='+')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', help='path of a Unix socket to listen on')
+    parser.add_argument('--incremental', action='store_true',
+                        help='send only changed cells, for ANSI terminals')
+    parser.add_argument('--undo', action='store_true',
+                        help='let players undo and redo their recent turns')
+    args = parser.parse_args()
+
+    server = GameServer(args.game_files, args.incremental, args.undo)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
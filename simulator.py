@@ -0,0 +1,506 @@
+"""Headless simulation of MazeRunner games.
+
+Replays strings of moves (e.g. "wwdsa") against a game file without a user
+interface, producing the same results as driving a Model through
+MazeRunner.play. Each level is compiled once into flat walkability and
+damage arrays so that a run is a single tight loop.
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+from multiprocessing import Pool
+from typing import Iterable, Optional
+from a2 import Level, Model, load_game, ZERO, ONE, TIME_TO_CHANGE, ITEMS, \
+    ITEMS_NAME
+from constants import *
+
+
+class CompiledLevel:
+    """The parts of a Level needed to simulate it, stored as flat arrays
+       indexed by row * columns + column.
+    """
+    def __init__(self, level: Level) -> None:
+        """
+        Parameters:
+            level (Level): an unplayed level to compile
+        """
+        maze = level.get_maze()
+        table = maze.get_tile_table()
+        codes = maze.get_tile_codes()
+        self._columns = level.get_dimensions()[1]
+        self._rows = len(codes) // self._columns if self._columns else ZERO
+        self._start = level.get_player_start()
+        self._items = {position: item.get_id()
+                       for position, item in level.get_items().items()}
+        self._coins = level.get_coins_remaining()
+
+        # Doors are the only tiles that change, so both states are stored
+        blocking = bytes(tile.is_blocking() for tile in table)
+        self._locked = codes.translate(blocking.ljust(256, b'\x00'))
+        unlocked = bytes(tile.is_blocking() and tile.get_id() != DOOR
+                         for tile in table)
+        self._unlocked = codes.translate(unlocked.ljust(256, b'\x00'))
+        self._damage = codes.translate(
+            bytes(tile.damage() for tile in table).ljust(256, b'\x00'))
+
+    def get_start(self) -> Optional[tuple[int, int]]:
+        """
+        Returns:
+            Optional[tuple[int, int]]: the player start for this level.
+        """
+        return self._start
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the size of the level
+        """
+        return f'{type(self).__name__}(({self._rows}, {self._columns}))'
+
+
+class SimulationResult:
+    """The outcome of running one string of moves through a game."""
+    def __init__(self, stats: tuple[int, int, int], won: bool, lost: bool,
+                 steps: int, level: int, position: tuple[int, int],
+                 inventory: dict[str, int]) -> None:
+        """
+        Parameters:
+            stats (tuple[int, int, int]): final (health, hunger, thirst)
+            won (bool): True if every level was completed
+            lost (bool): True if the player ran out of health, food or water
+            steps (int): number of moves made before the game ended
+            level (int): index of the level the player finished on
+            position (tuple[int, int]): final player position
+            inventory (dict[str, int]): number of each item name collected
+        """
+        self._stats = stats
+        self._won = won
+        self._lost = lost
+        self._steps = steps
+        self._level = level
+        self._position = position
+        self._inventory = inventory
+
+    def get_player_stats(self) -> tuple[int, int, int]:
+        """
+        Returns:
+            tuple[int, int, int]: the final (health, hunger, thirst)
+        """
+        return self._stats
+
+    def has_won(self) -> bool:
+        """
+        Returns:
+            bool: True if the moves won the game
+        """
+        return self._won
+
+    def has_lost(self) -> bool:
+        """
+        Returns:
+            bool: True if the moves lost the game
+        """
+        return self._lost
+
+    def get_steps(self) -> int:
+        """
+        Returns:
+            int: the number of moves made before the game ended
+        """
+        return self._steps
+
+    def get_level(self) -> int:
+        """
+        Returns:
+            int: index of the level the player finished on
+        """
+        return self._level
+
+    def get_position(self) -> tuple[int, int]:
+        """
+        Returns:
+            tuple[int, int]: the final player position
+        """
+        return self._position
+
+    def get_inventory(self) -> dict[str, int]:
+        """
+        Returns:
+            dict[str, int]: number of each item name held at the end
+        """
+        return self._inventory
+
+    def __eq__(self, other: object) -> bool:
+        """
+        Returns:
+            bool: True if both results describe the same outcome
+        """
+        if not isinstance(other, SimulationResult):
+            return NotImplemented
+
+        return (self._stats, self._won, self._lost, self._steps, self._level,
+                self._position, self._inventory) == \
+            (other._stats, other._won, other._lost, other._steps,
+             other._level, other._position, other._inventory)
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the outcome it describes
+        """
+        return f'{type(self).__name__}(stats={self._stats}, ' \
+               f'won={self._won}, lost={self._lost}, steps={self._steps}, ' \
+               f'level={self._level}, position={self._position}, ' \
+               f'inventory={self._inventory})'
+
+
+class Playthrough:
+    """One game being played through compiled levels, from the start.
+
+       The rules are the same as Model.move_player followed by the
+       has_lost/has_won checks made by MazeRunner.play after each move.
+       Inputs that are not moves are passed to _use_input, which ignores
+       them, as play does with characters that are not moves.
+    """
+    def __init__(self, levels: list[CompiledLevel]) -> None:
+        """
+        Parameters:
+            levels (list[CompiledLevel]): the compiled levels, in order
+        """
+        self._levels = levels
+        self._stats = (MAX_HEALTH, ZERO, ZERO)
+        # Number of each item id held
+        self._inventory = {}
+        self._steps = ZERO
+        self._won = self._lost = False
+        self._start_level(ZERO)
+
+    def _start_level(self, level_num: int) -> None:
+        """Puts the player at the start of a level, as it was compiled.
+
+        Parameters:
+            level_num (int): index of the level
+        """
+        level = self._levels[level_num]
+        self._level_num = level_num
+        self._position = level._start
+        self._items = dict(level._items)
+        self._coins = level._coins
+        self._unlocked = False
+        self._valid_move = ZERO
+
+    def _use_input(self, entry: str) -> bool:
+        """Makes an input that is not a move. The player's stats and
+           inventory can be changed through self._stats and self._inventory.
+
+        Parameters:
+            entry (str): the input
+
+        Returns:
+            bool: True if the input counts as a step
+        """
+        return False
+
+    def play(self, inputs: Iterable[str]) -> None:
+        """Makes each input in turn, until they run out or the game ends.
+
+        Parameters:
+            inputs (Iterable[str]): the inputs, e.g. the moves in "wwdsa"
+        """
+        if self._won or self._lost:
+            return
+
+        # Everything used in the loop is kept in local variables
+        deltas = MOVE_DELTAS
+        levels = self._levels
+        max_level = len(levels) - ONE
+        level_num = self._level_num
+        level = levels[level_num]
+        rows, columns = level._rows, level._columns
+        unlocked = self._unlocked
+        blocking = level._unlocked if unlocked else level._locked
+        damage = level._damage
+        items = self._items
+        coins = self._coins
+        row, column = self._position
+        health, hunger, thirst = self._stats
+        valid_move = self._valid_move
+        inventory = self._inventory
+        steps = self._steps
+        won = lost = False
+
+        for entry in inputs:
+            delta = deltas.get(entry)
+            if delta is None:
+                self._stats = (health, hunger, thirst)
+                self._steps = steps
+                if self._use_input(entry):
+                    steps = steps + ONE
+                health, hunger, thirst = self._stats
+                continue
+
+            steps = steps + ONE
+            new_row = row + delta[0]
+            new_column = column + delta[1]
+
+            # The top and left edges block, as they do in Maze.get_moves
+            if new_row < ZERO or new_column < ZERO:
+                pass
+
+            elif new_row < rows and new_column < columns:
+                cell = new_row * columns + new_column
+                if not blocking[cell]:
+                    row, column = new_row, new_column
+                    health = health - ONE - damage[cell]
+                    if health < ZERO:
+                        health = ZERO
+                    valid_move = valid_move + ONE
+
+                    item = items.pop((row, column), None)
+                    if item is not None:
+                        inventory[item] = inventory.get(item, ZERO) + ONE
+                        if item == COIN:
+                            coins = coins - ONE
+
+                    if not unlocked and coins == ZERO:
+                        unlocked = True
+                        blocking = level._unlocked
+
+                    if valid_move == TIME_TO_CHANGE:
+                        hunger = min(hunger + ONE, MAX_HUNGER)
+                        thirst = min(thirst + ONE, MAX_THIRST)
+                        valid_move = ZERO
+
+            # Leaving the maze moves on to the next level
+            elif level_num == max_level:
+                won = True
+
+            else:
+                level_num = level_num + ONE
+                level = levels[level_num]
+                rows, columns = level._rows, level._columns
+                blocking, damage = level._locked, level._damage
+                items = dict(level._items)
+                coins = level._coins
+                unlocked = False
+                row, column = level._start
+
+            if health <= ZERO or hunger >= MAX_HUNGER \
+                    or thirst >= MAX_THIRST:
+                lost = True
+                break
+
+            if won:
+                break
+
+        self._level_num = level_num
+        self._position = (row, column)
+        self._items = items
+        self._coins = coins
+        self._unlocked = unlocked
+        self._valid_move = valid_move
+        self._stats = (health, hunger, thirst)
+        self._steps = steps
+        self._won = won
+        self._lost = lost
+
+    def get_result(self) -> SimulationResult:
+        """
+        Returns:
+            SimulationResult: the state the game is in
+        """
+        names = dict(zip(ITEMS, ITEMS_NAME))
+        return SimulationResult(self._stats, self._won, self._lost,
+                                self._steps, self._level_num, self._position,
+                                {names[item]: count for item, count
+                                 in self._inventory.items() if count})
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the level and stats it has reached
+        """
+        return f'{type(self).__name__}(level={self._level_num}, ' \
+               f'stats={self._stats}, steps={self._steps})'
+
+
+class Simulator:
+    """Runs strings of moves through a game file with no user interface,
+       each as a Playthrough of its compiled levels.
+    """
+    def __init__(self, game_file: str) -> None:
+        """
+        Parameters:
+            game_file (str): path of the game to simulate
+        """
+        self._game_file = game_file
+        self._levels = [CompiledLevel(level) for level in load_game(game_file)]
+
+    def get_levels(self) -> list[CompiledLevel]:
+        """
+        Returns:
+            list[CompiledLevel]: the compiled levels, in order
+        """
+        return self._levels
+
+    def run(self, moves: str) -> SimulationResult:
+        """Plays a single string of moves from the start of the game.
+
+        Parameters:
+            moves (str): the moves to make, e.g. "wwdsa"
+
+        Returns:
+            SimulationResult: the state the game ended in
+        """
+        game = Playthrough(self._levels)
+        game.play(moves)
+        return game.get_result()
+
+    def run_batch(self, move_lists: list[str]) -> list[SimulationResult]:
+        """Plays each string of moves from the start of the game.
+
+        Parameters:
+            move_lists (list[str]): the move strings to play
+
+        Returns:
+            list[SimulationResult]: the result of each, in the same order
+        """
+        return [self.run(moves) for moves in move_lists]
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: the text required to construct a new Simulator for the
+                 same game file
+        """
+        return f"{type(self).__name__}('{self._game_file}')"
+
+
+# Simulator for each worker process in run_parallel
+_worker_simulator = None
+
+
+def _start_worker(game_file: str) -> None:
+    """Compiles the game once in each worker process.
+
+    Parameters:
+        game_file (str): path of the game to simulate
+    """
+    global _worker_simulator
+    _worker_simulator = Simulator(game_file)
+
+
+def _run_in_worker(moves: str) -> SimulationResult:
+    """
+    Parameters:
+        moves (str): the moves to make
+
+    Returns:
+        SimulationResult: the result from the worker's simulator
+    """
+    return _worker_simulator.run(moves)
+
+
+def run_parallel(game_file: str, move_lists: list[str],
+                 processes: Optional[int] = None,
+                 chunksize: int = 64) -> list[SimulationResult]:
+    """Plays many strings of moves across a pool of processes.
+
+    Parameters:
+        game_file (str): path of the game to simulate
+        move_lists (list[str]): the move strings to play
+        processes (Optional[int]): number of worker processes, defaults to
+                                   the number of CPUs
+        chunksize (int): number of move strings sent to a worker at once
+
+    Returns:
+        list[SimulationResult]: the result of each, in the same order
+    """
+    with Pool(processes, initializer=_start_worker,
+              initargs=(game_file,)) as pool:
+        return pool.map(_run_in_worker, move_lists, chunksize)
+
+
+def run_model(game_file: str, moves: str) -> SimulationResult:
+    """Plays a string of moves through Model, the way MazeRunner.play does.
+
+    Parameters:
+        game_file (str): path of the game to play
+        moves (str): the moves to make
+
+    Returns:
+        SimulationResult: the state the game ended in
+    """
+    model = Model(game_file)
+    steps = ZERO
+
+    for move in moves:
+        if move not in MOVE_DELTAS:
+            continue
+
+        steps = steps + ONE
+        model.move_player(MOVE_DELTAS[move])
+
+        if model.has_lost() or model.has_won():
+            break
+
+    held = model.get_player_inventory()
+    inventory = {name: held.get_count(name) for name in held.get_items()}
+    return SimulationResult(model.get_player_stats(), model.has_won(),
+                            model.has_lost(), steps, model.get_level_number(),
+                            model.get_player().get_position(), inventory)
+
+
+def benchmark(game_file: str, runs: int = 200, length: int = 500,
+              seed: int = ZERO) -> dict[str, float]:
+    """Compares the speed of Simulator against the Model loop on random moves.
+
+    Parameters:
+        game_file (str): path of the game to play
+        runs (int): number of move strings to play
+        length (int): number of moves in each string
+        seed (int): seed for generating the moves
+
+    Returns:
+        dict[str, float]: steps per second for each approach and the speedup
+    """
+    generator = random.Random(seed)
+    move_lists = [''.join(generator.choice(list(MOVE_DELTAS))
+                          for _ in range(length)) for _ in range(runs)]
+
+    start = time.perf_counter()
+    expected = [run_model(game_file, moves) for moves in move_lists]
+    model_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = Simulator(game_file).run_batch(move_lists)
+    simulator_time = time.perf_counter() - start
+
+    if results != expected:
+        raise AssertionError('Simulator results differ from Model')
+
+    steps = sum(result.get_steps() for result in results)
+    return {'steps': steps,
+            'model_steps_per_sec': steps / model_time,
+            'simulator_steps_per_sec': steps / simulator_time,
+            'speedup': model_time / simulator_time}
+
+
+def main():
+    """Benchmarks the simulator against Model on a game file.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('game_file')
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--length', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=ZERO)
+    args = parser.parse_args()
+
+    for name, value in benchmark(args.game_file, args.runs, args.length,
+                                 args.seed).items():
+        print(f'{name}: {value:,.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Round trips every game in games/ through compile_game and checks that
+load_compiled_game gives back the same levels as load_game.
+
+    python -m pytest tests
+"""
+import glob
+import os
+import tempfile
+import unittest
+from a2 import compile_game, load_compiled_game, load_game, is_compiled_game
+
+GAMES = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'games')
+
+
+class CompiledGameTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._directory = tempfile.TemporaryDirectory()
+        self._games = sorted(glob.glob(os.path.join(GAMES, '*.txt')))
+        self.assertTrue(self._games, f'no games found in {GAMES}')
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def _compile(self, game_file: str) -> str:
+        compiled = os.path.join(self._directory.name,
+                                os.path.basename(game_file) + '.bin')
+        compile_game(game_file, compiled)
+        return compiled
+
+    def _assert_same_levels(self, expected, actual) -> None:
+        self.assertEqual(len(expected), len(actual))
+        for number, (level, loaded) in enumerate(zip(expected, actual)):
+            with self.subTest(level=number):
+                self.assertEqual(str(level.get_maze()),
+                                 str(loaded.get_maze()))
+                self.assertEqual(
+                    {position: item.get_id()
+                     for position, item in level.get_items().items()},
+                    {position: item.get_id()
+                     for position, item in loaded.get_items().items()})
+                self.assertEqual(level.get_maze().get_door_positions(),
+                                 loaded.get_maze().get_door_positions())
+                self.assertEqual(level.get_player_start(),
+                                 loaded.get_player_start())
+                self.assertEqual(level.get_coins_remaining(),
+                                 loaded.get_coins_remaining())
+                self.assertEqual(tuple(level.get_dimensions()),
+                                 tuple(loaded.get_dimensions()))
+
+    def test_round_trip(self) -> None:
+        for game_file in self._games:
+            with self.subTest(game=os.path.basename(game_file)):
+                compiled = self._compile(game_file)
+                self.assertTrue(is_compiled_game(compiled))
+                self.assertFalse(is_compiled_game(game_file))
+                self._assert_same_levels(load_game(game_file),
+                                         load_compiled_game(compiled))
+
+    def test_round_trip_compact(self) -> None:
+        for game_file in self._games:
+            with self.subTest(game=os.path.basename(game_file)):
+                self._assert_same_levels(
+                    load_game(game_file),
+                    load_compiled_game(self._compile(game_file), True))
+
+    def test_load_game_reads_compiled(self) -> None:
+        for game_file in self._games:
+            with self.subTest(game=os.path.basename(game_file)):
+                self._assert_same_levels(
+                    load_game(game_file),
+                    load_game(self._compile(game_file)))
+
+    def test_rejects_other_files(self) -> None:
+        with self.assertRaises(ValueError):
+            load_compiled_game(self._games[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Checks the edge rule of the move table: moves off the top or left edge
+of a maze are blocked, and moves off the bottom or right edge leave it.
+
+    python -m pytest tests
+"""
+import os
+import tempfile
+import unittest
+from a2 import Maze, Model, BLOCKED_MOVE, EXIT_MOVE
+from constants import *
+
+# Two open levels, so that leaving the first can be seen as a level up
+GAME = 'Maze 1 - 3 3\nP  \n   \n   \n\nMaze 2 - 3 3\nP  \n   \n   \n'
+
+
+class MoveTableTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._maze = Maze((3, 4))
+        for row in [' #  ', '  D ', 'L   ']:
+            self._maze.add_row(row)
+
+    def test_top_and_left_edges_block(self) -> None:
+        for column in range(4):
+            with self.subTest(column=column):
+                self.assertEqual(self._maze.get_move(
+                    (0, column), MOVE_DELTAS[UP]), BLOCKED_MOVE)
+        for row in range(3):
+            with self.subTest(row=row):
+                self.assertEqual(self._maze.get_move(
+                    (row, 0), MOVE_DELTAS[LEFT]), BLOCKED_MOVE)
+
+    def test_bottom_and_right_edges_exit(self) -> None:
+        for column in range(4):
+            with self.subTest(column=column):
+                self.assertEqual(self._maze.get_move(
+                    (2, column), MOVE_DELTAS[DOWN]), EXIT_MOVE)
+        for row in range(3):
+            with self.subTest(row=row):
+                self.assertEqual(self._maze.get_move(
+                    (row, 3), MOVE_DELTAS[RIGHT]), EXIT_MOVE)
+
+    def test_inside_moves(self) -> None:
+        self.assertEqual(self._maze.get_move((0, 0), MOVE_DELTAS[RIGHT]),
+                         BLOCKED_MOVE)
+        self.assertEqual(self._maze.get_move((1, 1), MOVE_DELTAS[RIGHT]),
+                         BLOCKED_MOVE)
+        self.assertEqual(self._maze.get_move((1, 0), MOVE_DELTAS[DOWN]),
+                         self._maze.get_tile((2, 0)).damage())
+        self.assertEqual(self._maze.get_move((1, 0), MOVE_DELTAS[UP]), 0)
+
+    def test_doors(self) -> None:
+        copy = self._maze.copy()
+        self._maze.unlock_door()
+        self.assertEqual(self._maze.get_move((1, 1), MOVE_DELTAS[RIGHT]), 0)
+        self.assertEqual(copy.get_move((1, 1), MOVE_DELTAS[RIGHT]),
+                         BLOCKED_MOVE)
+        self._maze.lock_door()
+        self.assertEqual(self._maze.get_move((1, 1), MOVE_DELTAS[RIGHT]),
+                         BLOCKED_MOVE)
+
+    def test_other_deltas(self) -> None:
+        self.assertEqual(self._maze.get_move((0, 0), (0, -2)), BLOCKED_MOVE)
+        self.assertEqual(self._maze.get_move((0, 0), (-1, 3)), BLOCKED_MOVE)
+        self.assertEqual(self._maze.get_move((0, 0), (5, 0)), EXIT_MOVE)
+        self.assertEqual(self._maze.get_move((0, 0), (0, 2)), 0)
+        self.assertEqual(self._maze.get_move((0, 0), (0, 1)), BLOCKED_MOVE)
+
+
+class ModelEdgeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._directory = tempfile.TemporaryDirectory()
+        self._game = os.path.join(self._directory.name, 'edges.txt')
+        with open(self._game, 'w') as file:
+            file.write(GAME)
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def test_top_and_left_edges_block(self) -> None:
+        for move in [UP, LEFT]:
+            with self.subTest(move=move):
+                model = Model(self._game)
+                model.move_player(MOVE_DELTAS[move])
+                self.assertEqual(model.get_level_number(), 0)
+                self.assertEqual(model.get_player().get_position(), (0, 0))
+                self.assertEqual(model.get_player_stats()[0], MAX_HEALTH)
+
+    def test_bottom_and_right_edges_exit(self) -> None:
+        for move, steps in [(DOWN, 3), (RIGHT, 3)]:
+            with self.subTest(move=move):
+                model = Model(self._game)
+                for _ in range(steps):
+                    model.move_player(MOVE_DELTAS[move])
+                self.assertEqual(model.get_level_number(), 1)
+                self.assertEqual(model.get_player().get_position(), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
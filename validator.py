@@ -0,0 +1,565 @@
+"""Checks that game files can be won within the hunger, thirst and health
+limits, by searching every way of playing them.
+
+The search follows the same rules as Model.move_player and MazeRunner.play:
+health drops by one plus the tile's damage on every valid move, hunger and
+thirst rise every TIME_TO_CHANGE valid moves, doors open once a level's
+coins are collected, and leaving the maze moves on to the next level.
+
+Items are only used right before the move that would otherwise lose the
+game. Using one any earlier can never leave the player better off, so this
+keeps the search small without missing shorter solutions. Moves that would
+wrap around to the far side of the maze (negative positions) are not
+explored.
+"""
+from __future__ import annotations
+import argparse
+from heapq import heappop, heappush
+from multiprocessing import Pool
+from typing import Optional
+from a2 import Level, load_game, ZERO, ONE, TIME_TO_CHANGE, ITEM_EFFECTS, \
+    DOOR_CODE
+from constants import *
+import pathfinding
+
+MAX_STATES = 2000000
+# Items that can be held, in the order they are counted in a search state.
+# The search knows when to use each of these, so games holding any other
+# kind of item, or these with other effects, can't be validated
+HELD = [WATER, HONEY, APPLE, POTION]
+WATER_SLOT, HONEY_SLOT, APPLE_SLOT, POTION_SLOT = range(len(HELD))
+# Which of (health, hunger, thirst) each is used for
+HELD_STATS = [2, 1, 1, 0]
+HELD_NAME = [ITEM_EFFECTS[item].get_name() for item in HELD]
+HELD_CHANGES = [ITEM_EFFECTS[item].get_changes() for item in HELD]
+WATER_THIRST, HONEY_HUNGER, APPLE_HUNGER, POTION_HEALTH = (
+    changes[stat] for changes, stat in zip(HELD_CHANGES, HELD_STATS))
+USE = 'i '
+
+
+class LevelPlan:
+    """A level's walls, items and distances, prepared for the search."""
+    def __init__(self, level: Level) -> None:
+        """
+        Parameters:
+            level (Level): an unplayed level
+
+        Raises:
+            ValueError: if the level has items the search can't use
+        """
+        maze = level.get_maze()
+        codes = maze.get_tile_codes()
+        table = maze.get_tile_table()
+        self._columns = level.get_dimensions()[1]
+        self._rows = len(codes) // self._columns if self._columns else ZERO
+        self._start = level.get_player_start()
+        self._blocking = [tile.is_blocking() for tile in table]
+        self._codes = codes
+        self._damage = [tile.damage() for tile in table]
+
+        # Every item gets a bit in the collected mask
+        self._items = {}
+        coins = ZERO
+        for bit, (position, item) in enumerate(level.get_items().items()):
+            _check_item(item.get_id())
+            cell = position[0] * self._columns + position[1]
+            self._items[cell] = (ONE << bit, item.get_id())
+            if item.get_id() == COIN:
+                coins = coins | (ONE << bit)
+        self._coins = coins
+
+        # Distances that ignore the doors, as a lower bound on moves left
+        exits = [(row, column) for row in range(self._rows)
+                 for column in range(self._columns)
+                 if row == self._rows - ONE or column == self._columns - ONE]
+        self._exit_field = pathfinding.nearest_field(maze, exits, True)
+        self._coin_fields = {
+            bit: pathfinding.distance_field(maze, (cell // self._columns,
+                                                   cell % self._columns), True)
+            for cell, (bit, item) in self._items.items() if item == COIN}
+
+    def moves_left(self, cell: int, mask: int) -> Optional[int]:
+        """
+        Parameters:
+            cell (int): row * columns + column of the player
+            mask (int): bits of the items already collected
+
+        Returns:
+            Optional[int]: fewest moves needed to collect the remaining coins
+                           and leave the level, None if that's impossible
+        """
+        position = divmod(cell, self._columns)
+        best = self._exit_field.get(position)
+        if best is None:
+            return None
+
+        # Every coin left has to be visited on the way to an exit
+        for bit, field in self._coin_fields.items():
+            if not mask & bit:
+                to_coin = field.get(position)
+                if to_coin is None:
+                    return None
+                from_coin = self._exit_field.get(field.get_source())
+                if from_coin is None:
+                    return None
+                best = max(best, to_coin + from_coin)
+
+        return best + ONE
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the size of the level
+        """
+        return f'{type(self).__name__}(({self._rows}, {self._columns}))'
+
+
+def _check_item(item_id: str) -> None:
+    """
+    Parameters:
+        item_id (str): the id of an item in a game being validated
+
+    Raises:
+        ValueError: if the item isn't a coin or one of HELD with the effect
+                    the search was set up with
+    """
+    if item_id == COIN:
+        return
+
+    effect = ITEM_EFFECTS[item_id]
+    if item_id in HELD:
+        slot = HELD.index(item_id)
+        changes = effect.get_changes()
+        stat = HELD_STATS[slot]
+        # Potions only heal, and water and food only take thirst and
+        # hunger away
+        helps = changes[stat] > ZERO if stat == ZERO else changes[stat] < ZERO
+        if effect.is_usable() and helps \
+                and effect.get_name() == HELD_NAME[slot] \
+                and changes == HELD_CHANGES[slot] \
+                and not any(change for index, change in enumerate(changes)
+                            if index != stat):
+            return
+
+    raise ValueError(f"the validator can't use {effect.get_name()} "
+                     f"({item_id}) items: {effect!r}")
+
+
+class ValidationResult:
+    """Whether a game can be won, and the shortest way to win it."""
+    def __init__(self, game_file: str, winnable: Optional[bool],
+                 inputs: list[str], stats: Optional[tuple[int, int, int]],
+                 inventory: dict[str, int], states: int) -> None:
+        """
+        Parameters:
+            game_file (str): path of the game that was checked
+            winnable (Optional[bool]): None if the search ran out of states
+            inputs (list[str]): the shortest winning inputs, as typed into
+                                MazeRunner.play
+            stats (Optional[tuple[int, int, int]]): (health, hunger, thirst)
+                                                    at the end of the win
+            inventory (dict[str, int]): items left over at the end of the win
+            states (int): number of states searched
+        """
+        self._game_file = game_file
+        self._winnable = winnable
+        self._inputs = inputs
+        self._stats = stats
+        self._inventory = inventory
+        self._states = states
+
+    def is_winnable(self) -> Optional[bool]:
+        """
+        Returns:
+            Optional[bool]: True if the game can be won, None if unknown
+        """
+        return self._winnable
+
+    def get_inputs(self) -> list[str]:
+        """
+        Returns:
+            list[str]: the shortest list of inputs that wins the game
+        """
+        return self._inputs
+
+    def get_slack(self) -> Optional[dict[str, int]]:
+        """
+        Returns:
+            Optional[dict[str, int]]: how far each stat was from losing the
+                                      game when it was won
+        """
+        if self._stats is None:
+            return None
+
+        health, hunger, thirst = self._stats
+        return {'health': health, 'hunger': MAX_HUNGER - hunger,
+                'thirst': MAX_THIRST - thirst}
+
+    def get_inventory(self) -> dict[str, int]:
+        """
+        Returns:
+            dict[str, int]: items left over when the game was won
+        """
+        return self._inventory
+
+    def get_states(self) -> int:
+        """
+        Returns:
+            int: number of states searched
+        """
+        return self._states
+
+    def __str__(self) -> str:
+        """
+        Returns:
+            str: a summary of the result
+        """
+        if self._winnable is None:
+            return f'{self._game_file}: unknown after {self._states} states'
+
+        if not self._winnable:
+            return f'{self._game_file}: not winnable'
+
+        return f'{self._game_file}: winnable in {len(self._inputs)} inputs, ' \
+               f'slack {self.get_slack()}'
+
+    def __repr__(self) -> str:
+        """
+        Returns:
+            str: Name of the Class with the result it describes
+        """
+        return f'{type(self).__name__}({self._game_file!r}, ' \
+               f'winnable={self._winnable}, inputs={len(self._inputs)})'
+
+
+def validate_game(game_file: str, max_states: int = MAX_STATES
+                  ) -> ValidationResult:
+    """Searches for the shortest list of inputs that wins the game (A*).
+
+    States with the same level, position, collected items, move count and
+    doors are only kept if no other state reached them in as few inputs
+    with stats and items at least as good.
+
+    Parameters:
+        game_file (str): path of the game to check
+        max_states (int): give up after searching this many states
+
+    Returns:
+        ValidationResult: whether the game can be won, and how
+
+    Raises:
+        ValueError: if the game has items the search can't use
+    """
+    plans = [LevelPlan(level) for level in load_game(game_file)]
+    # Fewest moves needed to get through all the levels after each one
+    later = [ZERO] * len(plans)
+    for index in range(len(plans) - ONE, ZERO, -ONE):
+        start = plans[index]._start
+        needed = plans[index].moves_left(
+            start[0] * plans[index]._columns + start[1], ZERO)
+        if needed is None:
+            return ValidationResult(game_file, False, [], None, {}, ZERO)
+        later[index - ONE] = later[index] + needed
+
+    plan = plans[ZERO]
+    start = plan._start[0] * plan._columns + plan._start[1]
+    # (level, cell, mask, moves since hunger/thirst changed, unlocked,
+    #  health, hunger, thirst, held items)
+    state = (ZERO, start, ZERO, ZERO, False, MAX_HEALTH, ZERO, ZERO,
+             (ZERO,) * len(HELD))
+    estimate = plan.moves_left(start, ZERO)
+    if estimate is None:
+        return ValidationResult(game_file, False, [], None, {}, ZERO)
+
+    # state -> (inputs to reach it, previous state, inputs from there)
+    parents = {state: (ZERO, None, [])}
+    best = {}
+    # Queue entries carry the final inputs when they are a win, which is
+    # only accepted once popped, as nothing left could then be shorter
+    queue = [(estimate + later[ZERO], ZERO, ZERO, state, None)]
+    pushed = ONE
+
+    while queue:
+        _, inputs, _, state, winning = heappop(queue)
+        if winning is not None:
+            return _solution(game_file, parents, state, winning,
+                             len(parents))
+
+        if inputs > parents[state][0] or _is_dominated(best, state, inputs):
+            continue
+        _remember(best, state, inputs)
+
+        for successor, steps, won in _successors(plans, state):
+            new_inputs = inputs + len(steps)
+            if won:
+                heappush(queue, (new_inputs, new_inputs, pushed, state,
+                                 steps))
+                pushed = pushed + ONE
+                continue
+
+            known = parents.get(successor)
+            if known is not None and known[ZERO] <= new_inputs:
+                continue
+
+            level, cell, mask = successor[:3]
+            estimate = plans[level].moves_left(cell, mask)
+            if estimate is not None and estimate - ONE <= _moves_possible(
+                    plans[level], successor):
+                parents[successor] = (new_inputs, state, steps)
+                heappush(queue, (new_inputs + estimate + later[level],
+                                 new_inputs, pushed, successor, None))
+                pushed = pushed + ONE
+
+        if len(parents) > max_states:
+            return ValidationResult(game_file, None, [], None, {},
+                                    len(parents))
+
+    return ValidationResult(game_file, False, [], None, {}, len(parents))
+
+
+def validate_files(game_files: list[str], processes: Optional[int] = None,
+                   max_states: int = MAX_STATES) -> list[ValidationResult]:
+    """Checks many game files across a pool of processes.
+
+    Parameters:
+        game_files (list[str]): paths of the games to check
+        processes (Optional[int]): number of worker processes, defaults to
+                                   the number of CPUs
+        max_states (int): give up on a game after this many states
+
+    Returns:
+        list[ValidationResult]: the result for each game, in the same order
+    """
+    with Pool(processes) as pool:
+        return pool.starmap(validate_game,
+                            [(game_file, max_states)
+                             for game_file in game_files])
+
+
+def _successors(plans: list[LevelPlan], state: tuple):
+    """Makes each possible move from the state, using items first if the
+       move would otherwise lose the game.
+
+    Parameters:
+        plans (list[LevelPlan]): every level in the game
+        state (tuple): the state to move from
+
+    Yields:
+        (tuple, list[str], bool): the new state, the inputs that reach it,
+                                  and whether they win the game
+    """
+    level, cell, mask, counter, unlocked, health, hunger, thirst, held = state
+    plan = plans[level]
+    row, column = divmod(cell, plan._columns)
+
+    for move, (row_change, column_change) in MOVE_DELTAS.items():
+        new_row, new_column = row + row_change, column + column_change
+        if new_row < ZERO or new_column < ZERO:
+            continue
+
+        # Leaving the maze, which doesn't count as a valid move
+        if new_row >= plan._rows or new_column >= plan._columns:
+            if level == len(plans) - ONE:
+                yield state, [move], True
+            else:
+                following = plans[level + ONE]
+                start = following._start[0] * following._columns \
+                    + following._start[1]
+                yield (level + ONE, start, ZERO, counter, False, health,
+                       hunger, thirst, held), [move], False
+            continue
+
+        new_cell = new_row * plan._columns + new_column
+        code = plan._codes[new_cell]
+        if plan._blocking[code] and not (unlocked and code == DOOR_CODE):
+            continue
+
+        for uses, stats, new_held in _survive(
+                plan._damage[code], counter, health, hunger, thirst, held):
+            new_mask = mask
+            item = plan._items.get(new_cell)
+            if item is not None and not mask & item[0]:
+                new_mask = mask | item[0]
+                if item[1] != COIN:
+                    slot = HELD.index(item[1])
+                    new_held = new_held[:slot] + (new_held[slot] + ONE,) \
+                        + new_held[slot + ONE:]
+
+            opened = unlocked or new_mask & plan._coins == plan._coins
+            yield (level, new_cell, new_mask,
+                   (counter + ONE) % TIME_TO_CHANGE, opened) + stats \
+                + (new_held,), uses + [move], False
+
+
+def _survive(damage: int, counter: int, health: int, hunger: int,
+             thirst: int, held: tuple):
+    """Works out which items must be used so the next move doesn't lose.
+
+    Parameters:
+        damage (int): damage of the tile being moved onto
+        counter (int): valid moves since hunger and thirst last changed
+        health, hunger, thirst (int): the player's stats before the move
+        held (tuple): number of each item in HELD being carried
+
+    Yields:
+        (list[str], tuple[int, int, int], tuple): the inputs for the items
+                                                  used, the stats after the
+                                                  move, and the items left
+    """
+    uses = []
+    held = list(held)
+
+    while health - ONE - damage <= ZERO:
+        if not held[POTION_SLOT]:
+            return
+        held[POTION_SLOT] = held[POTION_SLOT] - ONE
+        health = min(health + POTION_HEALTH, MAX_HEALTH)
+        uses.append(USE + HELD_NAME[POTION_SLOT])
+    health = health - ONE - damage
+
+    if counter + ONE < TIME_TO_CHANGE:
+        yield uses, (health, hunger, thirst), tuple(held)
+        return
+
+    if thirst + ONE >= MAX_THIRST:
+        if not held[WATER_SLOT]:
+            return
+        held[WATER_SLOT] = held[WATER_SLOT] - ONE
+        thirst = max(thirst + WATER_THIRST, ZERO)
+        uses.append(USE + HELD_NAME[WATER_SLOT])
+    thirst = thirst + ONE
+
+    if hunger + ONE < MAX_HUNGER:
+        yield uses, (health, hunger + ONE, thirst), tuple(held)
+        return
+
+    # Either kind of food will do, and which is better depends on the future
+    for slot, amount in ((HONEY_SLOT, HONEY_HUNGER),
+                         (APPLE_SLOT, APPLE_HUNGER)):
+        if held[slot]:
+            eaten = list(held)
+            eaten[slot] = eaten[slot] - ONE
+            yield uses + [USE + HELD_NAME[slot]], \
+                (health, max(hunger + amount, ZERO) + ONE, thirst), \
+                tuple(eaten)
+
+
+def _moves_possible(plan: LevelPlan, state: tuple) -> int:
+    """
+    Parameters:
+        plan (LevelPlan): the level the state is in
+        state (tuple): the state to check
+
+    Returns:
+        int: the most valid moves the player could make before losing, if
+             every item held or left in the level were used perfectly
+    """
+    _, _, mask, counter, _, health, hunger, thirst, held = state
+    left = {item: ZERO for item in HELD}
+    for bit, item in plan._items.values():
+        if item != COIN and not mask & bit:
+            left[item] = left[item] + ONE
+
+    water = held[WATER_SLOT] + left[WATER]
+    food = -HONEY_HUNGER * (held[HONEY_SLOT] + left[HONEY]) \
+        - APPLE_HUNGER * (held[APPLE_SLOT] + left[APPLE])
+    potions = held[POTION_SLOT] + left[POTION]
+
+    # Hunger and thirst must stay below their limits after every change
+    by_thirst = TIME_TO_CHANGE * (MAX_THIRST - ONE - thirst
+                                  - WATER_THIRST * water) \
+        + TIME_TO_CHANGE - ONE - counter
+    by_hunger = TIME_TO_CHANGE * (MAX_HUNGER - ONE - hunger + food) \
+        + TIME_TO_CHANGE - ONE - counter
+    by_health = health - ONE + POTION_HEALTH * potions
+    return min(by_thirst, by_hunger, by_health)
+
+
+def _is_dominated(best: dict, state: tuple, inputs: int) -> bool:
+    """
+    Parameters:
+        best (dict): the states already searched, grouped by position
+        state (tuple): the state to check
+        inputs (int): number of inputs used to reach the state
+
+    Returns:
+        bool: True if a state reached in no more inputs is at least as good
+    """
+    health, hunger, thirst, held = state[5:]
+    for other_inputs, other in best.get(state[:5], ()):
+        if other_inputs <= inputs and other[0] >= health \
+                and other[1] <= hunger and other[2] <= thirst \
+                and all(mine <= theirs
+                        for mine, theirs in zip(held, other[3])):
+            return True
+    return False
+
+
+def _remember(best: dict, state: tuple, inputs: int) -> None:
+    """Records a searched state, forgetting any it is at least as good as.
+
+    Parameters:
+        best (dict): the states already searched, grouped by position
+        state (tuple): the state searched
+        inputs (int): number of inputs used to reach the state
+    """
+    health, hunger, thirst, held = state[5:]
+    kept = [(other_inputs, other)
+            for other_inputs, other in best.get(state[:5], ())
+            if not (inputs <= other_inputs and health >= other[0]
+                    and hunger <= other[1] and thirst <= other[2]
+                    and all(mine >= theirs
+                            for mine, theirs in zip(held, other[3])))]
+    kept.append((inputs, state[5:]))
+    best[state[:5]] = kept
+
+
+def _solution(game_file: str, parents: dict, state: tuple,
+              winning: list[str], states: int) -> ValidationResult:
+    """Follows the parents back from the winning state to the start.
+
+    Parameters:
+        game_file (str): path of the game that was checked
+        parents (dict): maps each state to the inputs needed to reach it and
+                        the state and inputs before it
+        state (tuple): the state the winning move was made from
+        winning (list[str]): the inputs that win from that state
+        states (int): number of states searched
+
+    Returns:
+        ValidationResult: the winning inputs and how they finish
+    """
+    steps = [winning]
+    current = state
+    while parents[current][1] is not None:
+        _, current, inputs = parents[current]
+        steps.append(inputs)
+    steps.reverse()
+
+    health, hunger, thirst, held = state[5:]
+    inventory = {name: count for name, count in zip(HELD_NAME, held) if count}
+    return ValidationResult(game_file, True,
+                            [step for inputs in steps for step in inputs],
+                            (health, hunger, thirst), inventory, states)
+
+
+def main():
+    """Checks whether each game file can be won.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('game_files', nargs='+')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-states', type=int, default=MAX_STATES)
+    parser.add_argument('--show-inputs', action='store_true')
+    args = parser.parse_args()
+
+    for result in validate_files(args.game_files, args.processes,
+                                 args.max_states):
+        print(result)
+        if args.show_inputs and result.is_winnable():
+            print(' '.join(input.replace(' ', '_')
+                           for input in result.get_inputs()))
+
+
+if __name__ == '__main__':
+    main()
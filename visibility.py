@@ -0,0 +1,164 @@
+"""Line of sight over a Maze, by recursive shadowcasting.
+
+A tile can be seen from a position if a straight line reaches it without
+passing through a tile whose Tile.is_blocking() is True. Blocking tiles that
+are reached are themselves visible, so walls show at the edge of what can
+be seen. Anything outside the maze blocks sight.
+
+Shadowcasting scans each of the eight octants around the viewer one row at
+a time, carrying the range of slopes that are still lit, so each tile within
+the radius is visited at most once per octant it falls in. Results are
+cached per (maze, position, radius) and dropped automatically once the
+maze's doors are unlocked, since that is the only way blocking changes.
+Each maze keeps at most CACHE_LIMIT results, forgetting the least recently
+used first.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+# Multipliers turning (distance across, distance out) into (row, column)
+# offsets for each octant
+OCTANTS = [
+    (0, 1, 1, 0), (1, 0, 0, 1), (1, 0, 0, -1), (0, 1, -1, 0),
+    (0, -1, -1, 0), (-1, 0, 0, -1), (-1, 0, 0, 1), (0, -1, 1, 0),
+]
+
+# Results kept per maze
+CACHE_LIMIT = 256
+
+# maze -> (doors unlocked when cached,
+#          OrderedDict {(position, radius): visible}, oldest first)
+_cache = WeakKeyDictionary()
+
+
+def visible_positions(maze, position: tuple[int, int],
+                      radius: int) -> frozenset[tuple[int, int]]:
+    """
+    Parameters:
+        maze (Maze): the maze to look through
+        position (tuple[int, int]): (row, column) of the viewer, inside the
+                                    maze
+        radius (int): furthest number of rows or columns away to look
+
+    Returns:
+        frozenset[tuple[int, int]]: the (row, column) of every tile in the
+                                    maze that can be seen, including the
+                                    viewer's own
+    """
+    unlocked = maze.is_unlocked()
+    entry = _cache.get(maze)
+
+    # Unlocking the doors changes which tiles block sight
+    if entry is None or entry[0] != unlocked:
+        entry = (unlocked, OrderedDict())
+        _cache[maze] = entry
+
+    key = (position, radius)
+    results = entry[1]
+    visible = results.get(key)
+    if visible is None:
+        visible = _shadowcast(maze, position, radius)
+        results[key] = visible
+        if len(results) > CACHE_LIMIT:
+            results.popitem(last=False)
+    else:
+        results.move_to_end(key)
+
+    return visible
+
+
+def clear_cache(maze: Optional[object] = None) -> None:
+    """Forgets the cached results for one maze, or for every maze.
+
+    Parameters:
+        maze (Optional[Maze]): the maze to forget, defaults to all of them
+    """
+    if maze is None:
+        _cache.clear()
+    else:
+        _cache.pop(maze, None)
+
+
+def _shadowcast(maze, position: tuple[int, int],
+                radius: int) -> frozenset[tuple[int, int]]:
+    """
+    Parameters:
+        maze (Maze): the maze to look through
+        position (tuple[int, int]): (row, column) of the viewer
+        radius (int): furthest number of rows or columns away to look
+
+    Returns:
+        frozenset[tuple[int, int]]: every tile that can be seen
+    """
+    columns = maze.get_dimensions()[1]
+    codes = maze.get_tile_codes()
+    rows = len(codes) // columns if columns else 0
+    blocking = [tile.is_blocking() for tile in maze.get_tile_table()]
+
+    visible = {position}
+    for octant in OCTANTS:
+        _cast_octant(codes, blocking, rows, columns, position, radius,
+                     octant, 1, 1.0, 0.0, visible)
+    return frozenset(visible)
+
+
+def _cast_octant(codes: bytes, blocking: list[bool], rows: int,
+                 columns: int, origin: tuple[int, int], radius: int,
+                 octant: tuple[int, int, int, int], distance: int,
+                 start: float, end: float,
+                 visible: set[tuple[int, int]]) -> None:
+    """Lights the tiles of one octant between two slopes, from one distance
+       out to the radius, recursing past each blocking tile.
+
+    Parameters:
+        codes, blocking, rows, columns: the maze's tile codes, which codes
+                                        block sight, and its size
+        origin (tuple[int, int]): (row, column) of the viewer
+        radius (int): furthest distance out to look
+        octant (tuple[int, int, int, int]): multipliers from OCTANTS
+        distance (int): the first distance out to scan
+        start (float): slope where the lit range begins
+        end (float): slope where the lit range ends
+        visible (set[tuple[int, int]]): where to add the tiles seen
+    """
+    if start < end:
+        return
+
+    across_row, out_row, across_column, out_column = octant
+    origin_row, origin_column = origin
+    next_start = start
+    for out in range(distance, radius + 1):
+        blocked = False
+        for across in range(-out, 1):
+            # Slopes of the far and near corners of this tile
+            left = (across - 0.5) / (-out + 0.5)
+            right = (across + 0.5) / (-out - 0.5)
+            if start < right:
+                continue
+            if end > left:
+                break
+
+            row = origin_row + across * across_row + -out * out_row
+            column = origin_column + across * across_column + -out * out_column
+            inside = 0 <= row < rows and 0 <= column < columns
+            if inside:
+                visible.add((row, column))
+            opaque = not inside or blocking[codes[row * columns + column]]
+
+            if blocked:
+                if opaque:
+                    next_start = right
+                    continue
+                blocked = False
+                start = next_start
+            elif opaque and out < radius:
+                # Everything beyond this tile is in its shadow
+                blocked = True
+                _cast_octant(codes, blocking, rows, columns, origin, radius,
+                             octant, out + 1, start, left, visible)
+                next_start = right
+
+        if blocked:
+            return